@@ -9,10 +9,32 @@ sys.path.append(str(ROOT))
 import pandas as pd
 import streamlit as st
 import numpy as np
-from src.pipeline import load_trabajos_realizados, build_metrics
-import altair as alt
-import plotly.express as px
+
+# Vistas de solo lectura: con copy-on-write los subconjuntos de df no copian
+# datos hasta que alguien escribe (siempre activo a partir de pandas 3).
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+from src.pipeline import load_trabajos_realizados, build_metrics, refresh_bundle
+from src.money import cents_to_euros
+from src.bundle import bytes_digest, file_digest, fresh_bundle_dir, load_fact, load_metrics, partition_catalog, read_manifest
+from src.clients import clients_digest
+from src.chart_data import CHART_DEBUG_ENV, chart_debug_enabled, chart_spec, top_n_otros
+from src.detail import detail_order, filtered_positions, n_pages, page_slice
+from src.filters import TENANT_COL, apply_filters, filter_options
+from src.store import catalog_values, catalog_years, select_partitions
+from src.tenants import load_tenants, tenant_name, unique_names
+from src.background import ParseJob
+from src.views import ViewCache, agg_profitability, default_views, demand_tt_tc, drilldown, tt_tc_actions, warmup_enabled, year_tipo_cliente
+from src.versions import commit_version, find_version, list_versions, load_version
+from src.quadrants import RECO_LABELS, split_quadrants
+from src.sketches import APPROX_ENV, approx_enabled, approx_nunique
+from src.timeseries import FREQS as TS_FREQS, TimeSeries
+from src.scenarios import evaluate_scenarios, scenario_grid, summarize_scenarios
+from src.xlsx_export import report_file
+from src.groups import GroupIndex, group_indexes
+import shutil
 import tempfile
+from typing import Iterable
 from pathlib import Path
 import uuid
 from datetime import datetime
@@ -60,35 +82,24 @@ def money(x):
         return str(x)
 
 # =========================
-# Cálculos rentabilidad
+# Cálculos rentabilidad (agregaciones en src/views.py)
 # =========================
-def agg_profitability(df_in: pd.DataFrame, group_col: str) -> pd.DataFrame:
-    if group_col not in df_in.columns:
-        return pd.DataFrame()
-
-    needed = ["MI PRECIO", "HORAS DEDICADAS", "NOMBRE ENCARGO", group_col]
-    if any(c not in df_in.columns for c in needed):
-        return pd.DataFrame()
-
-    g = (
-        df_in.groupby(group_col, dropna=False)
-        .agg(
-            trabajos=("NOMBRE ENCARGO", "count"),
-            facturacion=("MI PRECIO", "sum"),
-            horas=("HORAS DEDICADAS", "sum"),
-        )
-        .reset_index()
-    )
-    g["eur_h"] = np.where(g["horas"] > 0, g["facturacion"] / g["horas"], np.nan)
-    return g
+@st.cache_resource(show_spinner=False)
+def view_cache() -> ViewCache:
+    # Vistas sin filtros por dataset, compartidas entre sesiones y pre-calentadas
+    return ViewCache()
 
 
 def scatter_fact_vs_eurh(df_agg: pd.DataFrame, label_col: str, title: str):
     if df_agg.empty:
         return None
 
+    import altair as alt
+
+    # Solo las columnas que usa el spec y como mucho DEFAULT_TOP_N puntos + "Otros"
+    data = top_n_otros(df_agg, label_col)[[label_col, "trabajos", "horas", "facturacion", "eur_h"]]
     return (
-        alt.Chart(df_agg)
+        alt.Chart(data)
         .mark_circle(opacity=0.85)
         .encode(
             x=alt.X("eur_h:Q", title="Precio efectivo por hora (€/h)"),
@@ -107,56 +118,99 @@ def scatter_fact_vs_eurh(df_agg: pd.DataFrame, label_col: str, title: str):
     )
 
 
-def make_recos(df_agg: pd.DataFrame, label_col: str) -> dict[str, pd.DataFrame]:
+def show_chart(chart, name: str) -> None:
+    """Pinta un chart Altair vía spec; al depurar anota su tamaño (ver chart_sizes_panel)."""
+    if chart is None:
+        return
+    sizes = st.session_state.setdefault("_chart_sizes", {}) if chart_debug_enabled() else None
+    st.vega_lite_chart(chart_spec(chart, name, sizes), width="stretch")
+
+
+def chart_sizes_panel() -> None:
+    """Con DASHBOARD_CHART_DEBUG=1: bytes del spec de cada gráfico pintado en la sesión."""
+    if not chart_debug_enabled():
+        return
+    sizes = st.session_state.get("_chart_sizes", {})
+    with st.expander(f"Depuración: tamaño de los gráficos ({CHART_DEBUG_ENV})"):
+        if not sizes:
+            st.caption("Aún no se ha pintado ningún gráfico.")
+            return
+        tabla = pd.DataFrame(list(sizes.items()), columns=["grafico", "bytes"]).sort_values("bytes", ascending=False)
+        st.dataframe(tabla, hide_index=True, width="stretch")
+        st.caption(f"Total: {int(tabla['bytes'].sum()):,} bytes".replace(",", "."))
+
+
+def make_recos(df_agg: pd.DataFrame, label_col: str, **thresholds) -> dict[str, pd.DataFrame]:
     if df_agg.empty:
         return {"priorizar": pd.DataFrame(), "optimizar": pd.DataFrame(), "potenciar": pd.DataFrame()}
 
-    d = df_agg.copy()
-    med_fact = d["facturacion"].median(skipna=True) # Mediana de facturación
-    med_eurh = d["eur_h"].median(skipna=True) # Mediana de €/h
+    # priorizar: alta facturación + alto €/h (ambos mayores que la mediana)
+    # optimizar: alta facturación + bajo €/h
+    # potenciar: alto €/h pero poco volumen
+    quads = split_quadrants(df_agg, RECO_LABELS, **thresholds)
 
-    priorizar = d[(d["facturacion"] >= med_fact) & (d["eur_h"] >= med_eurh)].sort_values(
-        ["facturacion", "eur_h"], ascending=[False, False]
-    ) # alta facturación + alto €/h (ambos mayores que la mediana)
+    keep = [label_col, "trabajos", "horas", "facturacion", "eur_h"]
+    return {k: quads[k][keep] for k in ("priorizar", "optimizar", "potenciar")}
 
-    optimizar = d[(d["facturacion"] >= med_fact) & (d["eur_h"] < med_eurh)].sort_values(
-        ["facturacion", "eur_h"], ascending=[False, True]
-    ) # alta facturación + bajo €/h (mayor honorario que la mediana, pero €/h menor que la mediana)
+# =========================
+# Tablas (Arrow + column_config)
+# =========================
+# Formato por columna en el cliente: sin formatters Python por celda ni HTML/CSS
+TABLE_FORMATS = {
+    "Honorarios": "%.2f €",
+    "€/h": "%.2f €",
+    "Horas": "%.1f",
+    "Nº trabajos": "%d",
+}
+
+DETAIL_FORMATS = {
+    "MI PRECIO": "%.2f €",
+    "PRECIO/HORA": "%.2f €",
+    "HORAS DEDICADAS": "%.1f",
+}
+
+# Drill-down de la pestaña Cliente: etiqueta -> columna con GroupIndex
+DRILL_DIMENSIONS = {
+    "Cliente": "CLIENTE",
+    "Tipo de trabajo": "TIPO DE TRABAJO",
+    "Localidad": "LOCALIDAD",
+}
+
+# Degradado en servidor (Styler) solo para resaltar €/h bajos en rojo y en
+# tablas pequeñas; el resto del sombreado va como barras de progreso.
+GRADIENT_MAX_ROWS = 50
+
+
+def table_config(t: pd.DataFrame, bars: Iterable[str] = (), formats: dict[str, str] | None = None) -> dict:
+    formats = TABLE_FORMATS if formats is None else formats
+    config = {}
+    for col, fmt in formats.items():
+        if col not in t.columns:
+            continue
+        if col in bars:
+            vals = pd.to_numeric(t[col], errors="coerce")
+            hi = float(vals.max()) if vals.notna().any() else 1.0
+            lo = min(0.0, float(vals.min())) if vals.notna().any() else 0.0
+            config[col] = st.column_config.ProgressColumn(col, format=fmt, min_value=lo, max_value=hi if hi > lo else lo + 1)
+        else:
+            config[col] = st.column_config.NumberColumn(col, format=fmt)
+    return config
 
-    potenciar = d[(d["facturacion"] < med_fact) & (d["eur_h"] >= med_eurh)].sort_values(
-        ["eur_h", "facturacion"], ascending=[False, False]
-    ) # alto €/h pero poco volumen (mayor €/h que la mediana, pero honorario menor que la mediana)
 
-    keep = [label_col, "trabajos", "horas", "facturacion", "eur_h"]
-    return {"priorizar": priorizar[keep], "optimizar": optimizar[keep], "potenciar": potenciar[keep]}
-
-def style_fact_eurh(
-    styler,
-    fact_cmap="Blues",
-    eurh_cmap="Greens",
-    eurh_reverse=False,
-):
+def show_table(t: pd.DataFrame, bars: Iterable[str] = (), reds: Iterable[str] = ()) -> None:
     """
-    Aplica estilos a Facturación y €/h.
-    - eurh_reverse=True → rojo para €/h bajos
+    Muestra una tabla de ranking.
+    - bars: columnas sombreadas como barra (ProgressColumn, en el navegador)
+    - reds: columnas con degradado rojo para valores bajos (Styler, solo si la tabla es pequeña)
     """
-    styler = styler.background_gradient(
-        subset=["Honorarios"],
-        cmap=fact_cmap,
-    )
+    reds = [c for c in reds if c in t.columns]
+    data = t
+    if reds and len(t) <= GRADIENT_MAX_ROWS:
+        fmt = {c: money_2 if "€" in f else num_1 for c, f in TABLE_FORMATS.items() if c in t.columns and c != "Nº trabajos"}
+        data = t.style.format(fmt).background_gradient(subset=reds, cmap="Reds_r")
+    st.dataframe(data, column_config=table_config(t, bars), width="stretch")
 
-    if eurh_reverse:
-        styler = styler.background_gradient(
-            subset=["€/h"],
-            cmap="Reds_r",  # rojo intenso = bajo €/h
-        )
-    else:
-        styler = styler.background_gradient(
-            subset=["€/h"],
-            cmap=eurh_cmap,
-        )
 
-    return styler
 def main():
     st.set_page_config(
     page_title="Dashboard — VIGO Estudio",
@@ -240,11 +294,31 @@ def main():
 
         with st.sidebar:
             st.header("📁 Fuente de datos")
-            uploaded = st.file_uploader("Sube el Excel (.xlsx)", type=["xlsx"])
+            uploads = st.file_uploader(
+                "Sube el Excel (.xlsx)",
+                type=["xlsx"],
+                accept_multiple_files=True,
+                help="Varios libros (uno por estudio) se consolidan en un único dataset con filtro por estudio.",
+            )
+            # Un libro: flujo normal. Varios: consolidación por estudio (src/tenants.py)
+            uploaded = uploads[0] if len(uploads or []) == 1 else None
+            tenant_uploads = list(uploads) if len(uploads or []) > 1 else []
 
             excel_path: Path | None = None
 
-            if uploaded is not None:
+            tenant_names: list[str] = []
+            if tenant_uploads:
+                # Varias oficinas suelen subir su GENERAL.xlsx: nombres únicos y editables
+                defaults = unique_names([tenant_name(Path(u.name)) for u in tenant_uploads])
+                with st.expander("Nombre de cada estudio", expanded=len(set(tenant_name(Path(u.name)) for u in tenant_uploads)) < len(tenant_uploads)):
+                    edited = [
+                        st.text_input(u.name, value=default, key=f"estudio_{u.file_id}").strip() or default
+                        for u, default in zip(tenant_uploads, defaults)
+                    ]
+                tenant_names = unique_names(edited)
+                st.success(f"Consolidando {len(tenant_uploads)} estudios: " + ", ".join(tenant_names))
+
+            elif uploaded is not None:
                 # Guardamos el último subido (sobrescribe el anterior)
                 data = uploaded.getvalue()
                 _write_last_uploaded(data, uploaded.name)
@@ -265,7 +339,9 @@ def main():
 
             # Mostrar fecha última carga (preferimos la guardada en meta)
             meta = _read_last_meta()
-            if meta.get("uploaded_at"):
+            if tenant_uploads:
+                pass
+            elif meta.get("uploaded_at"):
                 st.caption(f"Última carga: {meta['uploaded_at'].replace('T', ' ')}")
             else:
                 # fallback por mtime del archivo
@@ -276,66 +352,323 @@ def main():
                     pass
 
         
-    @st.cache_data(show_spinner=False)
-    def _load_df_from_path(path: Path) -> pd.DataFrame:
-        return load_trabajos_realizados(path)
+    # Bundle columnar (Arrow IPC) sellado con el sha256 del Excel: si está
+    # fresco se abre con memory-map y no hace falta parsear con openpyxl.
+    # La tabla de hechos está particionada por AÑO: solo se leen los años
+    # seleccionados.
+    # Un bundle por versión del Excel (APP_BUNDLES/<sha>): mientras se lee
+    # uno nuevo en segundo plano, el anterior sigue intacto y utilizable.
+    APP_BUNDLES = APP_TMP / "bundles"
+    KEEP_BUNDLES = 3
+    CLI_BUNDLE = Path(__file__).resolve().parent / "artifacts" / "bundle"
+    CLI_DATA = Path(__file__).resolve().parent / "data"  # correcciones de clientes del bundle del CLI
+
+    def _app_bundle(digest: str) -> Path:
+        return APP_BUNDLES / digest[:16]
+
+    def _latest_app_bundle(exclude: Path) -> Path | None:
+        dirs = [d for d in APP_BUNDLES.glob("*") if d.is_dir() and d != exclude and (d / "manifest.json").exists()]
+        return max(dirs, key=lambda d: (d / "manifest.json").stat().st_mtime) if dirs else None
+
+    def _fresh_bundle(digest: str, cli: bool = True) -> Path | None:
+        # Fresco = mismo Excel y mismas correcciones de clientes que al escribirlo:
+        # las del CLI están en data/; las de la app, en APP_TMP (junto a las subidas)
+        if cli and fresh_bundle_dir([CLI_BUNDLE], digest, clients_digest(CLI_DATA)) is not None:
+            return CLI_BUNDLE
+        return fresh_bundle_dir([_app_bundle(digest)], digest, clients_digest(APP_TMP))
+
+    def _ensure_dataset(path: Path, digest: str, progress=None, cancel=None) -> tuple[Path | None, pd.DataFrame | None]:
+        """(bundle fresco, None) o, si no se pudo escribir el bundle, (None, df en memoria)."""
+        bundle_dir = _fresh_bundle(digest)
+        if bundle_dir is not None:
+            return bundle_dir, None
+        df_parsed = load_trabajos_realizados(path, progress=progress, cancel=cancel)
+        return _store_dataset(df_parsed, digest, path.name, progress)
+
+    def _store_dataset(df_parsed: pd.DataFrame, digest: str, source_name: str, progress=None) -> tuple[Path | None, pd.DataFrame | None]:
+        if progress is not None:
+            progress("guardando", len(df_parsed), len(df_parsed))
+        target = _app_bundle(digest)
+        clients = clients_digest(APP_TMP)  # tras leer: la caché de alias pudo crecer
+        try:
+            # Con la versión anterior en disco, solo se aplican los deltas
+            metrics, _ = refresh_bundle(
+                target, df_parsed, digest, source_name, previous_dir=_latest_app_bundle(target), clients_digest=clients,
+            )
+        except OSError:
+            return None, df_parsed  # sin bundle, la próxima vez se vuelve a parsear
+        if warmup_enabled():
+            # Dataset listo: las vistas por defecto se calculan ya, antes del siguiente rerun
+            data_key = f"{digest}:{clients[:16]}"  # la misma clave que usa el dashboard
+            view_cache().get(data_key, "metrics", lambda: metrics)
+            view_cache().warm(data_key, default_views(df_parsed, approx_enabled()))
+        for old in sorted(APP_BUNDLES.glob("*"), key=lambda d: d.stat().st_mtime, reverse=True)[KEEP_BUNDLES:]:
+            shutil.rmtree(old, ignore_errors=True)
+        return target, None
+
+
+    def _parse_upload(file_bytes: bytes, digest: str, progress=None, cancel=None):
+        # Copia propia por versión: otra subida no pisa el fichero a medio leer
+        tmp_path = APP_TMP / f"upload_{digest[:16]}.xlsx"
+        tmp_path.write_bytes(file_bytes)
+        try:
+            return _ensure_dataset(tmp_path, digest, progress=progress, cancel=cancel)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+
+    def _parse_tenants(files: list[tuple[str, bytes]], digest: str, progress=None, cancel=None):
+        """Varios libros subidos a la vez ([(estudio, bytes)]): un estudio por libro, leídos en paralelo."""
+        bundle_dir = _fresh_bundle(digest, cli=False)
+        if bundle_dir is not None:
+            return bundle_dir, None
+        # En APP_TMP, como las demás subidas: mismas correcciones y caché de alias de clientes
+        paths = [APP_TMP / f"tenant_{digest[:16]}_{i}.xlsx" for i in range(len(files))]
+        for path, (_, file_bytes) in zip(paths, files):
+            path.write_bytes(file_bytes)
+        try:
+            df_parsed = load_tenants(paths, [n for n, _ in files], progress=progress, cancel=cancel)
+        finally:
+            for path in paths:
+                path.unlink(missing_ok=True)
+        return _store_dataset(df_parsed, digest, ", ".join(n for n, _ in files), progress)
+
+
+    @st.cache_resource(show_spinner=False)
+    def _parse_jobs() -> dict[str, ParseJob]:
+        # Compartido entre sesiones: dos pestañas con el mismo Excel esperan al mismo trabajo
+        return {}
+
+
+    def _dataset(digest: str, target, *args) -> tuple[Path | None, pd.DataFrame | None] | None:
+        """
+        Dataset listo para ese digest, o None si se está leyendo en segundo
+        plano. Un digest nuevo en esta sesión cancela la lectura anterior.
+        """
+        bundle_dir = _fresh_bundle(digest)
+        if bundle_dir is not None:
+            return bundle_dir, None
+        jobs = _parse_jobs()
+        # Mismo Excel con otras correcciones de clientes: otra lectura
+        key = f"{digest}:{clients_digest(APP_TMP)[:16]}"
+        prev_key = st.session_state.get("_parse_key")
+        switched = prev_key != key
+        if switched and prev_key in jobs and not jobs[prev_key].done:
+            jobs[prev_key].cancel()
+        st.session_state["_parse_key"] = key
+        job = jobs.get(key)
+        # Un trabajo cancelado o fallido solo se relanza al volver a elegir ese Excel
+        if job is None or (switched and job.done and not job.ok):
+            job = jobs[key] = ParseJob(digest, target, *args).start()
+        if job.ok:
+            return job.result
+        return None
 
 
-    @st.cache_data(show_spinner=False)
-    def _load_df_from_bytes(file_bytes: bytes) -> pd.DataFrame:
-        tmp_dir = Path(tempfile.gettempdir())
-        tmp_path = tmp_dir / "vigo_uploaded.xlsx"
+    @st.fragment(run_every=0.5)
+    def _parse_progress(key: str) -> None:
+        job = _parse_jobs().get(key)
+        if job is None:
+            return
+        if job.done:
+            st.rerun()
+        st.progress(job.fraction(), text=job.status())
+        if st.button("Cancelar lectura"):
+            job.cancel()
+
+
+    if tenant_uploads:
+        files = [(name, u.getvalue()) for name, u in zip(tenant_names, tenant_uploads)]
+        data_digest = bytes_digest("".join(f"{n}\0{bytes_digest(b)}\n" for n, b in files).encode("utf-8"))
+        ready = _dataset(data_digest, _parse_tenants, files, data_digest)
+    elif uploaded is not None:
+        data_digest = bytes_digest(uploaded.getvalue())
+        ready = _dataset(data_digest, _parse_upload, uploaded.getvalue(), data_digest)
+    elif excel_path is not None and Path(excel_path).exists():
+        data_digest = file_digest(excel_path)
+        ready = _dataset(data_digest, _ensure_dataset, Path(excel_path), data_digest)
+    else:
+        st.stop()
 
-        tmp_path.write_bytes(file_bytes)
+    if ready is not None:
+        st.session_state["_dataset"] = (data_digest, *ready)
+    else:
+        job = _parse_jobs().get(st.session_state.get("_parse_key"))
+        with st.sidebar:
+            if job is not None and job.error is not None:
+                st.error(f"No se pudo leer el Excel: {job.error}")
+            elif job is not None and job.cancelled:
+                st.info("Lectura cancelada.")
+            else:
+                _parse_progress(st.session_state.get("_parse_key"))
+        if "_dataset" not in st.session_state:
+            st.stop()
+        # Mientras tanto se sigue trabajando con el dataset anterior
+        st.sidebar.caption("Mostrando los datos anteriores hasta que termine la lectura.")
 
-        # Guardamos info en session_state
-        st.session_state["_tmp_excel_path"] = str(tmp_path)
-        st.session_state["_tmp_excel_uploaded_at"] = datetime.now()
+    data_digest, bundle_dir, df_mem = st.session_state["_dataset"]
+    # Clave de las cachés del dataset: el Excel y las correcciones de clientes
+    # con que se unificó (mismo Excel + otro client_overrides.csv = otros datos)
+    _clients = (read_manifest(bundle_dir) or {}).get("clients_sha256") if bundle_dir is not None else None
+    data_key = f"{data_digest}:{(_clients or clients_digest(APP_TMP))[:16]}"
 
-        return load_trabajos_realizados(tmp_path)
 
+    # cache_resource: el DataFrame se comparte entre reruns sin copiarlo
+    # (cache_data lo deserializa entero en cada rerun). Nadie lo muta.
+    # Pocas entradas: cada combinación de años/estudios es un DataFrame en
+    # memoria, y sin límite se guardarían todas las que se hayan pulsado.
+    PARTITION_CACHE_ENTRIES = 4
 
-    if uploaded is not None:
-        df = _load_df_from_bytes(uploaded.getvalue())
-    elif excel_path is not None and Path(excel_path).exists():
-        df = _load_df_from_path(excel_path)
+    @st.cache_resource(show_spinner=False, max_entries=PARTITION_CACHE_ENTRIES)
+    def _load_partitions(bundle_dir: Path, digest: str, years: tuple[int, ...], estudios: tuple[str, ...] = ()) -> pd.DataFrame:
+        return load_fact(bundle_dir, {"AÑO": list(years), TENANT_COL: list(estudios)})
+
+
+    def _base_metrics(_df: pd.DataFrame, digest: str, bundle_dir: Path | None, approx: bool = False) -> dict[str, pd.DataFrame]:
+        # Métricas sin filtros: las pre-agregadas del bundle si existe (exactas y ya calculadas)
+        if bundle_dir is not None:
+            try:
+                return load_metrics(bundle_dir)
+            except OSError:
+                pass
+        return build_metrics(_df, approx=approx)
+
+
+    # Cachés por dataset cargado. df_key = (data_key, años, estudios) identifica
+    # el DataFrame; id(df) no sirve: CPython reutiliza el id de un frame
+    # liberado y otro frame heredaría su orden o su índice.
+    DF_CACHE_ENTRIES = 8
+
+    @st.cache_resource(show_spinner=False, max_entries=DF_CACHE_ENTRIES)
+    def _detail_order(_df: pd.DataFrame, df_key: tuple, descending: bool) -> np.ndarray:
+        return detail_order(_df, descending=descending)
+
+
+    @st.cache_resource(show_spinner=False, max_entries=DF_CACHE_ENTRIES)
+    def _filter_options(_df: pd.DataFrame, df_key: tuple) -> dict[str, list]:
+        return filter_options(_df)
+
+
+    @st.cache_resource(show_spinner=False, max_entries=DF_CACHE_ENTRIES)
+    def _group_indexes(_df: pd.DataFrame, df_key: tuple) -> dict[str, GroupIndex]:
+        # Posiciones por cliente / tipo de trabajo / localidad, una vez por dataset
+        return group_indexes(_df)
+
+
+    # -------------------------
+    # Histórico de versiones (bloques deduplicados, ver src/versions.py)
+    # -------------------------
+    VERSIONS = APP_TMP / "versions"
+
+    @st.cache_resource(show_spinner=False)
+    def _record_version(digest: str, source_name: str, bundle_dir: Path | None, _df_mem: pd.DataFrame | None) -> None:
+        if find_version(VERSIONS, digest) is None:
+            df_version = load_fact(bundle_dir) if bundle_dir is not None else _df_mem
+            try:
+                commit_version(VERSIONS, df_version, source_name, digest)
+            except OSError:
+                pass  # el histórico es "mejor esfuerzo", como last_uploaded.xlsx
+
+
+    @st.cache_resource(show_spinner=False)
+    def _load_version(version_id: int) -> pd.DataFrame:
+        return load_version(VERSIONS, version_id)
+
+
+    if tenant_uploads:
+        source_name = ", ".join(u.name for u in tenant_uploads)
+    elif uploaded is not None:
+        source_name = uploaded.name
     else:
-        st.stop()
+        source_name = _read_last_meta().get("filename", Path(excel_path).name)
+    _record_version(data_digest, source_name, bundle_dir, df_mem)
+    versiones = list_versions(VERSIONS)
+    actual = find_version(VERSIONS, data_digest)
+    with st.sidebar:
+        pasadas = [v for v in reversed(versiones) if actual is None or v["id"] != actual["id"]]
+        if pasadas:
+            version_sel = st.selectbox(
+                "Versión",
+                options=[None] + pasadas,
+                format_func=lambda v: "Actual" if v is None else f"v{v['id']} · {v['created_at'].replace('T', ' ')} · {v['source']}",
+            )
+            if version_sel is not None:
+                # Vista "a fecha de": la versión pasada se reconstruye en memoria
+                bundle_dir, df_mem = None, _load_version(version_sel["id"])
+                data_digest = version_sel["source_sha256"]
+                data_key = f"version:{version_sel['id']}"
+                if actual is not None:
+                    st.caption(f"{version_sel['rows']} filas ({version_sel['rows'] - actual['rows']:+d} respecto a la actual)")
+
     # -------------------------
     # Filtros (MULTI)
     # -------------------------
     with st.sidebar:
 
         st.header("🔎 Filtros")
-        dff = df.copy()
 
+        # Estudio y año primero: deciden qué particiones se leen (opciones desde el catálogo)
+        catalog = partition_catalog(bundle_dir) if bundle_dir is not None else None
+        if catalog is not None:
+            opciones_estudio = catalog_values(catalog, TENANT_COL)
+        else:
+            opciones_estudio = filter_options(df_mem).get("estudio", [])
+        estudio_sel = []
+        if len(opciones_estudio) > 1:
+            estudio_sel = st.sidebar.multiselect("Estudio", options=opciones_estudio, default=[])
+
+        if catalog is not None:
+            opciones_anio = catalog_years(select_partitions(catalog, {TENANT_COL: estudio_sel}))
+        else:
+            opciones_anio = filter_options(df_mem).get("anio", [])
         anio_sel = []
-        if "AÑO" in df.columns:
-            opciones_anio = sorted(pd.to_numeric(df["AÑO"], errors="coerce").dropna().astype(int).unique().tolist())
+        if opciones_anio:
             anio_sel = st.sidebar.multiselect("Año", options=opciones_anio, default=[])
 
+        if bundle_dir is not None:
+            df_key = (data_key, tuple(sorted(anio_sel)), tuple(sorted(estudio_sel)))
+            df = _load_partitions(bundle_dir, *df_key)
+        else:
+            df_key = (data_key,)
+            df = df_mem
+        opciones = _filter_options(df, df_key)
+
+        money_issues = df.attrs.get("money_issues", {})
+        if money_issues:
+            st.warning(
+                "Importes no representables en céntimos (redondeados o vacíos): "
+                + ", ".join(f"{c} ({len(v)} filas)" for c, v in money_issues.items())
+            )
+
+        client_aliases = df.attrs.get("client_aliases", {})
+        if client_aliases:
+            with st.expander(f"{len(client_aliases)} nombres de cliente unificados"):
+                st.caption("Se corrigen en client_overrides.csv (alias,canonico), junto al Excel.")
+                st.dataframe(
+                    pd.DataFrame(list(client_aliases.items()), columns=["Alias", "Cliente"]),
+                    hide_index=True,
+                    width="stretch",
+                )
+
         # --- Filtro Mes (MULTI) ---
         mes_sel = []
-        if "MES" in df.columns:
+        if "mes" in opciones:
             # Usamos el MES textual tal como viene (ENERO, FEBRERO...)
-            opciones_mes = sorted(df["MES"].dropna().astype(str).unique().tolist())
-            mes_sel = st.sidebar.multiselect("Mes", options=opciones_mes, default=[])
+            mes_sel = st.sidebar.multiselect("Mes", options=opciones["mes"], default=[])
 
         tipo_trabajo_sel = []
-        if "TIPO DE TRABAJO" in df.columns:
-            opciones_tt = sorted(df["TIPO DE TRABAJO"].dropna().astype(str).unique().tolist())
+        if "tipo_trabajo" in opciones:
             tipo_trabajo_sel = st.sidebar.multiselect(
                 "Tipo de trabajo",
-                options=opciones_tt,
+                options=opciones["tipo_trabajo"],
                 default=[]
             )
 
         tipo_cliente_sel = []
-        if "TIPO DE CLIENTE" in df.columns:
-            opciones_tc = sorted(df["TIPO DE CLIENTE"].dropna().astype(str).unique().tolist())
+        if "tipo_cliente" in opciones:
             tipo_cliente_sel = st.sidebar.multiselect(
                 "Tipo de cliente",
-                options=opciones_tc,
+                options=opciones["tipo_cliente"],
                 default=[]
             )
 
@@ -344,40 +677,50 @@ def main():
 
         # Captación / Estado
         capt_sel = []
-        if "CAPTACIÓN CLIENTE" in dff.columns:
-            opts = sorted(dff["CAPTACIÓN CLIENTE"].dropna().astype(str).unique().tolist())
-            capt_sel = st.multiselect("Captación cliente", opts, default=[])
+        if "captacion" in opciones:
+            capt_sel = st.multiselect("Captación cliente", opciones["captacion"], default=[])
 
         estado_sel = []
-        if "ESTADO" in dff.columns:
-            opts = sorted(dff["ESTADO"].dropna().astype(str).unique().tolist())
-            estado_sel = st.multiselect("Estado", opts, default=[])
-        
-        # Aplicar filtros (si no hay selección, no filtra => se queda todo)
-        if anio_sel and "AÑO" in dff.columns:
-            dff = dff[pd.to_numeric(dff["AÑO"], errors="coerce").isin(anio_sel)]
-        if mes_sel and "MES" in dff.columns:
-            dff = dff[dff["MES"].astype(str).isin(mes_sel)]
-        if tipo_trabajo_sel and "TIPO DE TRABAJO" in dff.columns:
-            dff = dff[dff["TIPO DE TRABAJO"].astype(str).isin(tipo_trabajo_sel)]
-        if tipo_cliente_sel and "TIPO DE CLIENTE" in dff.columns:
-            dff = dff[dff["TIPO DE CLIENTE"].astype(str).isin(tipo_cliente_sel)]
-        if cliente_text and "CLIENTE" in dff.columns:
-            dff = dff[dff["CLIENTE"].astype(str).str.contains(cliente_text, case=False, na=False)]
-        if capt_sel and "CAPTACIÓN CLIENTE" in dff.columns:
-            dff = dff[dff["CAPTACIÓN CLIENTE"].astype(str).isin(capt_sel)]
-        if estado_sel and "ESTADO" in dff.columns:
-            dff = dff[dff["ESTADO"].astype(str).isin(estado_sel)]
+        if "estado" in opciones:
+            estado_sel = st.multiselect("Estado", opciones["estado"], default=[])
+
+        # Aplicar filtros: una única máscara y un único subconjunto de filas
+        # (si no hay selección, no filtra => dff es el propio df, sin copia)
+        dff, mask = apply_filters(
+            df,
+            {
+                "estudio": estudio_sel,
+                "anio": anio_sel,
+                "mes": mes_sel,
+                "tipo_trabajo": tipo_trabajo_sel,
+                "tipo_cliente": tipo_cliente_sel,
+                "captacion": capt_sel,
+                "estado": estado_sel,
+            },
+            cliente_text,
+        )
 
-            
         st.caption(f"Filas tras filtros: {len(dff):,}".replace(",", "."))
+        if approx_enabled():
+            st.caption(f"Modo aproximado ({APPROX_ENV}): clientes ±1,6 % y medianas ±0,8 % del rango (sketches).")
 
 
 
     # ✅ KPIs y métricas SIEMPRE sobre lo filtrado (o todo si no hay filtros)
-    metrics = build_metrics(dff)
+    # Sin filtros, las vistas salen de la caché compartida (pre-calentada)
+    is_default = bool(mask.all()) and not anio_sel and not estudio_sel
+    views = view_cache()
+    # DASHBOARD_APPROX=1: clientes distintos y medianas con sketches (src/sketches.py)
+    approx = approx_enabled()
+
+    def _view(name: str, compute):
+        return views.get(data_key, name, compute) if is_default else compute()
+
+    metrics = _view("metrics", lambda: _base_metrics(df, data_key, bundle_dir, approx)) if is_default else build_metrics(dff, approx=approx)
+    if is_default and warmup_enabled():
+        views.warm(data_key, default_views(df, approx))
     total_trab = len(dff)
-    total_fact = dff["MI PRECIO"].sum(min_count=1) if "MI PRECIO" in dff.columns else np.nan
+    total_fact = cents_to_euros(dff["MI PRECIO"].sum(min_count=1)) if "MI PRECIO" in dff.columns else np.nan
     total_h = dff["HORAS DEDICADAS"].sum(min_count=1) if "HORAS DEDICADAS" in dff.columns else np.nan
     eur_h = (total_fact / total_h) if pd.notna(total_fact) and pd.notna(total_h) and total_h > 0 else np.nan
     st.subheader("KPIs")
@@ -396,7 +739,10 @@ def main():
         )
 
     with kpi_cols[0]:
-        kpi("Clientes", f"{dff['CLIENTE'].nunique():,}".replace(",", "."))
+        if approx:
+            kpi("Clientes", f"≈ {approx_nunique(dff['CLIENTE']):,.0f}".replace(",", "."))
+        else:
+            kpi("Clientes", f"{dff['CLIENTE'].nunique():,}".replace(",", "."))
 
     with kpi_cols[1]:
         kpi("Trabajos", f"{total_trab:,}".replace(",", "."))
@@ -438,15 +784,9 @@ def main():
                 cap = cap.sort_values(value_col, ascending=False)
 
                 # Top N + Otros
-                TOP_N = 7
-                top = cap.head(TOP_N).copy()
-                others = cap.iloc[TOP_N:][value_col].sum()
-
-                if others > 0:
-                    top = pd.concat(
-                        [top, pd.DataFrame([{"CAPTACIÓN CLIENTE": "Otros", value_col: others}])],
-                        ignore_index=True
-                    )
+                top = top_n_otros(cap, "CAPTACIÓN CLIENTE", n=7, value_col=value_col, sum_cols=[value_col])
+
+                import plotly.express as px  # solo aquí: importarlo cuesta ~1 s
 
                 fig = px.pie(
                     top,
@@ -481,17 +821,20 @@ def main():
     # =========================
     st.header("Análisis")
 
+    # Altair se importa al llegar a los gráficos: los KPIs ya se han enviado
+    import altair as alt
+
     tab_tt, tab_tc, tab_cl, tab_temp, tab_strat = st.tabs(["Tipo de trabajo", "Tipo de cliente", "Cliente", "Evolución Temporal", "Acciones (TT x TC)"])
     # -------------------------
     # TAB 1: Tipo de trabajo
     # -------------------------
     with tab_tt:
         st.subheader("Tipo de trabajo: Honorarios vs €/h (tamaño = nº trabajos)")
-        by_tt = agg_profitability(dff, "TIPO DE TRABAJO")
+        by_tt = _view("agg:TIPO DE TRABAJO", lambda: agg_profitability(dff, "TIPO DE TRABAJO"))
         if by_tt.empty:
             st.info("No hay datos suficientes (asegura MI PRECIO y HORAS DEDICADAS, y que exista TIPO DE TRABAJO).")
         else:
-            st.altair_chart(scatter_fact_vs_eurh(by_tt, "TIPO DE TRABAJO", "Tipos de trabajo"), use_container_width=True)
+            show_chart(scatter_fact_vs_eurh(by_tt, "TIPO DE TRABAJO", "Tipos de trabajo"), "scatter_tipo_trabajo")
             st.caption("Guía rápida: derecha = más €/h · arriba = más honorarios · tamaño = más trabajos")
 
             with st.expander("Cómo interpretar el gráfico"):
@@ -518,43 +861,17 @@ def main():
                 t = t.reset_index(drop=True)
                 t = t.rename(columns={"TIPO DE TRABAJO": "Tipo de trabajo", "trabajos": "Nº trabajos",
                                     "horas": "Horas", "facturacion": "Honorarios", "eur_h": "€/h"})
-                st.dataframe(
-                    t.style
-                    .format({
-                        "Honorarios": money,
-                        "Horas": num_1,
-                        "€/h": money_2,
-                    })
-                    # 👇 SOLO colorea €/h
-                    .background_gradient(
-                        subset=["€/h"],
-                        cmap="Greens"
-                    ),
-                    width="stretch"
-                )
+                show_table(t, bars=["€/h"])
             with c2:
                 st.write("Top por Honorarios (más facturación)")
                 t = by_tt.sort_values("facturacion", ascending=False).head(15).copy()
                 t = t.reset_index(drop=True)
                 t = t.rename(columns={"TIPO DE TRABAJO": "Tipo de trabajo", "trabajos": "Nº trabajos",
                                     "horas": "Horas", "facturacion": "Honorarios", "eur_h": "€/h"})
-                st.dataframe(
-                    t.style
-                    .format({
-                        "Honorarios": money,
-                        "Horas": num_1,
-                        "€/h": money_2,
-                    })
-                    # 👇 SOLO colorea Honorarios
-                    .background_gradient(
-                        subset=["Honorarios"],
-                        cmap="Blues"
-                    ),
-                    width="stretch"
-                )
+                show_table(t, bars=["Honorarios"])
             
         st.subheader("Acciones sugeridas")
-        rec = make_recos(by_tt, "TIPO DE TRABAJO")
+        rec = make_recos(by_tt, "TIPO DE TRABAJO", approx=approx)
 
         st.write("✅ **Priorizar** (alta facturación + alto €/h)")
 
@@ -566,23 +883,7 @@ def main():
             "eur_h": "€/h",
         })
         t = t.reset_index(drop=True)
-        styler = (
-            t.style
-            .format({
-                "Honorarios": money,
-                "Horas": num_1,
-                "€/h": money_2,
-            })
-        )
-
-        styler = style_fact_eurh(
-            styler,
-            fact_cmap="Blues",
-            eurh_cmap="Greens",
-            eurh_reverse=False,  # verde = mejor
-        )
-
-        st.dataframe(styler, width="stretch")
+        show_table(t, bars=["Honorarios", "€/h"])
 
         st.write("🛠️ **Optimizar / subir precio** (alta facturación + bajo €/h)")
 
@@ -594,22 +895,7 @@ def main():
             "eur_h": "€/h",
         })
         t = t.reset_index(drop=True)
-        styler = (
-            t.style
-            .format({
-                "Honorarios": money,
-                "Horas": num_1,
-                "€/h": money_2,
-            })
-        )
-
-        styler = style_fact_eurh(
-            styler,
-            fact_cmap="Blues",
-            eurh_reverse=True,   # 🔥 rojo = €/h bajo
-        )
-
-        st.dataframe(styler, width="stretch")
+        show_table(t, bars=["Honorarios"], reds=["€/h"])
 
 
         st.write("🚀 **Potenciar** (alto €/h pero poco volumen)")
@@ -622,23 +908,13 @@ def main():
             "eur_h": "€/h",
         })
         t = t.reset_index(drop=True)
-        styler = (
-            t.style
-            .format({
-                "Honorarios": money,
-                "Horas": num_1,
-                "€/h": money_2,
-            })
-            .background_gradient(subset=["€/h"], cmap="Greens")
-        )
-
-        st.dataframe(styler, width="stretch")
+        show_table(t, bars=["€/h"])
     # -------------------------
     # TAB 2: Tipo de cliente
     # -------------------------
 
     with tab_tc:
-        by_tc = agg_profitability(dff, "TIPO DE CLIENTE")
+        by_tc = _view("agg:TIPO DE CLIENTE", lambda: agg_profitability(dff, "TIPO DE CLIENTE"))
         if by_tc.empty:
             st.info("No hay datos suficientes (asegura MI PRECIO y HORAS DEDICADAS, y que exista TIPO DE CLIENTE).")
         else:
@@ -651,42 +927,8 @@ def main():
             cols_needed = {"TIPO DE CLIENTE", "TIPO DE TRABAJO", "NOMBRE ENCARGO"}
             if cols_needed.issubset(dff.columns):
 
-                # Conteo de trabajos
-                demand = (
-                    dff.groupby(["TIPO DE TRABAJO", "TIPO DE CLIENTE"], dropna=False)
-                    .agg(trabajos=("NOMBRE ENCARGO", "count"))
-                    .reset_index()
-                )
-
-                # Ordenar tipos de trabajo por volumen total (desc)
-                order_tt = (
-                    demand.groupby("TIPO DE TRABAJO")["trabajos"]
-                    .sum()
-                    .sort_values(ascending=False)
-                    .index
-                    .tolist()
-                )
+                demand, order_tt, order_tc = _view("demand_tt_tc", lambda: demand_tt_tc(dff))
 
-                # Ordenar tipos de cliente por volumen total (desc)
-                order_tc = (
-                    demand.groupby("TIPO DE CLIENTE")["trabajos"]
-                    .sum()
-                    .sort_values(ascending=False)
-                    .index
-                    .tolist()
-                )
-                demand["rango_trabajos"] = pd.cut(
-                demand["trabajos"],
-                bins=[0, 1, 3, 6, 10, 100],
-                labels=[
-                    "1",
-                    "2–3",
-                    "4–6",
-                    "7–10",
-                    ">10"
-                ]
-            )
-                
                 heatmap = (
                     alt.Chart(demand)
                     .mark_rect(stroke="white", strokeWidth=1)
@@ -723,7 +965,7 @@ def main():
                 )
             
                 heatmap = heatmap 
-                st.altair_chart(heatmap, use_container_width=True)
+                show_chart(heatmap, "heatmap_tt_tc")
                 st.caption(
             "Interpretación: filas = tipo de trabajo, columnas = tipo de cliente. "
             "Cuanto más oscuro, más trabajos en esa combinación. Pasa el ratón para ver el número exacto."
@@ -753,16 +995,7 @@ def main():
                     "facturacion": "Honorarios",
                     "eur_h": "€/h",
                 })
-                st.dataframe(
-                    t.style
-                    .format({
-                        "Honorarios": money,
-                        "Horas": num_1,
-                        "€/h": money_2,
-                    })
-                    .background_gradient(subset=["€/h"], cmap="Greens"),
-                    width="stretch"
-                )
+                show_table(t, bars=["€/h"])
 
             with c2:
                 st.write("Top por Honorarios (más facturación)")
@@ -775,22 +1008,13 @@ def main():
                     "facturacion": "Honorarios",
                     "eur_h": "€/h",
                 })
-                st.dataframe(
-                    t.style
-                    .format({
-                        "Honorarios": money,
-                        "Horas": num_1,
-                        "€/h": money_2,
-                    })
-                    .background_gradient(subset=["Honorarios"], cmap="Blues"),
-                    width="stretch"
-                )
+                show_table(t, bars=["Honorarios"])
 
             # -------------------------
             # Acciones sugeridas
             # -------------------------
             st.subheader("Acciones sugeridas")
-            rec = make_recos(by_tc, "TIPO DE CLIENTE")
+            rec = make_recos(by_tc, "TIPO DE CLIENTE", approx=approx)
 
             # ✅ Priorizar
             st.write("✅ **Priorizar** (alta facturación + alto €/h)")
@@ -802,21 +1026,7 @@ def main():
                 "eur_h": "€/h",
             })
             t = t.reset_index(drop=True)
-            styler = (
-                t.style
-                .format({
-                    "Honorarios": money,
-                    "Horas": num_1,
-                    "€/h": money_2,
-                })
-            )
-            styler = style_fact_eurh(
-                styler,
-                fact_cmap="Blues",
-                eurh_cmap="Greens",
-                eurh_reverse=False
-            )
-            st.dataframe(styler, width="stretch")
+            show_table(t, bars=["Honorarios", "€/h"])
 
             # 🛠️ Optimizar
             st.write("🛠️ **Optimizar / renegociar** (alta facturación + bajo €/h)")
@@ -828,20 +1038,7 @@ def main():
                 "eur_h": "€/h",
             })
             t = t.reset_index(drop=True)
-            styler = (
-                t.style
-                .format({
-                    "Honorarios": money,
-                    "Horas": num_1,
-                    "€/h": money_2,
-                })
-            )
-            styler = style_fact_eurh(
-                styler,
-                fact_cmap="Blues",
-                eurh_reverse=True  # rojo = €/h bajo
-            )
-            st.dataframe(styler, width="stretch")
+            show_table(t, bars=["Honorarios"], reds=["€/h"])
 
             # 🚀 Potenciar
             st.write("🚀 **Potenciar** (alto €/h pero poco volumen)")
@@ -853,16 +1050,7 @@ def main():
                 "eur_h": "€/h",
             })
             t = t.reset_index(drop=True)
-            styler = (
-                t.style
-                .format({
-                    "Honorarios": money,
-                    "Horas": num_1,
-                    "€/h": money_2,
-                })
-                .background_gradient(subset=["€/h"], cmap="Greens")
-            )
-            st.dataframe(styler, width="stretch")
+            show_table(t, bars=["€/h"])
 
     
     # -------------------------
@@ -871,7 +1059,7 @@ def main():
 
     with tab_cl:
         
-        by_cl = agg_profitability(dff, "CLIENTE")
+        by_cl = _view("agg:CLIENTE", lambda: agg_profitability(dff, "CLIENTE"))
         if by_cl.empty:
             st.info("No hay datos suficientes (asegura MI PRECIO y HORAS DEDICADAS, y que exista CLIENTE).")
         else:
@@ -879,7 +1067,6 @@ def main():
             # -------------------------
             # Rentabilidad y volumen por cliente
             # -------------------------
-            by_cl = agg_profitability(dff, "CLIENTE")
             if by_cl.empty:
                 st.info("No hay datos suficientes (asegura MI PRECIO y HORAS DEDICADAS, y que exista CLIENTE).")
             else:
@@ -906,27 +1093,14 @@ def main():
                     t = by_cl.sort_values("eur_h", ascending=False).head(15).copy()
                     t = prep(t)
 
-                    st.dataframe(
-                        t.style
-                        .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                        .background_gradient(subset=["€/h"], cmap="Greens")
-                        .background_gradient(subset=["Honorarios"], cmap="Blues"),
-                        width="stretch"
-                    )
+                    show_table(t, bars=["€/h", "Honorarios"])
 
                 with c2:
                     st.write("⚠️ Clientes menos rentables (€/h bajo)")
                     t = by_cl.sort_values("eur_h", ascending=True).head(15).copy()
                     t = prep(t)
 
-                    st.dataframe(
-                        t.style
-                        .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                        # rojo fuerte para €/h bajo
-                        .background_gradient(subset=["€/h"], cmap="Reds_r")
-                        .background_gradient(subset=["Honorarios"], cmap="Blues"),
-                        width="stretch"
-                    )
+                    show_table(t, bars=["Honorarios"], reds=["€/h"])
 
                 # =========================
                 # 2) Volumen (Honorarios / Trabajos)
@@ -940,27 +1114,93 @@ def main():
                     t = by_cl.sort_values("facturacion", ascending=False).head(15).copy()
                     t = prep(t)
 
-                    st.dataframe(
-                        t.style
-                        .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                        .background_gradient(subset=["Honorarios"], cmap="Blues"),
-                        width="stretch"
-                    )
+                    show_table(t, bars=["Honorarios"])
 
                 with c4:
                     st.write("🧱 Clientes con más carga (Nº trabajos)")
                     t = by_cl.sort_values("trabajos", ascending=False).head(15).copy()
                     t = prep(t)
 
-                    st.dataframe(
-                        t.style
-                        .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                        .background_gradient(subset=["Nº trabajos"], cmap="Purples"),
-                        width="stretch"
-                    )
+                    show_table(t, bars=["Nº trabajos"])
 
                 st.caption("Nota: el €/h se calcula como Honorarios / Horas (si horas > 0).")
 
+                # =========================
+                # 3) Drill-down: las filas salen del índice de grupos del
+                #    dataset cortado por la máscara de filtros, sin volver
+                #    a filtrar dff
+                # =========================
+                st.subheader("🔎 Detalle de un cliente")
+                indexes = _group_indexes(df, df_key)
+                dims = {label: col for label, col in DRILL_DIMENSIONS.items() if col in indexes}
+                c5, c6 = st.columns([1, 3])
+                with c5:
+                    dim_label = st.radio("Ver por", list(dims), key="drill_dim")
+                dim_col = dims[dim_label]
+                gi = indexes[dim_col]
+                counts = gi.counts(mask)
+                present = np.flatnonzero(counts > 0)
+                present = present[np.argsort(-counts[present], kind="stable")]
+                n_rows = {gi.keys[i]: int(counts[i]) for i in present}
+                with c6:
+                    sel = st.selectbox(
+                        dim_label,
+                        list(n_rows),
+                        format_func=lambda k: f"{k} ({n_rows[k]} trabajo{'s' if n_rows[k] != 1 else ''})",
+                        key=f"drill_{dim_col}",
+                    )
+
+                if sel is not None:
+                    mix_col = "CLIENTE" if dim_col == "TIPO DE TRABAJO" else "TIPO DE TRABAJO"
+                    dd = drilldown(df, gi.positions(sel, mask), mix_col)
+                    rows = dd["rows"]
+                    d_fact = cents_to_euros(rows["MI PRECIO"].sum(min_count=1)) if "MI PRECIO" in rows.columns else np.nan
+                    d_h = rows["HORAS DEDICADAS"].sum(min_count=1) if "HORAS DEDICADAS" in rows.columns else np.nan
+                    d_cols = st.columns(4)
+                    with d_cols[0]:
+                        kpi("Trabajos", f"{len(rows):,}".replace(",", "."))
+                    with d_cols[1]:
+                        kpi("Honorarios", money(d_fact))
+                    with d_cols[2]:
+                        kpi("Horas", f"{d_h:,.0f}".replace(",", ".") if pd.notna(d_h) else "—")
+                    with d_cols[3]:
+                        kpi("€/h", money_2(d_fact / d_h) if pd.notna(d_h) and d_h > 0 else "—")
+
+                    mensual = dd["mensual"]
+                    if len(mensual):
+                        chart = (
+                            alt.Chart(mensual)
+                            .mark_bar()
+                            .encode(
+                                x=alt.X("periodo:N", title="Mes de entrega", axis=alt.Axis(labelAngle=-45)),
+                                y=alt.Y("facturacion:Q", title="Facturación (€)"),
+                                tooltip=[
+                                    alt.Tooltip("periodo:N", title="Mes"),
+                                    alt.Tooltip("facturacion:Q", title="Facturación (€)", format=",.0f"),
+                                    alt.Tooltip("encargos:Q", title="Encargos entrados"),
+                                ],
+                            )
+                            .properties(height=260)
+                        )
+                        show_chart(chart, "drill_mensual")
+
+                    if len(dd["mix"]):
+                        st.write(f"Mezcla por {'cliente' if mix_col == 'CLIENTE' else 'tipo de trabajo'}")
+                        t = dd["mix"].rename(columns={
+                            mix_col: "Cliente" if mix_col == "CLIENTE" else "Tipo de trabajo",
+                            "trabajos": "Nº trabajos",
+                            "horas": "Horas",
+                            "facturacion": "Honorarios",
+                            "eur_h": "€/h",
+                        }).reset_index(drop=True)
+                        show_table(t, bars=["Honorarios"])
+
+                    with st.expander(f"Trabajos ({len(rows)})"):
+                        dview = rows[[c for c in rows.columns if not str(c).startswith("UNNAMED")]]
+                        if "MI PRECIO" in dview.columns:
+                            dview = dview.assign(**{"MI PRECIO": cents_to_euros(dview["MI PRECIO"])})
+                        st.dataframe(dview, column_config=table_config(dview, formats=DETAIL_FORMATS), width="stretch")
+
 
 
     # -------------------------
@@ -1018,27 +1258,81 @@ def main():
                     .configure_view(stroke=None)
                 )
 
-                st.altair_chart(chart, use_container_width=True)
+                show_chart(chart, "serie_entradas_facturacion")
 
         else:
             st.info("No se pudo construir la serie temporal dual (time_series_dual).")
 
+        st.subheader("Ventanas móviles e interanual")
+        # Eje denso de periodos: cambiar granularidad o ventana no vuelve a agrupar dff
+        serie = _view("timeseries", lambda: TimeSeries(dff))
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            freq = st.radio(
+                "Granularidad",
+                options=list(TS_FREQS),
+                index=list(TS_FREQS).index("M"),
+                format_func=lambda f: TS_FREQS[f][1],
+                horizontal=True,
+                key="ts_freq",
+            )
+        medidas = serie.measures(freq)
+        with c2:
+            medida = st.selectbox(
+                "Medida",
+                options=medidas,
+                format_func=lambda m: {
+                    "encargos_entrados": "Encargos entrados",
+                    "importe_entrado": "Importe entrado (€)",
+                    "facturacion_entrega": "Facturación por entrega (€)",
+                }[m],
+                key="ts_medida",
+            )
+        with c3:
+            ventana = st.selectbox("Ventana móvil (periodos)", options=[1, 3, 12], index=1, key="ts_ventana")
+
+        tv = serie.view(medida, freq, ventana)
+        if tv.empty:
+            st.info("No hay fechas suficientes para esta serie.")
+        else:
+            es_importe = medida != "encargos_entrados"
+            fmt = ",.0f" if es_importe else ",d"
+            base = alt.Chart(tv).encode(
+                x=alt.X("periodo:N", sort=tv["periodo"].tolist(), title=TS_FREQS[freq][1], axis=alt.Axis(labelAngle=-45))
+            )
+            tooltip = [
+                alt.Tooltip("periodo:N", title=TS_FREQS[freq][1]),
+                alt.Tooltip("valor:Q", title="Valor", format=fmt),
+                alt.Tooltip("movil:Q", title=f"Móvil {ventana}", format=",.0f"),
+                alt.Tooltip("interanual_pct:Q", title="Interanual (%)", format="+.1f"),
+                alt.Tooltip("acumulado_anio:Q", title="Acumulado año", format=",.0f"),
+            ]
+            bars = base.mark_bar(opacity=0.35).encode(y=alt.Y("valor:Q", title="Valor"), tooltip=tooltip)
+            line = base.mark_line(point=True, strokeWidth=3).encode(
+                y=alt.Y("movil:Q", title=f"Total móvil ({ventana})"), tooltip=tooltip
+            )
+            chart = alt.layer(bars, line).properties(height=320).configure_view(stroke=None)
+            show_chart(chart, f"serie_{medida}_{freq}_{ventana}")
+
+            tabla = tv.rename(columns={
+                "periodo": TS_FREQS[freq][1],
+                "valor": "Valor",
+                "movil": f"Móvil ({ventana})",
+                "interanual": "Interanual",
+                "interanual_pct": "Interanual (%)",
+                "acumulado_anio": "Acumulado año",
+            })
+            with st.expander("Tabla de la serie"):
+                st.dataframe(tabla.iloc[::-1], hide_index=True, width="stretch")
+
         st.subheader("Facturación por año y tipo de cliente")
 
-        # 1) Agregación
-        df_year_tt = (
-            dff.dropna(subset=["AÑO", "TIPO DE CLIENTE", "MI PRECIO"])
-            .groupby(["AÑO", "TIPO DE CLIENTE"], dropna=False)
-            .agg(facturacion=("MI PRECIO", "sum"))
-            .reset_index()
-        )
+        # 1) Agregación (AÑO ya como texto)
+        df_year_tt = _view("year_tipo_cliente", lambda: year_tipo_cliente(dff))
 
         if df_year_tt.empty:
             st.info("No hay datos suficientes (AÑO, TIPO DE TRABAJO y MI PRECIO).")
         else:
-            # Asegura tipos y orden de años
-            df_year_tt["AÑO"] = df_year_tt["AÑO"].astype(int).astype(str)
-
             years = sorted(df_year_tt["AÑO"].unique().tolist())
 
             # 2) Gráfico barras agrupadas (dodge)
@@ -1065,7 +1359,7 @@ def main():
                 .configure_view(stroke=None)
             )
 
-            st.altair_chart(chart, use_container_width=True)
+            show_chart(chart, "facturacion_anio_tipo_cliente")
 
     # -------------------------
     # Acciones estratégicas (Tipo trabajo x Tipo cliente)
@@ -1080,48 +1374,11 @@ def main():
         if not cols_needed.issubset(dff.columns):
             st.info("Faltan columnas necesarias para este análisis (TT, TC, MI PRECIO, HORAS DEDICADAS, NOMBRE ENCARGO).")
         else:
-            tmp = dff.copy()
-
-            # Asegurar numéricos
-            tmp["MI PRECIO"] = pd.to_numeric(tmp["MI PRECIO"], errors="coerce")
-            tmp["HORAS DEDICADAS"] = pd.to_numeric(tmp["HORAS DEDICADAS"], errors="coerce")
-
-            by_tt_tc = (
-                tmp.dropna(subset=["TIPO DE TRABAJO", "TIPO DE CLIENTE"])
-                .groupby(["TIPO DE TRABAJO", "TIPO DE CLIENTE"], dropna=False)
-                .agg(
-                    trabajos=("NOMBRE ENCARGO", "count"),
-                    horas=("HORAS DEDICADAS", "sum"),
-                    facturacion=("MI PRECIO", "sum"),
-                )
-                .reset_index()
-            )
+            by_tt_tc = _view("tt_tc_actions", lambda: tt_tc_actions(dff, approx))
 
             if by_tt_tc.empty:
                 st.info("No hay datos suficientes con la selección actual.")
             else:
-                # €/h robusto
-                by_tt_tc["eur_h"] = np.where(by_tt_tc["horas"] > 0, by_tt_tc["facturacion"] / by_tt_tc["horas"], np.nan)
-
-                # Quitamos combinaciones sin horas o sin facturación (opcional)
-                by_tt_tc = by_tt_tc.replace([np.inf, -np.inf], np.nan)
-
-                fact_med = by_tt_tc["facturacion"].median(skipna=True)
-                eurh_med = by_tt_tc["eur_h"].median(skipna=True)
-
-                def classify(row):
-                    if pd.isna(row["facturacion"]) or pd.isna(row["eur_h"]):
-                        return "Sin datos"
-                    if row["facturacion"] >= fact_med and row["eur_h"] >= eurh_med:
-                        return "Escalar"
-                    if row["facturacion"] >= fact_med and row["eur_h"] < eurh_med:
-                        return "Revisar"
-                    if row["facturacion"] < fact_med and row["eur_h"] >= eurh_med:
-                        return "Oportunidad"
-                    return "Evitar"
-
-                by_tt_tc["accion"] = by_tt_tc.apply(classify, axis=1)
-
                 # Helper formato tabla
                 def prep_table(df: pd.DataFrame) -> pd.DataFrame:
                     t = df.copy().reset_index(drop=True)
@@ -1145,68 +1402,151 @@ def main():
 
                 # 1) Escalar
                 st.write("✅ **Escalar** — alto volumen y alta rentabilidad")
-                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Escalar"].sort_values("facturacion", ascending=False))
+                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Escalar"])
                 t.drop(columns=["accion"], inplace=True)
-                st.dataframe(
-                    t.style
-                    .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                    .background_gradient(subset=["Honorarios"], cmap="Blues")
-                    .background_gradient(subset=["€/h"], cmap="Greens"),
-                    width="stretch"
-                )
+                show_table(t, bars=["Honorarios", "€/h"])
 
                 # 2) Revisar
                 st.write("🛠️ **Revisar precio/tiempos** — alto volumen, €/h bajo")
-                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Revisar"].sort_values("facturacion", ascending=False))
+                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Revisar"])
                 t.drop(columns=["accion"], inplace=True)
-                st.dataframe(
-                    t.style
-                    .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                    .background_gradient(subset=["Honorarios"], cmap="Blues")
-                    .background_gradient(subset=["€/h"], cmap="Reds_r"),
-                    width="stretch"
-                )
+                show_table(t, bars=["Honorarios"], reds=["€/h"])
 
                 # 3) Oportunidad
                 st.write("🎯 **Oportunidad** — €/h alto pero poco volumen")
-                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Oportunidad"].sort_values("eur_h", ascending=False))
+                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Oportunidad"])
                 t.drop(columns=["accion"], inplace=True)
-                st.dataframe(
-                    t.style
-                    .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                    .background_gradient(subset=["€/h"], cmap="Greens"),
-                    width="stretch"
-                )
+                show_table(t, bars=["€/h"])
 
                 # 4) Evitar
                 st.write("❌ **Evitar / estandarizar** — bajo impacto y €/h bajo")
-                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Evitar"].sort_values(["facturacion", "eur_h"], ascending=[False, True]))
+                t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Evitar"])
                 t.drop(columns=["accion"], inplace=True)
-                st.dataframe(
-                    t.style
-                    .format({"Honorarios": money, "Horas": num_1, "€/h": money_2})
-                    .background_gradient(subset=["€/h"], cmap="Reds_r"),
-                    width="stretch"
-                )
+                show_table(t, reds=["€/h"])
 
                 # Opcional: mostrar también "Sin datos"
                 if (by_tt_tc["accion"] == "Sin datos").any():
                     st.write("ℹ️ **Sin datos** — falta horas o facturación")
                     t = prep_table(by_tt_tc[by_tt_tc["accion"] == "Sin datos"])
-                    st.dataframe(t, width="stretch")
+                    show_table(t)
+
+                # Simulador what-if: todos los escenarios a la vez sobre las sumas por TT × TC
+                st.divider()
+                with st.expander("🧪 Simulador: ¿y si cambian precios u horas?", expanded=False):
+                    dim_label = st.radio("Ajustar por", ["Tipo de trabajo", "Tipo de cliente"], horizontal=True, key="sim_dim")
+                    dim_col = {"Tipo de trabajo": "TIPO DE TRABAJO", "Tipo de cliente": "TIPO DE CLIENTE"}[dim_label]
+                    valores = by_tt_tc.groupby(dim_col)["facturacion"].sum().sort_values(ascending=False).index.tolist()
+                    sim_sel = st.multiselect(dim_label, valores, default=valores[:1], key=f"sim_vals_{dim_col}")
+                    c1, c2 = st.columns(2)
+                    precio_rng = c1.slider("Precio (%)", -30, 30, (-10, 20), step=5, key="sim_precio")
+                    horas_rng = c2.slider("Horas (%)", -40, 20, (-20, 0), step=5, key="sim_horas")
+                    fijos = st.checkbox(
+                        "Umbrales fijos (medianas actuales)",
+                        value=True,
+                        help="Sin marcar, las medianas se recalculan en cada escenario.",
+                        key="sim_fijos",
+                    )
+
+                    if not sim_sel:
+                        st.info("Elige al menos un valor para simular.")
+                    else:
+                        precios = np.arange(precio_rng[0], precio_rng[1] + 1, 5)
+                        horas_pct = np.arange(horas_rng[0], horas_rng[1] + 1, 5)
+                        sc = scenario_grid(dim_col, sim_sel, 1 + precios / 100, 1 + horas_pct / 100)
+                        sim = evaluate_scenarios(by_tt_tc, sc, ["TIPO DE TRABAJO", "TIPO DE CLIENTE"], fixed_thresholds=fijos)
+                        resumen = summarize_scenarios(sim, sc)
+                        resumen["precio_pct"] = np.rint((resumen["precio_mult"] - 1) * 100).astype(int)
+                        resumen["horas_pct"] = np.rint((resumen["horas_mult"] - 1) * 100).astype(int)
+
+                        heat = (
+                            alt.Chart(resumen)
+                            .mark_rect()
+                            .encode(
+                                x=alt.X("precio_pct:O", title="Precio (%)"),
+                                y=alt.Y("horas_pct:O", title="Horas (%)", sort="descending"),
+                                color=alt.Color("eur_h:Q", title="€/h global"),
+                                tooltip=[
+                                    alt.Tooltip("precio_pct:O", title="Precio (%)"),
+                                    alt.Tooltip("horas_pct:O", title="Horas (%)"),
+                                    alt.Tooltip("eur_h:Q", title="€/h global", format=",.2f"),
+                                    alt.Tooltip("facturacion:Q", title="Honorarios (€)", format=",.0f"),
+                                    alt.Tooltip("grupos_cambian:Q", title="Combinaciones que cambian de acción"),
+                                    alt.Tooltip("a_escalar:Q", title="Pasan a Escalar"),
+                                ],
+                            )
+                            .properties(height=300)
+                            .configure_view(stroke=None)
+                        )
+                        show_chart(heat, f"simulador_{dim_col}")
+
+                        c1, c2 = st.columns(2)
+                        p_sel = c1.select_slider("Escenario: precio (%)", options=precios.tolist(), value=precios[-1].item(), key="sim_p")
+                        h_sel = c2.select_slider("Escenario: horas (%)", options=horas_pct.tolist(), value=horas_pct[0].item(), key="sim_h")
+                        fila = resumen[(resumen["precio_pct"] == p_sel) & (resumen["horas_pct"] == h_sel)].iloc[0]
+                        horas_base = by_tt_tc["horas"].sum()
+                        eur_h_base = by_tt_tc["facturacion"].sum() / horas_base if horas_base > 0 else np.nan
+                        c1.metric(
+                            "€/h global",
+                            money(fila["eur_h"]),
+                            delta=f"{fila['eur_h'] - eur_h_base:+.2f} €/h" if pd.notna(eur_h_base) else None,
+                        )
+                        c2.metric("Combinaciones que cambian de acción", int(fila["grupos_cambian"]))
+
+                        esc = sim[sim["escenario"] == fila["escenario"]]
+                        tocadas = esc[(esc["precio_mult"] != 1) | (esc["horas_mult"] != 1) | esc["cambia"]]
+                        t = tocadas[["TIPO DE TRABAJO", "TIPO DE CLIENTE", "eur_h_base", "eur_h", "accion_base", "accion"]].rename(columns={
+                            "TIPO DE TRABAJO": "Tipo de trabajo",
+                            "TIPO DE CLIENTE": "Tipo de cliente",
+                            "eur_h_base": "€/h actual",
+                            "eur_h": "€/h simulado",
+                            "accion_base": "Acción actual",
+                            "accion": "Acción simulada",
+                        })
+                        show_table(t.reset_index(drop=True), bars=["€/h simulado"])
+
+    # =========================
+    # Informe Excel (se genera al pulsar, no en cada ejecución)
+    # =========================
+    st.download_button(
+        "📥 Descargar informe Excel (según selección)",
+        data=lambda: report_file(metrics, dff),
+        file_name=f"informe_{datetime.now():%Y%m%d}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore",
+        key="informe_xlsx",
+    )
 
     # =========================
     # Detalle (opcional)
     # =========================
     with st.expander("🔍 Ver detalle de trabajos (según selección)", expanded=False):
-        dview = dff.copy()
-        for col in ["YM_ENCARGO","YM_ENTREGA"]: 
-            if col in dview.columns:
-                dview["_YM"] = pd.PeriodIndex(dview[col].astype(str), freq="M")
-                dview = dview.sort_values("_YM", ascending=False).drop(columns=["_YM"])
+        # Orden precalculado sobre el dataset completo; aquí solo se filtra
+        # por la máscara y se envía la página visible.
+        c1, c2, c3 = st.columns([2, 1, 1])
+        with c1:
+            visibles = [c for c in df.columns if c not in ("UNNAMED 0", "UNNAMED 11")]
+            cols_sel = st.multiselect("Columnas", visibles, default=visibles, key="detalle_cols")
+        with c2:
+            recientes = st.radio("Orden", ["Más recientes", "Más antiguos"], key="detalle_orden") == "Más recientes"
+        with c3:
+            page_size = st.selectbox("Filas por página", [50, 100, 250, 500], index=1, key="detalle_page_size")
+
+        pos = filtered_positions(_detail_order(df, df_key, recientes), mask)
+        total_pages = n_pages(len(pos), page_size)
+        page = st.number_input(f"Página (de {total_pages})", min_value=1, max_value=total_pages, value=1, step=1, key="detalle_page")
+
+        dview = page_slice(df, pos, int(page), page_size, cols_sel)
+        if "MI PRECIO" in dview.columns:
+            dview = dview.assign(**{"MI PRECIO": cents_to_euros(dview["MI PRECIO"])})
         dview = dview.rename(columns={"YM_ENCARGO": "FECHA DE ENCARGO", "YM_ENTREGA": "FECHA DE ENTREGA"})
-        
-        st.dataframe(dview.drop(columns=["UNNAMED 0","UNNAMED 11"], errors="ignore"), width="stretch")
+
+        st.dataframe(
+            dview,
+            column_config=table_config(dview, formats=DETAIL_FORMATS),
+            width="stretch",
+        )
+        st.caption(f"{len(pos):,} filas".replace(",", "."))
+    chart_sizes_panel()
     st.caption("Nota: Las métricas se recalculan automáticamente al cargar/actualizar el Excel. No requiere ejecutar código.")
 
 
@@ -1215,4 +1555,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Mientras dura una ejecución de usuario el pre-calentamiento espera
+    with view_cache().user_run():
+        main()
\ No newline at end of file
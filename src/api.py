@@ -0,0 +1,246 @@
+"""
+API local de solo lectura con las mismas métricas que el dashboard.
+
+    python -m src.api --excel data/GENERAL.xlsx --port 8765
+
+Carga el dataset una vez (bundle fresco o, si no, lee el Excel y escribe el
+bundle) y lo recarga solo si cambia el Excel. Endpoints (GET):
+
+- ``/health``                 origen, sha256 y nº de filas
+- ``/options``                valores posibles de cada filtro
+- ``/metrics``                nombres de métricas y de dimensiones
+- ``/metrics/<nombre>``       una tabla de build_metrics (kpis, by_cliente...)
+- ``/aggregate/<dimensión>``  trabajos, facturación, horas y €/h por dimensión
+
+Filtros por query string, como en el dashboard: ``estudio``, ``anio``, ``mes``,
+``tipo_trabajo``, ``tipo_cliente``, ``captacion``, ``estado`` (repetidos o
+separados por comas) y ``cliente`` (texto). ``format=arrow`` devuelve un
+stream Arrow IPC en lugar de JSON. Cada respuesta lleva un ETag derivado
+del sha256 del Excel y de la clave de filtros; con ``If-None-Match`` se
+responde 304 sin recalcular.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from .filters import FILTER_COLUMNS, apply_filters, filter_options
+from .pipeline import build_metrics, load_trabajos_realizados, refresh_bundle
+from .views import agg_profitability
+
+DIMENSIONS = {**FILTER_COLUMNS, "cliente": "CLIENTE", "localidad": "LOCALIDAD"}
+TEXT_FILTERS = ("cliente",)
+FORMATS = {"json": "application/json; charset=utf-8", "arrow": "application/vnd.apache.arrow.stream"}
+RESPONSE_CACHE_SIZE = 256
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_filters(query: dict[str, list[str]]) -> tuple[dict[str, list], str]:
+    """Query string -> (selecciones como en apply_filters, texto de cliente)."""
+    selections: dict[str, list] = {}
+    cliente = ""
+    for key, values in query.items():
+        if key == "format":
+            continue
+        if key in TEXT_FILTERS:
+            cliente = " ".join(v.strip() for v in values if v.strip())
+            continue
+        if key not in FILTER_COLUMNS:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Filtro desconocido: {key}")
+        vals = [v.strip() for raw in values for v in raw.split(",") if v.strip()]
+        if key == "anio":
+            try:
+                vals = [int(v) for v in vals]
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "anio debe ser numérico") from None
+        selections[key] = vals
+    return selections, cliente
+
+
+def filter_key(selections: dict[str, list], cliente: str) -> str:
+    """Clave canónica de filtros (el orden de los parámetros no importa)."""
+    canon = {k: sorted(str(v) for v in vals) for k, vals in sorted(selections.items()) if vals}
+    if cliente:
+        canon["cliente"] = [cliente.lower()]  # el filtro de texto no distingue mayúsculas
+    return json.dumps(canon, ensure_ascii=False, sort_keys=True)
+
+
+def make_etag(digest: str, path: str, key: str, fmt: str) -> str:
+    h = hashlib.sha1(f"{digest}|{path}|{key}|{fmt}".encode("utf-8")).hexdigest()
+    return f'"{h}"'
+
+
+def encode_frame(df: pd.DataFrame, fmt: str) -> bytes:
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return df.to_json(orient="records", force_ascii=False, date_format="iso").encode("utf-8")
+
+
+class MetricsService:
+    """Dataset cargado una vez y respuestas cacheadas por ETag (seguro entre hilos)."""
+
+    def __init__(self, excel_path: Path, bundle_dir: Path):
+        self.excel_path = Path(excel_path)
+        self.bundle_dir = Path(bundle_dir)
+        self._lock = threading.Lock()
+        self._digest: str | None = None
+        self._clients: str | None = None
+        self._df: pd.DataFrame | None = None
+        self._metrics: dict[str, pd.DataFrame] = {}
+        self._responses: OrderedDict[str, bytes] = OrderedDict()
+
+    def dataset(self) -> tuple[str, str, pd.DataFrame, dict[str, pd.DataFrame]]:
+        """(sha256 del Excel, huella de las correcciones de clientes, filas, métricas)."""
+        from .bundle import file_digest, is_fresh, load_fact, load_metrics
+        from .clients import clients_digest
+
+        digest = file_digest(self.excel_path)  # memoizado por mtime/tamaño
+        with self._lock:
+            clients = clients_digest(self.excel_path.parent)
+            if (digest, clients) != (self._digest, self._clients):
+                if is_fresh(self.bundle_dir, digest, clients):
+                    df, metrics = load_fact(self.bundle_dir), load_metrics(self.bundle_dir)
+                else:
+                    df = load_trabajos_realizados(self.excel_path)
+                    clients = clients_digest(self.excel_path.parent)  # la lectura puede ampliar la caché de alias
+                    metrics, _ = refresh_bundle(self.bundle_dir, df, digest, self.excel_path.name, clients_digest=clients)
+                self._digest, self._clients, self._df, self._metrics = digest, clients, df, metrics
+                self._responses.clear()
+            return self._digest, self._clients, self._df, self._metrics
+
+    def _cached(self, etag: str, compute) -> bytes:
+        with self._lock:
+            if etag in self._responses:
+                self._responses.move_to_end(etag)
+                return self._responses[etag]
+        body = compute()
+        with self._lock:
+            self._responses[etag] = body
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return body
+
+    def handle(self, url: str, if_none_match: str | None = None) -> tuple[int, dict[str, str], bytes]:
+        """(status, cabeceras, cuerpo) de un GET; sin dependencias de HTTP para poder probarlo."""
+        parts = urlsplit(url)
+        path = parts.path.rstrip("/") or "/health"
+        query = parse_qs(parts.query)
+        fmt = query.get("format", ["json"])[-1]
+        if fmt not in FORMATS:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"format debe ser {' o '.join(FORMATS)}")
+
+        digest, clients, df, base_metrics = self.dataset()
+        selections, cliente = parse_filters(query)
+        key = filter_key(selections, cliente)
+        # Otras correcciones de clientes, otras respuestas: también cambian el ETag
+        etag = make_etag(f"{digest}|{clients}", path, key, fmt)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            return HTTPStatus.NOT_MODIFIED, headers, b""
+
+        segments = path.strip("/").split("/")
+        if segments[0] in ("health", "options", "metrics") and len(segments) == 1:
+            if segments[0] == "health":
+                payload = {"status": "ok", "source": self.excel_path.name, "sha256": digest, "rows": int(len(df))}
+            elif segments[0] == "options":
+                payload = filter_options(df)
+            else:
+                payload = {"metrics": sorted(base_metrics), "dimensions": sorted(DIMENSIONS), "filters": sorted(FILTER_COLUMNS) + list(TEXT_FILTERS)}
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            return HTTPStatus.OK, {**headers, "Content-Type": FORMATS["json"]}, body
+
+        if len(segments) != 2 or segments[0] not in ("metrics", "aggregate"):
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {path}")
+        kind, name = segments
+
+        def compute() -> bytes:
+            dff, mask = apply_filters(df, selections, cliente)
+            if kind == "metrics":
+                metrics = base_metrics if mask.all() else build_metrics(dff)
+                if name not in metrics:
+                    raise ApiError(HTTPStatus.NOT_FOUND, f"Métrica desconocida: {name}")
+                return encode_frame(metrics[name], fmt)
+            if name not in DIMENSIONS:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Dimensión desconocida: {name}")
+            return encode_frame(agg_profitability(dff, DIMENSIONS[name]), fmt)
+
+        body = self._cached(etag, compute)
+        return HTTPStatus.OK, {**headers, "Content-Type": FORMATS[fmt]}, body
+
+
+def make_handler(service: MetricsService) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "MetricsAPI/1.0"
+
+        def do_GET(self) -> None:
+            try:
+                status, headers, body = service.handle(self.path, self.headers.get("If-None-Match"))
+            except ApiError as e:
+                status, body = e.status, json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+                headers = {"Content-Type": FORMATS["json"]}
+            except Exception as e:  # no cortar la conexión sin respuesta
+                self.log_error("Error en %s: %r", self.path, e)
+                status = HTTPStatus.INTERNAL_SERVER_ERROR
+                body = json.dumps({"error": type(e).__name__}).encode("utf-8")
+                headers = {"Content-Type": FORMATS["json"]}
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def log_request(self, code="-", size="-") -> None:  # sin log por petición; los errores sí
+            pass
+
+    return Handler
+
+
+def make_server(service: MetricsService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Servidor con un hilo por petición; port=0 elige un puerto libre (tests)."""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    base = Path(__file__).resolve().parents[1]
+
+    parser = argparse.ArgumentParser(description="API local de métricas (JSON / Arrow) con ETag.")
+    parser.add_argument("--excel", type=Path, default=base / "data" / "GENERAL.xlsx")
+    parser.add_argument("--bundle", type=Path, default=base / "artifacts" / "bundle")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    service = MetricsService(args.excel, args.bundle)
+    service.dataset()  # carga antes de aceptar peticiones
+    server = make_server(service, args.host, args.port)
+    print(f"Sirviendo métricas de {args.excel.name} en http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
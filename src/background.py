@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from .utils import ParseCancelled
+
+# Lectura del Excel en segundo plano: un hilo por trabajo, con etapa,
+# filas leídas y cancelación cooperativa (la lectura comprueba el evento
+# cada PROGRESS_EVERY filas). El script de Streamlit solo consulta el estado.
+
+STAGES = ["en cola", "abriendo", "leyendo", "limpiando", "guardando", "listo"]
+
+
+class ParseJob:
+    """
+    Ejecuta target(*args, progress=..., cancel=...) en un hilo demonio.
+    target recibe el callback de progreso y el evento de cancelación.
+    """
+
+    def __init__(self, key: str, target: Callable[..., Any], *args: Any):
+        self.key = key
+        self.stage = STAGES[0]
+        self.rows = 0
+        self.estimated: Optional[int] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, args=(target, args), name=f"parse-{key[:12]}", daemon=True)
+
+    def start(self) -> "ParseJob":
+        self._thread.start()
+        return self
+
+    def _progress(self, stage: str, rows: int = 0, estimated: Optional[int] = None) -> None:
+        with self._lock:
+            self.stage, self.rows = stage, rows
+            if estimated is not None:
+                self.estimated = estimated
+
+    def _run(self, target: Callable[..., Any], args: tuple) -> None:
+        try:
+            result = target(*args, progress=self._progress, cancel=self._cancel)
+            with self._lock:
+                self.result, self.stage = result, "listo"
+        except ParseCancelled:
+            with self._lock:
+                self.stage = "cancelado"
+        except BaseException as e:  # se muestra en la UI, no se relanza en el hilo
+            with self._lock:
+                self.error, self.stage = e, "error"
+        finally:
+            self.finished_at = time.monotonic()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def ok(self) -> bool:
+        return self.done and self.error is None and not self.cancelled
+
+    def fraction(self) -> float:
+        """Avance aproximado 0..1 (etapa + filas leídas dentro de 'leyendo')."""
+        with self._lock:
+            stage, rows, estimated = self.stage, self.rows, self.estimated
+        if stage not in STAGES:
+            return 1.0
+        i = STAGES.index(stage)
+        within = min(rows / estimated, 1.0) if stage == "leyendo" and estimated else 0.0
+        return min((i + within) / (len(STAGES) - 1), 1.0)
+
+    def status(self) -> str:
+        with self._lock:
+            stage, rows = self.stage, self.rows
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return f"{stage.capitalize()} · {rows:,} filas · {elapsed:.0f}s".replace(",", ".")
@@ -0,0 +1,161 @@
+"""
+Benchmark de arranque en frío del CLI y del dashboard.
+
+Mide, siempre en un intérprete nuevo:
+
+- import: ``python -X importtime`` del módulo de entrada (tiempo acumulado
+  y los módulos más caros), y qué dependencias pesadas se cargan;
+- primer render: ``run_all`` sobre el Excel con el bundle ya fresco, y
+  ``AppTest`` de Streamlit hasta que ``app.py`` pinta las tablas, en frío
+  (lee el Excel) y con el bundle ya escrito. El dashboard usa un TMPDIR
+  propio con el Excel como último subido, para no depender del estado
+  de la máquina.
+
+Falla (código 1) si algún tiempo supera su umbral, o supera la línea
+base guardada con ``--save`` en más de ``--tolerance``, o si el CLI
+importa alguna dependencia de gráficos.
+
+    python -m src.bench_startup
+    python -m src.bench_startup --save bench_startup.json
+    python -m src.bench_startup --baseline bench_startup.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Umbrales absolutos (ms)
+THRESHOLDS_MS = {
+    "cli_import": 1500,
+    "cli_first_run": 4000,
+    "app_import": 4000,
+    "app_cold_render": 20000,
+    "app_first_render": 10000,
+}
+
+# El CLI no debe cargar nada de gráficos ni de Streamlit
+CLI_FORBIDDEN = ["altair", "plotly", "matplotlib", "streamlit"]
+
+_LOADED = "import sys, json; print(json.dumps(sorted(m for m in sys.modules if '.' not in m)))"
+
+
+def _python(code: str, *flags: str, env: dict | None = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env=None if env is None else {**os.environ, **env},
+    )
+
+
+def import_profile(module: str, top: int = 8) -> dict:
+    """Tiempo acumulado de importar `module` (µs -> ms) y sus imports más caros."""
+    proc = _python(f"import {module}; " + _LOADED, "-X", "importtime")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # cabecera
+        rows.append((int(cumulative), name[1:].rstrip()))  # la sangría indica el anidamiento
+    total = next((c for c, n in rows if n == module), max((c for c, _ in rows), default=0))
+    # Imports de primer nivel (sangría de 2 espacios bajo el módulo de entrada)
+    heavy = sorted(((c, n.strip()) for c, n in rows if n.startswith("  ") and not n.startswith("   ")), reverse=True)
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "ms": round(total / 1000, 1),
+        "top": [[n, round(c / 1000, 1)] for c, n in heavy[:top]],
+        "loaded": loaded,
+    }
+
+
+def _timed(code: str, env: dict | None = None) -> float:
+    """Tiempo (ms) de un snippet en un intérprete nuevo, incluidos sus imports."""
+    proc = _python("import time; _t0 = time.perf_counter()\n" + code + "\nprint((time.perf_counter() - _t0) * 1000)", env=env)
+    return round(float(proc.stdout.strip().splitlines()[-1]), 1)
+
+
+def cli_first_run(excel: Path, out_dir: Path) -> float:
+    return _timed(
+        "import warnings; warnings.simplefilter('ignore')\n"
+        "from pathlib import Path\n"
+        "from src.pipeline import run_all\n"
+        f"run_all(Path({str(excel)!r}), Path({str(out_dir)!r}))"
+    )
+
+
+def app_first_render(tmpdir: Path) -> float:
+    """Hasta que el dashboard pinta sus tablas (esperando a la lectura en segundo plano)."""
+    return _timed(
+        "from streamlit.testing.v1 import AppTest\n"
+        "at = AppTest.from_file('app.py', default_timeout=300)\n"
+        "at.run()\n"
+        "while not at.dataframe and not at.exception and time.perf_counter() - _t0 < 300:\n"
+        "    time.sleep(0.05)\n"
+        "    at.run()\n"
+        "assert not at.exception, [e.value for e in at.exception]\n"
+        "assert at.dataframe, 'el dashboard no llegó a pintar'",
+        env={"TMPDIR": str(tmpdir)},
+    )
+
+
+def run(excel: Path) -> dict:
+    results: dict = {}
+    cli = import_profile("src.cli_export")
+    results["cli_import"] = cli["ms"]
+    results["cli_import_top"] = cli["top"]
+    results["cli_forbidden_loaded"] = [m for m in CLI_FORBIDDEN if m in cli["loaded"]]
+    results["app_import"] = import_profile("app")["ms"]
+    with tempfile.TemporaryDirectory() as tmp:
+        cli_first_run(excel, Path(tmp))  # escribe el bundle
+        results["cli_first_run"] = cli_first_run(excel, Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        app_tmp = Path(tmp) / "vigo_estudio_app"
+        app_tmp.mkdir()
+        shutil.copy(excel, app_tmp / "last_uploaded.xlsx")
+        results["app_cold_render"] = app_first_render(Path(tmp))
+        results["app_first_render"] = app_first_render(Path(tmp))
+    return results
+
+
+def check(results: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    failures = []
+    if results["cli_forbidden_loaded"]:
+        failures.append(f"el CLI importa {results['cli_forbidden_loaded']}")
+    for key, limit in THRESHOLDS_MS.items():
+        if results[key] > limit:
+            failures.append(f"{key}: {results[key]:.0f} ms > umbral {limit} ms")
+        if baseline and key in baseline and results[key] > baseline[key] * (1 + tolerance):
+            failures.append(f"{key}: {results[key]:.0f} ms > base {baseline[key]:.0f} ms (+{tolerance:.0%})")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío (CLI y dashboard).")
+    parser.add_argument("--excel", type=Path, default=ROOT / "data" / "GENERAL.xlsx")
+    parser.add_argument("--baseline", type=Path, help="JSON de una ejecución anterior (--save)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Regresión admitida sobre la base (0.25 = +25%%)")
+    parser.add_argument("--save", type=Path, help="Guarda los resultados como nueva línea base")
+    args = parser.parse_args()
+
+    results = run(args.excel)
+    for key in THRESHOLDS_MS:
+        print(f"{key:>18}: {results[key]:8.1f} ms  (umbral {THRESHOLDS_MS[key]} ms)")
+    print("  imports del CLI más caros:", ", ".join(f"{n} {ms:.0f} ms" for n, ms in results["cli_import_top"]))
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    failures = check(results, baseline, args.tolerance)
+    for f in failures:
+        print("FALLO:", f)
+    sys.exit(1 if failures else 0)
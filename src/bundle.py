@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .filters import FILTER_COLUMNS, TENANT_COL
+from .incremental import header_signature
+from .store import ROW_COL, YEAR_COL, read_partitions, read_table, write_partitions, write_table
+
+# Subir si cambia el formato del bundle o la limpieza del loader
+BUNDLE_VERSION = 4
+
+MANIFEST = "manifest.json"
+FACT_DIR = "fact"
+DIMENSIONS_FILE = "dimensions.arrow"
+METRICS_DIR = "metrics"
+CUBE_DIR = "cube"
+FINGERPRINTS_FILE = "fingerprints.arrow"
+
+DIMENSION_COLUMNS = list(FILTER_COLUMNS.values()) + ["CLIENTE", "LOCALIDAD"]
+
+_digest_cache: dict[tuple, str] = {}
+
+
+def file_digest(path: Path) -> str:
+    """sha256 del fichero (memoizado por ruta + mtime + tamaño)."""
+    st = Path(path).stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    if key not in _digest_cache:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _digest_cache[key] = h.hexdigest()
+    return _digest_cache[key]
+
+
+def bytes_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def dimension_dictionaries(df: pd.DataFrame) -> pd.DataFrame:
+    """Valores distintos (ordenados) de cada dimensión: dimension, code, value."""
+    parts = []
+    for col in DIMENSION_COLUMNS:
+        if col not in df.columns:
+            continue
+        vals = sorted(str(v) for v in pd.unique(df[col].dropna()))
+        parts.append(pd.DataFrame({"dimension": col, "code": range(len(vals)), "value": vals}))
+    if not parts:
+        return pd.DataFrame({"dimension": [], "code": [], "value": []})
+    return pd.concat(parts, ignore_index=True)
+
+
+def write_bundle(
+    bundle_dir: Path,
+    df: pd.DataFrame,
+    metrics: dict[str, pd.DataFrame],
+    source_digest: str,
+    source_name: str = "",
+    partition_by: tuple[str, ...] = (TENANT_COL, YEAR_COL),
+    cube: dict[str, pd.DataFrame] | None = None,
+    fingerprints: np.ndarray | None = None,
+    clients_digest: str | None = None,
+) -> Path:
+    """
+    Escribe el bundle columnar (Arrow IPC) y su manifest:
+    tabla de hechos limpia (particionada por ESTUDIO si lo hay y por AÑO,
+    con catálogo de particiones), diccionarios de dimensiones y métricas agregadas,
+    sellado con el sha256 del Excel de origen (y el de las correcciones de
+    clientes, ver clients.clients_digest). Opcionalmente guarda el cubo
+    de agregados y las huellas por fila (recalculo incremental). Se escribe en un directorio
+    temporal y se renombra, para que un lector nunca vea un bundle a medias.
+    """
+    bundle_dir = Path(bundle_dir)
+    tmp = bundle_dir.with_name(bundle_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    (tmp / METRICS_DIR).mkdir(parents=True)
+
+    partitions = write_partitions(df, tmp / FACT_DIR, by=partition_by)
+    tables = {"fact": {"file": FACT_DIR, "rows": int(len(df))}}
+    dims = dimension_dictionaries(df)
+    tables["dimensions"] = {"file": DIMENSIONS_FILE, "rows": write_table(dims, tmp / DIMENSIONS_FILE)}
+    for name, m in metrics.items():
+        rel = f"{METRICS_DIR}/{name}.arrow"
+        tables[f"metric:{name}"] = {"file": rel, "rows": write_table(m, tmp / rel)}
+    if cube is not None:
+        (tmp / CUBE_DIR).mkdir()
+        for name, c in cube.items():
+            rel = f"{CUBE_DIR}/{name}.arrow"
+            tables[f"cube:{name}"] = {"file": rel, "rows": write_table(c, tmp / rel)}
+    if fingerprints is not None:
+        fp = pd.DataFrame({"fp": np.asarray(fingerprints, dtype=np.uint64)})
+        tables["fingerprints"] = {"file": FINGERPRINTS_FILE, "rows": write_table(fp, tmp / FINGERPRINTS_FILE)}
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "source": source_name,
+        "source_sha256": source_digest,
+        "clients_sha256": clients_digest,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "columns": list(df.columns),
+        "header": header_signature(df),
+        "attrs": df.attrs,
+        "tables": tables,
+        "partition_by": [c for c in partition_by if c in df.columns],
+        "partitions": partitions,
+    }
+    (tmp / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+    old = bundle_dir.with_name(bundle_dir.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if bundle_dir.exists():
+        os.replace(bundle_dir, old)
+    os.replace(tmp, bundle_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return bundle_dir
+
+
+def read_manifest(bundle_dir: Path) -> dict | None:
+    path = Path(bundle_dir) / MANIFEST
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(bundle_dir: Path, source_digest: str, clients_digest: str | None = None) -> bool:
+    """
+    Mismo Excel y misma versión de bundle; con clients_digest, además las
+    mismas correcciones y caché de alias de clientes que al escribirlo.
+    """
+    manifest = read_manifest(bundle_dir)
+    return (
+        manifest is not None
+        and manifest.get("version") == BUNDLE_VERSION
+        and manifest.get("source_sha256") == source_digest
+        and (clients_digest is None or manifest.get("clients_sha256") == clients_digest)
+    )
+
+
+def load_fact(bundle_dir: Path, selection: dict | None = None) -> pd.DataFrame:
+    """
+    Tabla de hechos; selection={"AÑO": [2025]} lee solo esas particiones.
+    """
+    manifest = read_manifest(bundle_dir) or {}
+    df = read_partitions(Path(bundle_dir) / FACT_DIR, manifest.get("partitions", []), selection, keep_rows=True)
+    rows = df.pop(ROW_COL).to_numpy()
+    attrs = dict(manifest.get("attrs", {}))
+    # money_issues son posiciones en la tabla completa: se pasan a las filas
+    # leídas (con una selección, un subconjunto) y se quitan las que no están
+    issues = {}
+    for col, positions in attrs.pop("money_issues", {}).items():
+        local = np.flatnonzero(np.isin(rows, positions)).tolist()
+        if local:
+            issues[col] = local
+    if issues:
+        attrs["money_issues"] = issues
+    df.attrs.update(attrs)
+    return df
+
+
+def load_dimensions(bundle_dir: Path) -> dict[str, list[str]]:
+    dims = read_table(Path(bundle_dir) / DIMENSIONS_FILE)
+    return {k: g["value"].tolist() for k, g in dims.groupby("dimension", sort=False)}
+
+
+def load_metrics(bundle_dir: Path) -> dict[str, pd.DataFrame]:
+    manifest = read_manifest(bundle_dir) or {}
+    out: dict[str, pd.DataFrame] = {}
+    for key, info in manifest.get("tables", {}).items():
+        if key.startswith("metric:"):
+            out[key.split(":", 1)[1]] = read_table(Path(bundle_dir) / info["file"])
+    return out
+
+
+def load_cube(bundle_dir: Path) -> dict[str, pd.DataFrame] | None:
+    manifest = read_manifest(bundle_dir) or {}
+    out = {
+        key.split(":", 1)[1]: read_table(Path(bundle_dir) / info["file"])
+        for key, info in manifest.get("tables", {}).items()
+        if key.startswith("cube:")
+    }
+    return out or None
+
+
+def load_fingerprints(bundle_dir: Path) -> np.ndarray | None:
+    info = (read_manifest(bundle_dir) or {}).get("tables", {}).get("fingerprints")
+    if info is None:
+        return None
+    return read_table(Path(bundle_dir) / info["file"])["fp"].to_numpy(dtype=np.uint64)
+
+
+def fresh_bundle_dir(bundle_dirs: list[Path], source_digest: str, clients_digest: str | None = None) -> Path | None:
+    for d in bundle_dirs:
+        if is_fresh(d, source_digest, clients_digest):
+            return Path(d)
+    return None
+
+
+def load_fresh_bundle(
+    bundle_dirs: list[Path],
+    source_digest: str,
+    selection: dict | None = None,
+    clients_digest: str | None = None,
+) -> pd.DataFrame | None:
+    """Tabla de hechos del primer bundle fresco para ese Excel (o None)."""
+    for d in bundle_dirs:
+        if is_fresh(d, source_digest, clients_digest):
+            try:
+                return load_fact(d, selection)
+            except (OSError, pa.ArrowInvalid):
+                continue
+    return None
+
+
+def partition_catalog(bundle_dir: Path) -> list[dict]:
+    return (read_manifest(bundle_dir) or {}).get("partitions", [])
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OTROS = "Otros"
+
+# Máximo de marcas por gráfico antes de agrupar en "Otros"
+DEFAULT_TOP_N = 30
+
+# Filas (tipos de trabajo) del heatmap TT × TC
+HEATMAP_TOP_TT = 25
+
+CHART_DEBUG_ENV = "DASHBOARD_CHART_DEBUG"  # "1": tamaño de cada spec en el dashboard
+LARGE_SPEC_BYTES = 1_000_000  # con la depuración activa, specs mayores se avisan en el log
+
+
+def top_n_otros(
+    df_agg: pd.DataFrame,
+    label_col: str,
+    n: int = DEFAULT_TOP_N,
+    value_col: str = "facturacion",
+    sum_cols: Sequence[str] = ("trabajos", "horas", "facturacion"),
+    otros_label: str = OTROS,
+) -> pd.DataFrame:
+    """
+    Las n filas con más value_col y el resto sumado en una fila "Otros".
+    Si hay horas y facturación, el €/h de "Otros" se recalcula con las sumas.
+    """
+    if len(df_agg) <= n:
+        return df_agg
+    order = np.argsort(-df_agg[value_col].to_numpy(dtype=np.float64, na_value=-np.inf), kind="stable")
+    top = df_agg.iloc[order[:n]]
+    rest = df_agg.iloc[order[n:]]
+
+    row = {label_col: otros_label}
+    for c in sum_cols:
+        if c in rest.columns:
+            row[c] = rest[c].sum()
+    if {"facturacion", "horas", "eur_h"}.issubset(df_agg.columns):
+        row["eur_h"] = row["facturacion"] / row["horas"] if row.get("horas", 0) > 0 else np.nan
+    return pd.concat([top, pd.DataFrame([row])], ignore_index=True)
+
+
+def bin_labels(values: Iterable, edges: Sequence[float], labels: Sequence[str]) -> np.ndarray:
+    """
+    Etiqueta de tramo por valor, intervalos (a, b] como pd.cut pero sin
+    crear un Categorical; fuera de rango -> None.
+    """
+    v = np.asarray(values, dtype=np.float64)
+    idx = np.searchsorted(np.asarray(edges, dtype=np.float64), v, side="left") - 1
+    ok = (idx >= 0) & (idx < len(labels)) & (v > edges[0])
+    out = np.full(len(v), None, dtype=object)
+    out[ok] = np.asarray(labels, dtype=object)[idx[ok]]
+    return out
+
+
+def chart_debug_enabled() -> bool:
+    return os.environ.get(CHART_DEBUG_ENV, "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def spec_size(spec: dict) -> int:
+    """Bytes del spec Vega-Lite serializado (datos incluidos): lo que viaja al navegador."""
+    return len(json.dumps(spec, default=str).encode("utf-8"))
+
+
+def chart_spec(chart, name: str, sizes: dict[str, int] | None = None) -> dict:
+    """
+    Convierte un chart de Altair en spec (dict). Con sizes (solo al
+    depurar: serializar cuesta) anota sizes[name] = bytes del spec.
+    """
+    spec = chart.to_dict()
+    if sizes is not None:
+        size = sizes[name] = spec_size(spec)
+        if size > LARGE_SPEC_BYTES:
+            logger.warning("chart %s: spec de %d bytes", name, size)
+    return spec
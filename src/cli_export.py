@@ -1,12 +1,93 @@
-
 from __future__ import annotations
 
+import argparse
+import time
 from pathlib import Path
-from src.pipeline import run_all
+from src.pipeline import build_metrics, run_all, run_years
+from src.watch import output_dir_for, watch_workbooks
+
+
+def write_extras(args: argparse.Namespace, bundle_dir: Path, out_dir: Path, years: list[int] | None = None) -> None:
+    """--xlsx y --clientes sobre el bundle recién exportado (solo esos años, si se piden)."""
+    if not (args.xlsx or args.clientes):
+        return
+    from src.bundle import load_fact, load_metrics
+
+    fact = load_fact(bundle_dir, {"AÑO": years} if years else None)
+    if args.xlsx:
+        from src.xlsx_export import write_report
+
+        write_report(args.xlsx, build_metrics(fact) if years else load_metrics(bundle_dir), fact)
+        print(f"OK: informe Excel en {args.xlsx}")
+    if args.clientes:
+        from src.client_reports import run_client_reports
+
+        def _progress(stage: str, done: int, total: int | None) -> None:
+            print(f"\r{stage}: {done}/{total}", end="", flush=True)
+
+        summary = run_client_reports(
+            fact, out_dir / "clientes", args.clientes,
+            min_facturacion=args.min_facturacion, progress=_progress,
+        )
+        print()
+        print(
+            f"OK: {summary['escritos']} informes escritos, {summary['omitidos']} al día, "
+            f"{len(summary['errores'])} con error ({summary['segundos']} s) en {out_dir / 'clientes'}"
+        )
+        for cliente, error in summary["errores"].items():
+            print(f"  {cliente}: {error}")
+
 
 if __name__ == "__main__":
     base = Path(__file__).resolve().parents[1]
-    excel_path = base / "data" / "GENERAL.xlsx"
-    out_dir = base / "artifacts"
-    run_all(excel_path, out_dir)
-    print(f"OK: exportados CSVs a {out_dir}")
+
+    parser = argparse.ArgumentParser(description="Exporta las métricas del Excel a CSV + bundle columnar.")
+    parser.add_argument("--excel", type=Path, default=base / "data" / "GENERAL.xlsx")
+    parser.add_argument("--out", type=Path, default=base / "artifacts")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--years", type=int, nargs="+", help="Solo estos años (lee solo sus particiones)")
+    mode.add_argument("--tenants", type=Path, nargs="+", help="Consolida varios libros (uno por estudio)")
+    parser.add_argument("--xlsx", type=Path, help="Además escribe el informe Excel (métricas + detalle) en esta ruta")
+    parser.add_argument("--clientes", choices=["html", "csv"],
+                        help="Además genera un informe por cliente en OUT/clientes (con --years, en el directorio de esos años)")
+    parser.add_argument("--min-facturacion", type=float, default=0.0, help="Solo clientes con al menos esta facturación en € (--clientes)")
+    mode.add_argument("--watch", action="store_true", help="Vigila el directorio del Excel y reexporta al guardar")
+    parser.add_argument("--interval", type=float, default=1.0, help="Segundos entre sondeos (--watch)")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Segundos sin cambios antes de reexportar (--watch)")
+    args = parser.parse_args()
+    if args.watch and (args.xlsx or args.clientes):
+        # Un solo --xlsx para todos los libros vigilados, y regenerarlo en cada guardado
+        parser.error("--xlsx y --clientes no se pueden usar con --watch")
+
+    if args.watch:
+        data_dir = args.excel.parent
+        print(f"Vigilando {data_dir} (Ctrl+C para salir)")
+        try:
+            for workbook in watch_workbooks(data_dir, args.interval, args.debounce):
+                out_dir = output_dir_for(workbook, args.out, args.excel.name)
+                t0 = time.perf_counter()
+                try:
+                    written = run_all(workbook, out_dir)
+                except Exception as e:  # p. ej. libro a medio guardar: se reintenta en el siguiente guardado
+                    print(f"ERROR en {workbook.name}: {e}")
+                    continue
+                took = time.perf_counter() - t0
+                print(f"{workbook.name}: {len(written)} artefactos actualizados en {took:.1f}s -> {out_dir}"
+                      + (f" ({', '.join(written)})" if written else ""))
+        except KeyboardInterrupt:
+            pass
+    elif args.tenants:
+        from src.tenants import run_tenants
+
+        written = run_tenants(args.tenants, args.out)
+        estudios = [t for t in written if t != "TOTAL"]
+        print(f"OK: consolidados {len(estudios)} estudios ({', '.join(estudios)}) en {args.out}")
+        write_extras(args, args.out / "bundle", args.out)
+    elif args.years:
+        years_dir = run_years(args.excel, args.out, args.years)
+        print(f"OK: exportados CSVs de {args.years} a {years_dir}")
+        write_extras(args, args.out / "bundle", years_dir, args.years)
+    else:
+        run_all(args.excel, args.out)
+        print(f"OK: exportados CSVs a {args.out}")
+        write_extras(args, args.out / "bundle", args.out)
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .groups import GroupIndex
+from .incremental import row_fingerprints
+from .money import cents_to_euros
+from .utils import ParseCancelled, ProgressFn
+from .views import agg_profitability
+
+# Informe anual por cliente: un HTML estático (tablas + gráficos Vega-Lite
+# embebidos) o un CSV con sus trabajos, uno por cliente.
+#
+# - Las filas de cada cliente salen de un GroupIndex (posiciones por
+#   CLIENTE calculadas una vez), no de filtrar el dataset cliente a cliente.
+# - El DataFrame llega a cada proceso una sola vez (initializer del pool);
+#   las tareas solo llevan lotes de (cliente, fichero, posiciones).
+# - Reanudable: cada informe se escribe con rename atómico y el manifiesto
+#   guarda la huella de las filas de cada cliente; al relanzar se saltan los
+#   que ya existen con la misma huella.
+# - Los gráficos interactivos cargan Vega desde cdn.jsdelivr.net: hace falta
+#   red al *abrir* el informe. Cada gráfico va además como SVG estático
+#   (_bar_svg), que es lo que se ve sin red o sin JavaScript; si Vega carga,
+#   lo sustituye.
+
+FORMATS = ("html", "csv")
+MANIFEST = "manifest.json"
+REPORT_VERSION = 2
+CHUNK_CLIENTS = 25  # clientes por tarea del pool
+
+DETAIL_COLUMNS = ["FECHA ENTREGA", "NOMBRE ENCARGO", "TIPO DE TRABAJO", "HORAS DEDICADAS", "MI PRECIO", "ESTADO"]
+VEGA_SCRIPTS = [
+    "https://cdn.jsdelivr.net/npm/vega@5",
+    "https://cdn.jsdelivr.net/npm/vega-lite@5",
+    "https://cdn.jsdelivr.net/npm/vega-embed@6",
+]
+BAR_COLOR = "#4c78a8"  # el azul por defecto de Vega-Lite
+
+
+def client_slug(name: str) -> str:
+    """Nombre de fichero estable: 'Concello de Vigo' -> 'concello_de_vigo_1a2b3c4d'."""
+    v = unicodedata.normalize("NFKD", str(name))
+    v = "".join(ch for ch in v if not unicodedata.combining(ch)).lower()
+    v = re.sub(r"[^a-z0-9]+", "_", v).strip("_")[:60] or "cliente"
+    # El hash evita choques entre nombres que se normalizan igual
+    return f"{v}_{hashlib.sha1(str(name).encode('utf-8')).hexdigest()[:8]}"
+
+
+def select_clients(df: pd.DataFrame, index: GroupIndex, min_trabajos: int = 1, min_facturacion: float = 0.0) -> np.ndarray:
+    """Grupos (números de index) con al menos min_trabajos y min_facturacion €."""
+    trabajos = index.sizes()
+    cents = pd.to_numeric(df["MI PRECIO"], errors="coerce").fillna(0).to_numpy(dtype=np.float64) if "MI PRECIO" in df.columns else np.zeros(len(df))
+    facturacion = index.reduce(cents) / 100 if len(index) else np.zeros(0)
+    return np.flatnonzero((trabajos >= min_trabajos) & (facturacion >= min_facturacion))
+
+
+def client_fingerprints(df: pd.DataFrame, index: GroupIndex) -> np.ndarray:
+    """Huella por cliente: suma (módulo 2^64) de las huellas de sus filas; no depende del orden."""
+    if not len(index):
+        return np.empty(0, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return index.reduce(row_fingerprints(df))
+
+
+def client_tables(sub: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Tablas del informe de un cliente (importes en €). Solo las agrupaciones
+    que usa el informe (agg_profitability), no todo build_metrics.
+    """
+    trabajos, facturacion, horas = len(sub), np.nan, np.nan
+    if "MI PRECIO" in sub.columns:
+        facturacion = cents_to_euros(sub["MI PRECIO"].sum(min_count=1))
+    if "HORAS DEDICADAS" in sub.columns:
+        horas = sub["HORAS DEDICADAS"].sum(min_count=1)
+    tables = {"kpis": pd.DataFrame([{
+        "trabajos": trabajos,
+        "facturacion": facturacion,
+        "horas": horas,
+        "eur_h": facturacion / horas if pd.notna(horas) and horas > 0 else np.nan,
+    }])}
+    tt = agg_profitability(sub, "TIPO DE TRABAJO")
+    tables["tipo_trabajo"] = tt.sort_values("facturacion", ascending=False, kind="stable") if len(tt) else tt
+    pagos = agg_profitability(sub, "ESTADO")
+    tables["pagos"] = pagos[["ESTADO", "trabajos", "facturacion"]] if len(pagos) else pagos
+    if "FECHA ENTREGA" in sub.columns and pd.api.types.is_datetime64_any_dtype(sub["FECHA ENTREGA"]):
+        mensual = agg_profitability(sub.assign(YM=sub["FECHA ENTREGA"].dt.strftime("%Y-%m")).dropna(subset=["YM"]), "YM")
+        tables["mensual"] = mensual.sort_values("YM") if len(mensual) else mensual
+    else:
+        tables["mensual"] = pd.DataFrame()
+
+    cols = [c for c in DETAIL_COLUMNS if c in sub.columns]
+    detail = sub[cols]
+    if "FECHA ENTREGA" in detail.columns:
+        detail = detail.sort_values("FECHA ENTREGA", kind="stable")
+    if "MI PRECIO" in detail.columns:
+        detail = detail.assign(**{"MI PRECIO": cents_to_euros(detail["MI PRECIO"])})
+    tables["trabajos"] = detail.reset_index(drop=True)
+    return tables
+
+
+def _bar_spec(df: pd.DataFrame, x: str, y: str, title: str, horizontal: bool = False) -> dict:
+    values = json.loads(df[[x, y]].to_json(orient="records", force_ascii=False))
+    cat = {"field": x, "type": "nominal", "sort": None if not horizontal else "-x", "title": None}
+    num = {"field": y, "type": "quantitative", "title": "€", "axis": {"format": ",.0f"}}
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": title,
+        "width": "container",
+        "data": {"values": values},
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {"y": cat, "x": num} if horizontal else {"x": cat, "y": num},
+    }
+
+
+def _bar_svg(df: pd.DataFrame, x: str, y: str, title: str, horizontal: bool = False) -> str:
+    """El gráfico de _bar_spec como SVG estático (se ve sin red y sin JavaScript)."""
+    labels = [html.escape(str(v)) for v in df[x]]
+    values = pd.to_numeric(df[y], errors="coerce").fillna(0).clip(lower=0).to_numpy(dtype=np.float64)
+    top = values.max() if len(values) and values.max() > 0 else 1.0
+    width, head = 720, 30
+    items = []
+    if horizontal:
+        row, label_w = 22, 220
+        height = head + row * len(values)
+        for i, (label, v) in enumerate(zip(labels, values)):
+            y0 = head + i * row
+            bw = (width - label_w - 110) * v / top
+            items.append(
+                f'<text x="{label_w - 6}" y="{y0 + 15}" text-anchor="end">{label}</text>'
+                f'<rect x="{label_w}" y="{y0 + 3}" width="{bw:.1f}" height="{row - 6}" fill="{BAR_COLOR}"/>'
+                f'<text x="{label_w + bw + 4:.1f}" y="{y0 + 15}">{v:,.0f} €</text>'
+            )
+    else:
+        plot_h, axis_h = 220, 70
+        height = head + plot_h + axis_h
+        slot = (width - 20) / max(len(values), 1)
+        for i, (label, v) in enumerate(zip(labels, values)):
+            bh = plot_h * v / top
+            x0 = 10 + i * slot
+            items.append(
+                f'<rect x="{x0 + slot * 0.1:.1f}" y="{head + plot_h - bh:.1f}" width="{slot * 0.8:.1f}" height="{bh:.1f}" fill="{BAR_COLOR}">'
+                f"<title>{label}: {v:,.0f} €</title></rect>"
+                f'<text transform="translate({x0 + slot / 2:.1f},{head + plot_h + 10}) rotate(-45)" text-anchor="end">{label}</text>'
+            )
+    return (
+        f'<svg viewBox="0 0 {width} {height}" width="100%" font-size="11" role="img">'
+        f'<text x="0" y="16" font-size="13" font-weight="bold">{html.escape(title)}</text>'
+        f'{"".join(items)}</svg>'
+    )
+
+
+def _cell(v) -> str:
+    if v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v)) or v is pd.NaT:
+        return ""
+    if isinstance(v, (float, np.floating)):
+        return f"{v:,.2f}"
+    if isinstance(v, pd.Timestamp):
+        return v.strftime("%Y-%m-%d")
+    return html.escape(str(v))
+
+
+def _table_html(df: pd.DataFrame) -> str:
+    # Más rápido que DataFrame.to_html para las tablas pequeñas de cada informe
+    head = "".join(f"<th>{html.escape(str(c))}</th>" for c in df.columns)
+    cols = [df[c].to_numpy(dtype=object) for c in df.columns]
+    body = "".join("<tr>" + "".join(f"<td>{_cell(v)}</td>" for v in row) + "</tr>" for row in zip(*cols))
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def render_html(cliente: str, tables: dict[str, pd.DataFrame]) -> str:
+    chart_args = []
+    mensual = tables["mensual"]
+    if len(mensual):
+        chart_args.append((mensual, "YM", "facturacion", "Facturación por mes de entrega", False))
+    tt = tables["tipo_trabajo"]
+    if len(tt):
+        chart_args.append((tt, "TIPO DE TRABAJO", "facturacion", "Facturación por tipo de trabajo", True))
+    charts = [_bar_spec(*a) for a in chart_args]
+
+    name = html.escape(str(cliente))
+    parts = [
+        "<!DOCTYPE html>",
+        '<html lang="es"><head><meta charset="utf-8">',
+        f"<title>Resumen de trabajos · {name}</title>",
+        *(f'<script src="{src}"></script>' for src in VEGA_SCRIPTS),
+        "<style>body{font-family:sans-serif;margin:2em;max-width:60em}"
+        "table{border-collapse:collapse;margin-bottom:1.5em}td,th{padding:.2em .6em;border-bottom:1px solid #ddd}"
+        "td{text-align:right}.chart{width:100%;margin-bottom:1.5em}</style>",
+        "</head><body>",
+        f"<h1>{name}</h1>",
+        _table_html(tables["kpis"]),
+    ]
+    for i, a in enumerate(chart_args):
+        parts.append(f'<div class="chart" id="chart{i}"></div><div id="static{i}">{_bar_svg(*a)}</div>')
+    for title, key in [("Por tipo de trabajo", "tipo_trabajo"), ("Estado de pago", "pagos"), ("Trabajos", "trabajos")]:
+        if len(tables[key]):
+            parts += [f"<h2>{title}</h2>", _table_html(tables[key])]
+    if charts:
+        # "</" escapado para que un nombre no pueda cerrar el <script>.
+        # Sin red no hay vegaEmbed y se queda el SVG estático
+        specs = json.dumps(charts, ensure_ascii=False, default=str).replace("</", "<\\/")
+        parts.append(
+            f"<script>const specs = {specs};"
+            'if (window.vegaEmbed) specs.forEach((s, i) => vegaEmbed("#chart" + i, s, {actions: false})'
+            '.then(() => document.getElementById("static" + i).remove()));</script>'
+        )
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def render_csv(tables: dict[str, pd.DataFrame]) -> str:
+    return tables["trabajos"].to_csv(index=False)
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# Estado de cada proceso del pool (lo fija el initializer)
+_WORKER_DF: pd.DataFrame | None = None
+
+
+def _init_worker(df: pd.DataFrame) -> None:
+    global _WORKER_DF
+    _WORKER_DF = df
+
+
+def _render_batch(batch: list[tuple[str, str, np.ndarray]], fmt: str, df: pd.DataFrame | None = None) -> list[tuple[str, str | None]]:
+    """Escribe los informes de un lote; devuelve (cliente, error o None) por cliente."""
+    df = _WORKER_DF if df is None else df
+    out = []
+    for cliente, path, positions in batch:
+        try:
+            tables = client_tables(df.iloc[positions])
+            text = render_html(cliente, tables) if fmt == "html" else render_csv(tables)
+            _write_atomic(Path(path), text)
+            out.append((cliente, None))
+        except Exception as e:  # un cliente con datos raros no para el lote
+            out.append((cliente, f"{type(e).__name__}: {e}"))
+    return out
+
+
+def read_manifest(out_dir: Path, fmt: str) -> dict[str, dict]:
+    try:
+        data = json.loads((Path(out_dir) / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != REPORT_VERSION or data.get("format") != fmt:
+        return {}
+    return data.get("clients", {})
+
+
+def _write_manifest(out_dir: Path, fmt: str, clients: dict[str, dict]) -> None:
+    payload = {"version": REPORT_VERSION, "format": fmt, "clients": clients}
+    _write_atomic(Path(out_dir) / MANIFEST, json.dumps(payload, ensure_ascii=False, indent=1))
+
+
+def run_client_reports(
+    df: pd.DataFrame,
+    out_dir: Path,
+    fmt: str = "html",
+    min_trabajos: int = 1,
+    min_facturacion: float = 0.0,
+    max_workers: int | None = None,
+    progress: ProgressFn | None = None,
+    cancel: threading.Event | None = None,
+) -> dict:
+    """
+    Un informe por cliente en out_dir. Devuelve el resumen: clientes,
+    escritos, omitidos (ya al día), errores {cliente: mensaje} y segundos.
+    progress recibe ("informes", hechos, total).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt} (use {' o '.join(FORMATS)})")
+    t0 = time.perf_counter()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    index = GroupIndex(df["CLIENTE"])
+    selected = select_clients(df, index, min_trabajos, min_facturacion)
+    fingerprints = client_fingerprints(df, index)
+    manifest = read_manifest(out_dir, fmt)
+
+    todo: list[tuple[str, str, np.ndarray]] = []
+    pending_entries: dict[str, dict] = {}
+    skipped = 0
+    for g in selected:
+        cliente = str(index.keys[g])
+        name = f"{client_slug(cliente)}.{fmt}"
+        entry = {"cliente": cliente, "huella": format(int(fingerprints[g]), "016x")}
+        if manifest.get(name) == entry and (out_dir / name).exists():
+            skipped += 1
+            continue
+        manifest.pop(name, None)  # si se interrumpe antes de escribirlo, no cuenta como hecho
+        pending_entries[name] = entry
+        todo.append((cliente, str(out_dir / name), index.group(g)))
+
+    total = len(selected)
+    done = skipped
+    errors: dict[str, str] = {}
+    if progress is not None:
+        progress("informes", done, total)
+
+    def _record(results: list[tuple[str, str | None]], batch: list[tuple[str, str, np.ndarray]]) -> None:
+        nonlocal done
+        for (cliente, error), (_, path, _) in zip(results, batch):
+            if error is None:
+                manifest[Path(path).name] = pending_entries[Path(path).name]
+            else:
+                errors[cliente] = error
+        done += len(batch)
+        _write_manifest(out_dir, fmt, manifest)  # tras cada lote: lo escrito queda registrado
+        if progress is not None:
+            progress("informes", done, total)
+
+    batches = [todo[i:i + CHUNK_CLIENTS] for i in range(0, len(todo), CHUNK_CLIENTS)]
+    workers = max_workers or min(len(batches), os.cpu_count() or 1)
+    if len(batches) <= 1 or workers <= 1:
+        for batch in batches:
+            if cancel is not None and cancel.is_set():
+                raise ParseCancelled(str(out_dir))
+            _record(_render_batch(batch, fmt, df), batch)
+    elif batches:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(df,)) as pool:
+            pending = {pool.submit(_render_batch, b, fmt): b for b in batches}
+            while pending:
+                finished, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    for fut in pending:
+                        fut.cancel()
+                    raise ParseCancelled(str(out_dir))
+                for fut in finished:
+                    _record(fut.result(), pending.pop(fut))
+    _write_manifest(out_dir, fmt, manifest)
+    write_index(out_dir, fmt, manifest)
+
+    return {
+        "clientes": total,
+        "escritos": total - skipped - len(errors),
+        "omitidos": skipped,
+        "errores": errors,
+        "segundos": round(time.perf_counter() - t0, 2),
+    }
+
+
+def write_index(out_dir: Path, fmt: str, clients: dict[str, dict]) -> Path:
+    """Índice de los informes (index.html con enlaces o index.csv)."""
+    rows = sorted(((e["cliente"], name) for name, e in clients.items()), key=lambda r: r[0].lower())
+    if fmt == "csv":
+        path = Path(out_dir) / "index.csv"
+        _write_atomic(path, pd.DataFrame(rows, columns=["cliente", "fichero"]).to_csv(index=False))
+        return path
+    items = "\n".join(f'<li><a href="{html.escape(name)}">{html.escape(c)}</a></li>' for c, name in rows)
+    path = Path(out_dir) / "index.html"
+    _write_atomic(path, f'<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>Informes por cliente</title></head>'
+                        f"<body><h1>Informes por cliente ({len(rows)})</h1><ul>\n{items}\n</ul></body></html>")
+    return path
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+import pandas as pd
+
+# Resolución de entidades de CLIENTE: "Concello de Vigo", "CONCELLO VIGO" y
+# "Concello de Vigo." son el mismo cliente.
+#
+# 1) Clave normalizada (sin tildes, mayúsculas, sin puntuación ni palabras
+#    vacías): las que coinciden se unen sin comparar.
+# 2) Bloques: solo se comparan claves que comparten un token o el prefijo
+#    de la clave compacta (nunca todos contra todos).
+# 3) Similitud (difflib) dentro de cada bloque; los pares por encima del
+#    umbral se unen (union-find). El nombre canónico es la grafía más usada.
+#
+# El mapa de alias se guarda junto al Excel (ALIAS_CACHE) y en la siguiente
+# lectura solo se puntúan las claves nuevas. Las correcciones manuales van
+# en OVERRIDES_FILE (alias,canonico); alias == canonico lo deja separado.
+
+ALIAS_CACHE = ".client_aliases.json"
+OVERRIDES_FILE = "client_overrides.csv"
+CACHE_VERSION = 1
+
+THRESHOLD = 0.9
+MIN_FUZZY_LEN = 6  # claves más cortas solo se unen si son idénticas
+PREFIX_LEN = 4
+MAX_BLOCK = 200  # bloques mayores (tokens muy comunes) no se usan para comparar
+
+STOPWORDS = {"DE", "DEL", "LA", "LAS", "EL", "LOS", "Y", "E", "DA", "DO", "DAS", "DOS", "SL", "SLU", "SA", "SC", "CB"}
+
+_PUNCT = re.compile(r"[^\w\s]")
+
+
+def normalize_name(name: str) -> str:
+    """Clave de comparación: 'Concello de Vigo, S.L.' -> 'CONCELLO VIGO'."""
+    v = unicodedata.normalize("NFKD", str(name))
+    v = "".join(ch for ch in v if not unicodedata.combining(ch)).upper()
+    v = _PUNCT.sub(" ", v.replace(".", ""))
+    tokens = [t for t in v.split() if t not in STOPWORDS]
+    return " ".join(tokens) or " ".join(v.split())
+
+
+def blocking_keys(key: str) -> set[str]:
+    tokens = key.split()
+    out = {f"t:{t}" for t in tokens if len(t) >= 3}
+    compact = key.replace(" ", "")
+    if len(compact) >= PREFIX_LEN:
+        out.add(f"p:{compact[:PREFIX_LEN]}")
+    return out
+
+
+def similarity(a: str, b: str) -> float:
+    # Máximo entre el orden original y el de tokens ordenados ("VIGO CONCELLO")
+    direct = SequenceMatcher(None, a, b).ratio()
+    sa, sb = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    return max(direct, SequenceMatcher(None, sa, sb).ratio()) if (sa, sb) != (a, b) else direct
+
+
+class _UnionFind:
+    def __init__(self, parent: dict[str, str] | None = None):
+        self.parent = dict(parent or {})
+
+    def add(self, x: str) -> None:
+        self.parent.setdefault(x, x)
+
+    def find(self, x: str) -> str:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: str, b: str) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Raíz estable: la menor, para que el mapa no dependa del orden
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def cluster_keys(keys: list[str], known: dict[str, str] | None = None) -> tuple[dict[str, str], int]:
+    """
+    {clave: raíz del grupo}. known es el mapa de una ejecución anterior:
+    solo se comparan los pares en los que hay al menos una clave nueva.
+    Devuelve (mapa, nº de pares puntuados).
+    """
+    uf = _UnionFind(known)
+    new = {k for k in keys if k not in uf.parent}
+    for k in keys:
+        uf.add(k)
+
+    blocks: dict[str, list[str]] = defaultdict(list)
+    for k in uf.parent:
+        for b in blocking_keys(k):
+            blocks[b].append(k)
+
+    scored: set[tuple[str, str]] = set()
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK:
+            continue
+        fresh = [k for k in members if k in new]
+        for a in fresh:
+            if len(a.replace(" ", "")) < MIN_FUZZY_LEN:
+                continue
+            for b in members:
+                if a == b or len(b.replace(" ", "")) < MIN_FUZZY_LEN:
+                    continue
+                pair = (a, b) if a < b else (b, a)
+                if pair in scored:
+                    continue
+                scored.add(pair)
+                if uf.find(a) != uf.find(b) and similarity(a, b) >= THRESHOLD:
+                    uf.union(a, b)
+    return {k: uf.find(k) for k in uf.parent}, len(scored)
+
+
+def load_overrides(path: Path) -> dict[str, str]:
+    """client_overrides.csv (alias,canonico) -> {clave normalizada del alias: canónico}."""
+    if not Path(path).exists():
+        return {}
+    out = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or not row[0].strip() or row[0].strip().lower() == "alias":
+                continue
+            out[normalize_name(row[0])] = row[1].strip()
+    return out
+
+
+def _read_cache(path: Path) -> dict[str, str]:
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION or data.get("threshold") != THRESHOLD:
+        return {}
+    return data.get("keys", {})
+
+
+def _write_cache(path: Path, keys: dict[str, str]) -> None:
+    tmp = Path(path).with_name(f"{Path(path).name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps({"version": CACHE_VERSION, "threshold": THRESHOLD, "keys": keys}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)  # la caché es opcional (p. ej. directorio de solo lectura)
+
+
+def clients_digest(*dirs: Path) -> str:
+    """
+    sha256 de OVERRIDES_FILE y ALIAS_CACHE en esos directorios: lo que decide
+    la unificación de CLIENTE además del propio Excel. Un bundle con otra
+    huella tiene fusiones de clientes obsoletas.
+    """
+    h = hashlib.sha256()
+    for d in dirs:
+        for name in (OVERRIDES_FILE, ALIAS_CACHE):
+            try:
+                data = (Path(d) / name).read_bytes()
+            except OSError:
+                data = None
+            h.update(f"{name}\0{-1 if data is None else len(data)}\n".encode("utf-8"))
+            h.update(data or b"")
+    return h.hexdigest()
+
+
+def resolve_clients(clientes: pd.Series, cache_dir: Path | None = None) -> tuple[pd.Series, dict[str, str]]:
+    """
+    CLIENTE con los nombres canónicos y {nombre original: canónico} de los
+    que cambian. Con cache_dir, reutiliza y actualiza el mapa de alias y
+    aplica las correcciones manuales de ese directorio.
+    """
+    counts = clientes.dropna().value_counts()
+    if counts.empty:
+        return clientes, {}
+    names = [str(n) for n in counts.index]
+    keys = {n: normalize_name(n) for n in names}
+
+    cache_path = Path(cache_dir) / ALIAS_CACHE if cache_dir is not None else None
+    known = _read_cache(cache_path) if cache_path is not None else {}
+    roots, n_scored = cluster_keys(sorted(set(keys.values())), known)
+    if cache_path is not None and (n_scored or len(roots) != len(known)):
+        _write_cache(cache_path, roots)
+
+    # Canónico de cada grupo: la grafía más frecuente (value_counts ya ordena)
+    canonical: dict[str, str] = {}
+    for n in names:
+        canonical.setdefault(roots[keys[n]], n)
+    overrides = load_overrides(Path(cache_dir) / OVERRIDES_FILE) if cache_dir is not None else {}
+
+    mapping = {}
+    for n in names:
+        target = overrides.get(keys[n], canonical[roots[keys[n]]])
+        if target != n:
+            mapping[n] = target
+    if not mapping:
+        return clientes, {}
+    # map + where en lugar de replace (replace con dict va valor a valor)
+    mapped = clientes.map(mapping)
+    return mapped.where(mapped.notna(), clientes).astype(clientes.dtype), mapping
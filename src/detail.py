@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+# Columnas de mes por las que se ordena el detalle (la última es la principal)
+ORDER_COLUMNS = ["YM_ENCARGO", "YM_ENTREGA"]
+
+NO_MONTH = np.iinfo(np.int64).min
+
+
+def month_key(s: pd.Series) -> np.ndarray:
+    """'2025-01' -> ordinal de mes (int64); vacíos/NaT -> NO_MONTH."""
+    # Pocos meses distintos: se parsean solo los valores únicos
+    codes, uniques = pd.factorize(s.astype(str))
+    ym = pd.PeriodIndex(uniques, freq="M")
+    keys = np.where(ym.isna(), NO_MONTH, ym.asi8).astype(np.int64)
+    return keys[codes] if len(codes) else np.empty(0, dtype=np.int64)
+
+
+def detail_order(df: pd.DataFrame, descending: bool = True, cols: Iterable[str] = ORDER_COLUMNS) -> np.ndarray:
+    """
+    Orden de filas del detalle sobre el dataset completo (se calcula una vez
+    por dataset). Los meses vacíos van siempre al final.
+    """
+    keys = [np.arange(len(df))]
+    for col in cols:
+        if col not in df.columns:
+            continue
+        k = month_key(df[col])
+        missing = k == NO_MONTH
+        k = -k if descending else k
+        keys.append(np.where(missing, np.iinfo(np.int64).max, k))
+    return np.lexsort(keys)
+
+
+def filtered_positions(order: np.ndarray, mask: np.ndarray | None) -> np.ndarray:
+    """Posiciones ordenadas de las filas que pasan el filtro (sin reordenar)."""
+    if mask is None:
+        return order
+    return order[mask[order]]
+
+
+def page_slice(
+    df: pd.DataFrame,
+    positions: np.ndarray,
+    page: int,
+    page_size: int,
+    columns: list[str] | None = None,
+) -> pd.DataFrame:
+    """Solo las filas (y columnas) de la página pedida; page empieza en 1."""
+    start = max(page - 1, 0) * page_size
+    rows = positions[start:start + page_size]
+    cols = [c for c in (columns or list(df.columns)) if c in df.columns]
+    return df.iloc[rows][cols]
+
+
+def n_pages(n_rows: int, page_size: int) -> int:
+    return max(1, -(-n_rows // page_size))
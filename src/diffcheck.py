@@ -0,0 +1,455 @@
+"""
+Pruebas diferenciales de los caminos optimizados contra la referencia.
+
+Referencia: ``load_trabajos_realizados`` + ``build_metrics`` sobre un
+GENERAL.xlsx generado al azar (filas de título, AÑO/MES solo en la primera
+fila del bloque, cabeceras con alias, columnas opcionales que faltan,
+nulos, horas a cero, importes no representables, filas duplicadas y
+clientes escritos de varias formas). Cada camino alternativo debe dar las
+mismas tablas:
+
+- ``cubo``          metrics_from_cube(build_cube(df))
+- ``incremental``   el cubo actualizado por trozos con update_cube
+- ``bundle``        métricas guardadas en el bundle Arrow (load_metrics)
+- ``bundle_filas``  build_metrics sobre la tabla de hechos del bundle
+- ``paralelo``      load_tenants con dos libros en procesos + tenant_metrics
+- ``serie_densa``   TimeSeries frente a time_series_dual
+- ``aprox``         build_metrics(approx=True)
+
+Tolerancias (ver ``compare_tables``): conteos e importes (sumas de
+céntimos enteros) exactos; horas y cocientes (medias, €/h) con rtol=1e-9
+porque el orden de las sumas en coma flotante cambia; ``clientes_unicos``
+aproximado con HLL_RTOL (4 desviaciones de HyperLogLog p=12, ver
+src/sketches.py). Cada camino se cronometra y se informa su aceleración
+frente a build_metrics (``paralelo``: frente a leer y agregar los dos libros
+uno detrás de otro). Sale con código 1 si algún caso no coincide.
+
+    python -m src.diffcheck
+    python -m src.diffcheck --cases 20 --rows 5000 --seed 7 --json diffcheck.json
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from .pipeline import build_metrics, load_trabajos_realizados, metrics_from_cube
+
+RTOL = 1e-9
+HLL_RTOL = 4 * 1.04 / np.sqrt(2 ** 12)
+
+# Columnas que deben coincidir exactamente (conteos y sumas de céntimos)
+EXACT_COLUMNS = {
+    "trabajos", "trabajos_total", "encargos_entrados", "clientes_unicos",
+    "facturacion", "facturacion_total", "importe", "importe_entrado", "facturacion_entrega",
+}
+
+# Cabecera canónica -> variantes que reconoce utils.HEADER_ALIASES
+HEADERS = {
+    "AÑO": ["AÑO", "ANIO", "ANYO"],
+    "MES": ["MES", "MES DE ENCARGO"],
+    "CLIENTE": ["CLIENTE", "CLIENTES"],
+    "NOMBRE ENCARGO": ["NOMBRE ENCARGO", "ENCARGO"],
+    "LOCALIDAD": ["LOCALIDAD", "MUNICIPIO", "POBLACIÓN"],
+    "TIPO DE CLIENTE": ["TIPO DE CLIENTE"],
+    "TIPO DE TRABAJO": ["TIPO DE TRABAJO", "TIPO TRABAJO"],
+    "CAPTACIÓN CLIENTE": ["CAPTACIÓN DE CLIENTE", "CAPTACION CLIENTE"],
+    "MI PRECIO": ["PRECIO", "MI PRECIO"],
+    "FACTURA": ["FACTURA "],
+    "FECHA ENTREGA": ["FECHA ENTREGA", "FECHA ENTREGA "],
+    "HORAS DEDICADAS": ["HORAS DEDICADAS", "HORAS"],
+    "PRECIO/HORA": ["PRECIO/HORA", "€/H"],
+    "ESTADO": ["ESTADO", "COBRADO"],
+}
+OPTIONAL = ["LOCALIDAD", "TIPO DE CLIENTE", "CAPTACIÓN CLIENTE", "FACTURA", "FECHA ENTREGA", "HORAS DEDICADAS", "PRECIO/HORA", "ESTADO"]
+
+MONTHS = ["ENERO", "FEBRERO", "MARZO", "ABRIL", "MAYO", "JUNIO", "JULIO", "AGOSTO",
+          "SEPTIEMBRE", "OCTUBRE", "NOVIEMBRE", "DICIEMBRE"]
+# Mismo cliente escrito de varias formas (src/clients.py los unifica)
+CLIENT_VARIANTS = [
+    ["Concello de Vigo", "CONCELLO DE VIGO", "Concello de Vigo.", " concello  de vigo "],
+    ["Construcciones Pérez S.L.", "CONSTRUCCIONES PEREZ SL", "Construcciones Perez"],
+    ["Ayuntamiento de Écija", "AYTO ECIJA", "Ayuntamiento de Ecija"],
+]
+LOCALIDADES = ["ÉCIJA", "SEVILLA", "VIGO", "LA LUISIANA", "FUENTES DE ANDALUCÍA"]
+TIPOS_CLIENTE = ["PARTICULAR", "PROMOTOR", "CONTRATISTA", "ADMINISTRACIÓN"]
+TIPOS_TRABAJO = ["PROYECTO", "PRESUPUESTO", "CERTIFICADOS", "PLANOS PREVIOS", "DEO", "INSPECCION", "LEGALIZACIÓN"]
+CAPTACION = ["YO", "PAPÁ", "WEB", "RECOMENDACIÓN"]
+ESTADOS = ["PAGADO", "PENDIENTE", "NO COBRADO"]
+
+
+# =========================
+# Libros aleatorios
+# =========================
+def random_sheet(rng: np.random.Generator, n_rows: int) -> tuple[list[list], dict]:
+    """
+    Filas de una hoja TRABAJOS REALIZADOS (títulos + cabecera + datos) y la
+    descripción del caso (columnas que faltan y alias usados).
+    """
+    missing = sorted(rng.choice(OPTIONAL, size=int(rng.integers(0, 4)), replace=False).tolist())
+    columns = [c for c in HEADERS if c not in missing]
+    header = [HEADERS[c][int(rng.integers(len(HEADERS[c])))] for c in columns]
+    plain = [f"Cliente {i}" for i in range(max(5, n_rows // 20))]
+
+    def pick(values, p_null=0.04):
+        return None if rng.random() < p_null else values[int(rng.integers(len(values)))]
+
+    def client():
+        if rng.random() < 0.15:
+            group = CLIENT_VARIANTS[int(rng.integers(len(CLIENT_VARIANTS)))]
+            return group[int(rng.integers(len(group)))]
+        return pick(plain, 0.01)
+
+    def price():
+        r = rng.random()
+        if r < 0.03:
+            return None
+        if r < 0.04:
+            return "NO COBRADO"  # texto: importe no representable
+        if r < 0.06:
+            return 0
+        return round(float(rng.uniform(20, 6000)), 2)
+
+    def hours():
+        r = rng.random()
+        return None if r < 0.05 else 0 if r < 0.10 else round(float(rng.uniform(0.5, 60)), 2)
+
+    years = np.sort(rng.integers(2019, 2026, n_rows))
+    months = rng.integers(1, 13, n_rows)
+    order = np.lexsort((months, years))
+    rows: list[list] = []
+    prev_year = prev_month = None
+    for i in order:
+        y, m = int(years[i]), int(months[i])
+        if rows and rng.random() < 0.02:
+            rows.append(list(rows[-1]))  # fila duplicada (cuenta dos veces)
+            continue
+        if rng.random() < 0.01:
+            rows.append([None] * len(columns))  # separador vacío
+        mes = MONTHS[m - 1]
+        mes = "SETIEMBRE" if m == 9 and rng.random() < 0.3 else mes.title() if rng.random() < 0.2 else mes
+        entrega = dt.datetime(y, m, 1) + dt.timedelta(days=int(rng.integers(0, 90)))
+        values = {
+            # Celdas combinadas: AÑO y MES suelen ir solo en la primera fila del bloque
+            "AÑO": y if y != prev_year or rng.random() < 0.3 else None,
+            "MES": mes if (y, m) != (prev_year, prev_month) or rng.random() < 0.5 else None,
+            "CLIENTE": client(),
+            "NOMBRE ENCARGO": pick([f"Encargo {k}" for k in range(50)], 0.02),
+            "LOCALIDAD": pick(LOCALIDADES),
+            "TIPO DE CLIENTE": pick(TIPOS_CLIENTE),
+            "TIPO DE TRABAJO": pick(TIPOS_TRABAJO),
+            "CAPTACIÓN CLIENTE": pick(CAPTACION),
+            "MI PRECIO": price(),
+            "FACTURA": None if rng.random() < 0.5 else f"F-{int(rng.integers(1000))}",
+            "FECHA ENTREGA": None if rng.random() < 0.1 else entrega.strftime("%d/%m/%Y") if rng.random() < 0.05 else entrega,
+            "HORAS DEDICADAS": hours(),
+            "PRECIO/HORA": None if rng.random() < 0.2 else round(float(rng.uniform(5, 300)), 2),
+            "ESTADO": pick(ESTADOS),
+        }
+        if values["CLIENTE"] is None and values["NOMBRE ENCARGO"] is None:
+            values["CLIENTE"] = plain[0]  # si no, el loader la toma por separador
+        rows.append([values[c] for c in columns])
+        prev_year, prev_month = y, m
+
+    titles = [[None] * len(columns) for _ in range(int(rng.integers(0, 3)))]
+    if titles:
+        titles[-1][0] = "REALIZADO"
+    aliases = sorted(h.strip() for c, h in zip(columns, header) if h.strip() != c)
+    return titles + [header] + rows, {"faltan": missing, "alias": aliases}
+
+
+def write_workbook(path: Path, rows: list[list], extra_sheet: bool = True) -> Path:
+    wb = Workbook(write_only=True)
+    if extra_sheet:
+        other = wb.create_sheet("CONTROL DE PAGOS")  # varias hojas: se elige por nombre
+        other.append(["CLIENTE", "PRECIO"])
+    ws = wb.create_sheet("TRABAJOS REALIZADOS")
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+# =========================
+# Comparación
+# =========================
+def _canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """Filas ordenadas por las columnas de etiqueta (el orden de filas no cuenta)."""
+    keys = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c]) or pd.api.types.is_bool_dtype(df[c])]
+    out = df.reset_index(drop=True)
+    if keys and len(out):
+        # NA fuera del astype: si no, NaN y None (tras Arrow) serían "nan" y "None" y se ordenarían distinto
+        out = out.sort_values(
+            keys, na_position="last", kind="stable", key=lambda s: s.astype(str).where(s.notna())
+        ).reset_index(drop=True)
+    return out
+
+
+def compare_tables(ref: pd.DataFrame, got: pd.DataFrame, tolerances: dict[str, float] | None = None) -> list[str]:
+    """Diferencias entre dos tablas de métricas (vacío si coinciden)."""
+    tolerances = tolerances or {}
+    if list(ref.columns) != list(got.columns):
+        return [f"columnas {list(ref.columns)} != {list(got.columns)}"]
+    if len(ref) != len(got):
+        return [f"{len(ref)} filas != {len(got)}"]
+    a, b = _canonical(ref), _canonical(got)
+    problems = []
+    for c in a.columns:
+        numeric = pd.api.types.is_numeric_dtype(a[c]) and not pd.api.types.is_bool_dtype(a[c])
+        if not numeric:
+            x, y = a[c].astype(object), b[c].astype(object)
+            same = (x.isna() & y.isna()) | (x.astype(str) == y.astype(str))
+            if not same.all():
+                problems.append(f"{c}: {int((~same).sum())} etiquetas distintas")
+            continue
+        x = a[c].to_numpy(dtype=np.float64, na_value=np.nan)
+        y = pd.to_numeric(b[c], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        if c in tolerances:
+            ok = np.isclose(x, y, rtol=tolerances[c], atol=0, equal_nan=True)
+        elif c in EXACT_COLUMNS:
+            ok = (x == y) | (np.isnan(x) & np.isnan(y))
+        else:
+            ok = np.isclose(x, y, rtol=RTOL, atol=0, equal_nan=True)
+        if not ok.all():
+            i = int(np.flatnonzero(~ok)[0])
+            problems.append(f"{c}: {int((~ok).sum())} valores distintos (p. ej. {x[i].item()!r} != {y[i].item()!r})")
+    return problems
+
+
+def compare_metrics(ref: dict[str, pd.DataFrame], got: dict[str, pd.DataFrame], tolerances: dict[str, float] | None = None) -> list[str]:
+    problems = []
+    if sorted(ref) != sorted(got):
+        problems.append(f"tablas {sorted(ref)} != {sorted(got)}")
+    for name in sorted(set(ref) & set(got)):
+        problems += [f"{name}.{p}" for p in compare_tables(ref[name], got[name], tolerances)]
+    return problems
+
+
+def dense_series(df: pd.DataFrame) -> pd.DataFrame:
+    """time_series_dual reconstruida con TimeSeries (eje denso de meses)."""
+    from .timeseries import TimeSeries
+
+    ts = TimeSeries(df)
+    out = None
+    for measure in ("encargos_entrados", "importe_entrado", "facturacion_entrega"):
+        v = ts.view(measure, "M")[["periodo", "valor"]].rename(columns={"periodo": "YM", "valor": measure})
+        out = v if out is None else out.merge(v, on="YM", how="outer")
+    return out if out is not None else pd.DataFrame()
+
+
+def compare_dense(ref: pd.DataFrame, dense: pd.DataFrame) -> list[str]:
+    """Cada mes de la referencia igual en la serie densa; los meses de más, a cero."""
+    cols = ["YM", "encargos_entrados", "importe_entrado", "facturacion_entrega"]
+    if ref.empty:
+        return [] if dense.empty or not dense[cols[1:]].to_numpy().any() else ["serie densa con datos y referencia vacía"]
+    joined = ref[cols].merge(dense, on="YM", how="left", suffixes=("", "_densa"), indicator=True)
+    problems = []
+    if (joined["_merge"] != "both").any():
+        problems.append(f"{int((joined['_merge'] != 'both').sum())} meses sin periodo en la serie densa")
+    for c in cols[1:]:
+        x = joined[c].to_numpy(dtype=np.float64, na_value=np.nan)
+        y = joined[f"{c}_densa"].to_numpy(dtype=np.float64, na_value=np.nan)
+        if not np.array_equal(x, y, equal_nan=True):
+            problems.append(f"{c}: {int((x != y).sum())} meses distintos")
+    extra = dense[~dense["YM"].isin(ref["YM"])]
+    if extra[cols[1:]].to_numpy(dtype=np.float64).any():
+        problems.append(f"{len(extra)} meses de más con datos")
+    return problems
+
+
+# =========================
+# Caminos
+# =========================
+def _timed(fn: Callable):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def _next_version(df: pd.DataFrame, rng: np.random.Generator, n: int) -> pd.DataFrame:
+    """
+    Versión siguiente del libro ya limpio: borra n filas, cambia ESTADO en
+    filas recientes y MI PRECIO en otras, y duplica algunas.
+    """
+    out = df.drop(index=df.index[rng.choice(len(df), min(n, len(df)), replace=False)]).reset_index(drop=True)
+    if len(out):
+        recent = np.arange(max(0, len(out) - 4 * n), len(out))
+        if "ESTADO" in out.columns:
+            rows = rng.choice(recent, min(n, len(recent)), replace=False)
+            out.loc[rows, "ESTADO"] = rng.choice(ESTADOS, len(rows))
+        if "MI PRECIO" in out.columns:
+            rows = rng.choice(len(out), min(n, len(out)), replace=False)
+            out.loc[rows, "MI PRECIO"] = rng.integers(0, 600_000, len(rows))
+        dup = out.iloc[rng.choice(len(out), max(n // 2, 1))]
+        out = pd.concat([out, dup], ignore_index=True)
+    return out
+
+
+def _incremental_metrics(df: pd.DataFrame, rng: np.random.Generator, chunks: int = 4):
+    """
+    Cubo actualizado versión a versión con update_cube: cada versión añade
+    un trozo de filas y borra, modifica y duplica otras. Devuelve las
+    métricas del cubo, la última versión y los resúmenes de cada paso.
+    """
+    from .incremental import header_signature, update_cube
+
+    cube = fp = prev = header = None
+    steps = []
+    cur = df.iloc[:0]
+    edges = np.linspace(0, len(df), chunks + 1).astype(int)
+    for start, end in zip(edges[:-1], edges[1:]):
+        cur = pd.concat([cur, df.iloc[start:end]], ignore_index=True)
+        if prev is not None:
+            cur = _next_version(cur, rng, max(len(cur) // 50, 1))
+        cube, fp, summary = update_cube(cube, prev, fp, header, cur)
+        steps.append(summary)
+        prev, header = cur, header_signature(cur)
+    return metrics_from_cube(cube, list(cur.columns)), cur, steps
+
+
+def _check_incremental(out) -> list[str]:
+    metrics, final, steps = out
+    problems = compare_metrics(build_metrics(final), metrics)
+    # Sin esto el caso no probaría los deltas sino la reconstrucción
+    for i, step in enumerate(steps[1:], 1):
+        if step["rebuild"] or not step["borradas"]:
+            problems.append(f"paso {i}: no se aplicaron borrados como delta ({step})")
+    return problems
+
+
+def _header_change_metrics(df: pd.DataFrame):
+    """Versión anterior sin la última columna: la cabecera cambia y update_cube reconstruye."""
+    from .incremental import build_cube, header_signature, row_fingerprints, update_cube
+
+    old = df.drop(columns=df.columns[-1])
+    cube, _, summary = update_cube(build_cube(old), old, row_fingerprints(old), header_signature(old), df)
+    return metrics_from_cube(cube, list(df.columns)), summary
+
+
+def run_case(i: int, rng: np.random.Generator, n_rows: int, workdir: Path) -> dict:
+    """Un caso: genera dos libros, calcula la referencia y compara y cronometra cada camino."""
+    from .bundle import file_digest, load_fact, load_metrics
+    from .incremental import build_cube
+    from .pipeline import refresh_bundle
+    from .tenants import load_tenants, tenant_metrics
+
+    case_dir = workdir / f"caso_{i}"
+    case_dir.mkdir(parents=True, exist_ok=True)
+    rows_a, info = random_sheet(rng, n_rows)
+    rows_b, _ = random_sheet(rng, max(n_rows // 2, 10))
+    (case_dir / "a").mkdir(exist_ok=True)
+    (case_dir / "b").mkdir(exist_ok=True)
+    xlsx_a = write_workbook(case_dir / "a" / "GENERAL.xlsx", rows_a)
+    xlsx_b = write_workbook(case_dir / "b" / "GENERAL.xlsx", rows_b, extra_sheet=False)
+
+    import warnings
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # importes no representables: son parte del caso
+        df, load_ms = _timed(lambda: load_trabajos_realizados(xlsx_a))
+        ref, ref_ms = _timed(lambda: build_metrics(df))
+        df_b, load_b_ms = _timed(lambda: load_trabajos_realizados(xlsx_b))
+        ref_b, ref_b_ms = _timed(lambda: build_metrics(df_b))
+
+        bundle_dir = case_dir / "bundle"
+        refresh_bundle(bundle_dir, df, file_digest(xlsx_a), xlsx_a.name)
+
+        def _parallel():
+            both = load_tenants([xlsx_a, xlsx_b], names=["a", "b"], max_workers=2)
+            return tenant_metrics(build_cube(both), list(both.columns), both.attrs["tenant_columns"])
+
+        paths: list[tuple[str, Callable, Callable[[object], list[str]], float]] = [
+            ("cubo", lambda: metrics_from_cube(build_cube(df), list(df.columns)), lambda m: compare_metrics(ref, m), ref_ms),
+            ("incremental", lambda: _incremental_metrics(df, rng), _check_incremental, ref_ms),
+            (
+                "cabecera", lambda: _header_change_metrics(df),
+                lambda out: compare_metrics(ref, out[0]) + ([] if out[1]["rebuild"] else ["no reconstruyó al cambiar la cabecera"]),
+                ref_ms,
+            ),
+            ("bundle", lambda: load_metrics(bundle_dir), lambda m: compare_metrics(ref, m), ref_ms),
+            ("bundle_filas", lambda: build_metrics(load_fact(bundle_dir)), lambda m: compare_metrics(ref, m), ref_ms),
+            (
+                "paralelo", _parallel,
+                lambda m: [f"a.{p}" for p in compare_metrics(ref, m["a"])] + [f"b.{p}" for p in compare_metrics(ref_b, m["b"])],
+                load_ms + ref_ms + load_b_ms + ref_b_ms,
+            ),
+            ("serie_densa", lambda: dense_series(df), lambda s: compare_dense(ref["time_series_dual"], s), ref_ms),
+            ("aprox", lambda: build_metrics(df, approx=True), lambda m: compare_metrics(ref, m, {"clientes_unicos": HLL_RTOL}), ref_ms),
+        ]
+        results = []
+        for name, fn, check, base_ms in paths:
+            try:
+                out, ms = _timed(fn)
+                problems = check(out)
+            except Exception as e:  # un camino roto es un fallo del caso, no del harness
+                ms, problems = float("nan"), [f"{type(e).__name__}: {e}"]
+            results.append({
+                "camino": name,
+                "ok": not problems,
+                "ms": round(ms, 2),
+                "referencia_ms": round(base_ms, 2),
+                "aceleracion": round(base_ms / ms, 2) if ms and ms == ms else None,
+                "diferencias": problems,
+            })
+    return {
+        "caso": i,
+        "filas": len(df),
+        **info,
+        "carga_ms": round(load_ms, 2),
+        "metricas_ms": round(ref_ms, 2),
+        "caminos": results,
+    }
+
+
+def run(cases: int = 5, rows: int = 2000, seed: int = 0) -> list[dict]:
+    out = []
+    with tempfile.TemporaryDirectory(prefix="diffcheck_") as tmp:
+        for i in range(cases):
+            rng = np.random.default_rng(seed + i)
+            # Tamaños variados alrededor de `rows` (incluye libros muy pequeños)
+            n = int(rng.integers(max(rows // 10, 5), rows + 1)) if i else rows
+            out.append(run_case(i, rng, n, Path(tmp)))
+    return out
+
+
+def report(results: list[dict]) -> str:
+    lines = []
+    for case in results:
+        desc = ", ".join(filter(None, [
+            f"sin {', '.join(case['faltan'])}" if case["faltan"] else "",
+            f"alias {', '.join(case['alias'])}" if case["alias"] else "",
+        ]))
+        lines.append(f"caso {case['caso']} · {case['filas']} filas{' · ' + desc if desc else ''}")
+        lines.append(f"  referencia     carga {case['carga_ms']:.0f} ms · build_metrics {case['metricas_ms']:.1f} ms")
+        for r in case["caminos"]:
+            speed = f"x{r['aceleracion']:.1f}" if r["aceleracion"] is not None else "-"
+            lines.append(f"  {r['camino']:<14} {'OK ' if r['ok'] else 'MAL'} {r['ms']:9.1f} ms  {speed:>7}")
+            lines += [f"      {p}" for p in r["diferencias"][:5]]
+    failed = sum(not r["ok"] for c in results for r in c["caminos"])
+    total = sum(len(c["caminos"]) for c in results)
+    lines.append(f"{total - failed}/{total} comparaciones coinciden")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara los caminos optimizados con load + build_metrics.")
+    parser.add_argument("--cases", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=2000, help="Filas del libro principal (los demás casos varían hasta este tamaño)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Guarda los resultados en JSON")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.rows, args.seed)
+    print(report(results))
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    sys.exit(0 if all(r["ok"] for c in results for r in c["caminos"]) else 1)
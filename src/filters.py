@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+# Columna con el estudio (oficina) de cada fila al consolidar varios libros
+TENANT_COL = "ESTUDIO"
+
+# Clave de selección -> columna canónica
+FILTER_COLUMNS = {
+    "estudio": TENANT_COL,
+    "anio": "AÑO",
+    "mes": "MES",
+    "tipo_trabajo": "TIPO DE TRABAJO",
+    "tipo_cliente": "TIPO DE CLIENTE",
+    "captacion": "CAPTACIÓN CLIENTE",
+    "estado": "ESTADO",
+}
+
+
+def filter_options(df: pd.DataFrame) -> dict[str, list]:
+    """Valores posibles de cada filtro (ordenados, sin nulos)."""
+    out: dict[str, list] = {}
+    for key, col in FILTER_COLUMNS.items():
+        if col not in df.columns:
+            continue
+        vals = pd.unique(df[col].dropna())
+        if key == "anio":
+            out[key] = sorted(int(v) for v in vals)
+        else:
+            out[key] = sorted(str(v) for v in vals)
+    return out
+
+
+def build_mask(
+    df: pd.DataFrame,
+    selections: Mapping[str, Iterable] | None = None,
+    cliente_text: str = "",
+) -> np.ndarray:
+    """
+    Máscara combinada de todos los filtros activos (selección vacía = no filtra).
+    Las columnas ya vienen limpias del loader, así que no hay astype(str).
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for key, sel in (selections or {}).items():
+        col = FILTER_COLUMNS.get(key, key)
+        sel = list(sel or [])
+        if sel and col in df.columns:
+            mask &= df[col].isin(sel).to_numpy(dtype=bool, na_value=False)
+    if cliente_text and "CLIENTE" in df.columns:
+        cli = df["CLIENTE"]
+        if not (pd.api.types.is_string_dtype(cli) or cli.dtype == object):
+            cli = cli.astype(str)
+        mask &= (
+            cli.str.contains(cliente_text, case=False, na=False, regex=False)
+            .to_numpy(dtype=bool, na_value=False)
+        )
+    return mask
+
+
+def apply_filters(
+    df: pd.DataFrame,
+    selections: Mapping[str, Iterable] | None = None,
+    cliente_text: str = "",
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Un único subconjunto de filas a partir de la máscara combinada.
+    Sin filtros devuelve el propio df (sin copia); los consumidores no deben
+    mutarlo (copy-on-write lo garantiza).
+    """
+    mask = build_mask(df, selections, cliente_text)
+    if mask.all():
+        return df, mask
+    return df[mask], mask
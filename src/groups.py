@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Hashable, Iterator
+
+import numpy as np
+import pandas as pd
+
+# Índice de grupos en formato CSR: las posiciones de las filas de cada valor
+# están contiguas en `order`, y el grupo k ocupa order[offsets[k]:offsets[k+1]].
+# Se calcula una vez por dataset (un factorize + un argsort) y después sacar
+# las filas de un grupo es un slice, sin volver a comparar toda la columna.
+# Los filtros activos se aplican sobre esas posiciones con la máscara
+# (mask[posiciones]), sin recorrer el resto de filas.
+
+# Dimensiones con índice para el drill-down del dashboard
+GROUP_COLUMNS = ["CLIENTE", "TIPO DE TRABAJO", "LOCALIDAD"]
+
+
+class GroupIndex:
+    """Posiciones (iloc, ascendentes) de las filas de cada valor de una columna; NA no forma grupo."""
+
+    def __init__(self, values: pd.Series):
+        codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=True)
+        self.keys: list = list(uniques)
+        self.n_rows = len(codes)
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.keys))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        # Orden estable: dentro de cada grupo las posiciones quedan ascendentes
+        # (los NA, con código -1, van delante y se descartan)
+        order = np.argsort(codes, kind="stable")
+        self.order = order[len(codes) - int(self.offsets[-1]):].astype(np.int64)
+        self._pos = {k: i for i, k in enumerate(self.keys)}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pos
+
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def group(self, i: int) -> np.ndarray:
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def positions(self, key: Hashable, mask: np.ndarray | None = None) -> np.ndarray:
+        """Posiciones de las filas de `key` (vacío si no existe); con mask, solo las que pasan el filtro."""
+        i = self._pos.get(key)
+        pos = self.group(i) if i is not None else np.empty(0, dtype=np.int64)
+        return pos if mask is None else pos[mask[pos]]
+
+    def counts(self, mask: np.ndarray | None = None) -> np.ndarray:
+        """Filas de cada grupo (que pasan el filtro, con mask)."""
+        return self.sizes() if mask is None else self.reduce(mask.astype(np.int64))
+
+    def items(self) -> Iterator[tuple[Hashable, np.ndarray]]:
+        for i, k in enumerate(self.keys):
+            yield k, self.group(i)
+
+    def reduce(self, values: np.ndarray, ufunc: np.ufunc = np.add) -> np.ndarray:
+        """ufunc.reduceat de `values` (uno por fila) por grupo, en el orden de `keys`."""
+        # Todos los grupos tienen al menos una fila, así que reduceat no ve tramos vacíos
+        return ufunc.reduceat(values[self.order], self.offsets[:-1]) if len(self.order) else values[:0]
+
+
+def group_indexes(df: pd.DataFrame, columns: list[str] = GROUP_COLUMNS) -> dict[str, GroupIndex]:
+    """Un GroupIndex por cada columna presente en df."""
+    return {c: GroupIndex(df[c]) for c in columns if c in df.columns}
+
+
+def intersect(*positions: np.ndarray) -> np.ndarray:
+    """Filas comunes a varios grupos (p. ej. un cliente en una localidad)."""
+    out = positions[0]
+    for p in positions[1:]:
+        out = np.intersect1d(out, p, assume_unique=True)
+    return out
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .filters import TENANT_COL
+
+# Recalculo incremental: cada fila limpia tiene una huella (hash de la fila
+# canónica). Al llegar una versión nueva del Excel se compara con la huella
+# de la anterior y solo las filas insertadas/borradas (una fila modificada
+# es borrado + inserción) se aplican como deltas al cubo de agregados.
+
+MONTH_COL = "YM"
+ENTREGA_MONTH_COL = "YM_ENTREGA"
+
+# Cubos: sumas y conteos por dimensión × mes de encargo (y × estudio si
+# el dataset consolida varios, ver src/tenants.py)
+CUBE_DIMENSIONS: dict[str, list[str]] = {
+    "total": [],
+    "tipo_trabajo": ["TIPO DE TRABAJO"],
+    "tipo_cliente": ["TIPO DE CLIENTE"],
+    "cliente": ["CLIENTE"],
+    "estado": ["ESTADO"],
+    "captacion_cliente": ["CAPTACIÓN CLIENTE", "CLIENTE"],
+}
+ENTREGA_CUBE = "entrega"  # facturación por mes de entrega
+
+MEASURES = ["filas", "encargos", "fact_cents", "fact_n", "horas", "horas_n"]
+
+
+def header_signature(df: pd.DataFrame) -> str:
+    """Huella de la cabecera (columnas + tipos); si cambia, reconstrucción completa."""
+    payload = "|".join(f"{c}:{t}" for c, t in df.dtypes.astype(str).items())
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Hash de 64 bits por fila limpia (independiente del índice)."""
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def _surplus(fp: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Posiciones de fp que sobran respecto a other (como multiconjunto)."""
+    order = np.argsort(fp, kind="stable")
+    s = fp[order]
+    # Ocurrencia k-ésima de cada huella dentro de fp
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]]) if len(s) else np.empty(0, dtype=np.int64)
+    occ = np.arange(len(s)) - np.repeat(starts, np.diff(np.r_[starts, len(s)]))
+    other = np.sort(other)
+    available = np.searchsorted(other, s, side="right") - np.searchsorted(other, s, side="left")
+    return np.sort(order[occ >= available])
+
+
+def diff_fingerprints(old: np.ndarray, new: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (posiciones borradas en old, posiciones insertadas en new), comparando
+    como multiconjuntos: dos filas idénticas cuentan como dos.
+    """
+    return _surplus(old, new), _surplus(new, old)
+
+
+def _row_measures(df: pd.DataFrame) -> pd.DataFrame:
+    def _col(name):
+        return df[name] if name in df.columns else pd.Series(pd.NA, index=df.index, dtype="object")
+
+    fact = _col("MI PRECIO")
+    horas = _col("HORAS DEDICADAS")
+    return pd.DataFrame({
+        "filas": np.ones(len(df), dtype=np.int64),
+        "encargos": _col("NOMBRE ENCARGO").notna().to_numpy(dtype=np.int64),
+        "fact_cents": pd.to_numeric(fact, errors="coerce").fillna(0).to_numpy(dtype=np.int64),
+        "fact_n": fact.notna().to_numpy(dtype=np.int64),
+        "horas": pd.to_numeric(horas, errors="coerce").fillna(0).to_numpy(dtype=np.float64),
+        "horas_n": horas.notna().to_numpy(dtype=np.int64),
+    }, index=df.index)
+
+
+def build_cube(df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Cubo de agregados aditivos (sumas y conteos) de un DataFrame limpio."""
+    measures = _row_measures(df)
+    ym = df["YM_ENCARGO"] if "YM_ENCARGO" in df.columns else pd.Series(pd.NA, index=df.index)
+    tenant = [df[TENANT_COL]] if TENANT_COL in df.columns else []
+    cube: dict[str, pd.DataFrame] = {}
+    for name, dims in CUBE_DIMENSIONS.items():
+        if not all(c in df.columns for c in dims):
+            continue
+        keys = tenant + [df[c] for c in dims] + [ym.rename(MONTH_COL)]
+        cube[name] = measures.groupby(keys, dropna=False, sort=False).sum().reset_index()
+    if "FECHA ENTREGA" in df.columns:
+        ym_entrega = df["FECHA ENTREGA"].dt.to_period("M").astype(str).rename(ENTREGA_MONTH_COL)
+        cube[ENTREGA_CUBE] = measures.groupby(tenant + [ym_entrega], dropna=False, sort=False).sum().reset_index()
+    return cube
+
+
+def tenant_cube(cube: dict[str, pd.DataFrame], tenant: str) -> dict[str, pd.DataFrame]:
+    """Las celdas de un estudio, sin la columna ESTUDIO (mismo formato que un cubo de un solo libro)."""
+    return {
+        name: c[c[TENANT_COL] == tenant].drop(columns=TENANT_COL).reset_index(drop=True)
+        for name, c in cube.items()
+    }
+
+
+def apply_delta(
+    cube: dict[str, pd.DataFrame],
+    inserted: pd.DataFrame,
+    deleted: pd.DataFrame,
+) -> dict[str, pd.DataFrame]:
+    """cubo - agregados(borradas) + agregados(insertadas); celdas vacías fuera."""
+    plus, minus = build_cube(inserted), build_cube(deleted)
+    out: dict[str, pd.DataFrame] = {}
+    for name, base in cube.items():
+        parts = [base]
+        if name in plus:
+            parts.append(plus[name])
+        if name in minus:
+            neg = minus[name].copy()
+            neg[MEASURES] = -neg[MEASURES]
+            parts.append(neg)
+        if len(parts) == 1:
+            out[name] = base
+            continue
+        keys = [c for c in base.columns if c not in MEASURES]
+        merged = pd.concat(parts, ignore_index=True).groupby(keys, dropna=False, sort=False)[MEASURES].sum().reset_index()
+        out[name] = merged[merged["filas"] != 0].reset_index(drop=True)
+    return out
+
+
+def update_cube(
+    old_cube: dict[str, pd.DataFrame] | None,
+    old_fact: pd.DataFrame | None,
+    old_fingerprints: np.ndarray | None,
+    old_header: str | None,
+    df: pd.DataFrame,
+) -> tuple[dict[str, pd.DataFrame], np.ndarray, dict[str, int | bool]]:
+    """
+    Cubo y huellas de la versión nueva, aplicando solo los deltas respecto a
+    la anterior. Sin versión anterior (o si cambió la cabecera) se
+    reconstruye entero. Devuelve (cubo, huellas, resumen).
+    """
+    fingerprints = row_fingerprints(df)
+    full = (
+        old_cube is None
+        or old_fact is None
+        or old_fingerprints is None
+        or old_header != header_signature(df)
+    )
+    if full:
+        return build_cube(df), fingerprints, {"rebuild": True, "insertadas": len(df), "borradas": 0}
+    deleted, inserted = diff_fingerprints(old_fingerprints, fingerprints)
+    summary = {"rebuild": False, "insertadas": len(inserted), "borradas": len(deleted)}
+    if not len(deleted) and not len(inserted):
+        return old_cube, fingerprints, summary
+    cube = apply_delta(old_cube, df.iloc[inserted], old_fact.iloc[deleted])
+    return cube, fingerprints, summary
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .utils import to_numeric_safe
+
+CENTS_PER_EURO = 100
+
+# Importes guardados como enteros de céntimos (Int64, nulable)
+MONEY_COLUMNS = ["MI PRECIO"]
+
+# Más allá de 2**53 un float ya no distingue céntimos consecutivos
+_MAX_EXACT = 2 ** 53
+_TOL = 1e-6
+
+
+def to_cents(s: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Convierte importes en euros a céntimos enteros (Int64).
+    Devuelve (céntimos, no_representable). Se marcan como no representables:
+    textos no numéricos, valores con más de 2 decimales y magnitudes fuera
+    de rango. Los de más de 2 decimales se redondean (half-even) pero quedan
+    marcados; el resto pasa a nulo.
+    """
+    euros = to_numeric_safe(s).to_numpy(dtype=np.float64, na_value=np.nan)
+    present = s.notna().to_numpy()
+
+    scaled = euros * CENTS_PER_EURO
+    rounded = np.round(scaled)
+    finite = np.isfinite(scaled) & (np.abs(rounded) < _MAX_EXACT)
+    with np.errstate(invalid="ignore"):
+        off_grid = finite & (np.abs(scaled - rounded) > _TOL)
+
+    bad = (present & ~finite) | off_grid
+    cents = pd.array(np.where(finite, rounded, 0).astype(np.int64), dtype="Int64")
+    cents[~finite] = pd.NA
+    return pd.Series(cents, index=s.index, name=s.name), pd.Series(bad, index=s.index, name=s.name)
+
+
+def convert_money_columns(df: pd.DataFrame, cols: list[str] | None = None) -> pd.DataFrame:
+    """
+    Conversión única a céntimos en carga. Las filas no representables se
+    guardan en df.attrs["money_issues"] ({columna: [posiciones]}) y se avisa.
+    """
+    issues: dict[str, list[int]] = {}
+    for col in cols or MONEY_COLUMNS:
+        if col not in df.columns:
+            continue
+        cents, bad = to_cents(df[col])
+        df[col] = cents
+        if bad.any():
+            issues[col] = np.flatnonzero(bad.to_numpy()).tolist()
+    if issues:
+        df.attrs["money_issues"] = issues
+        resumen = ", ".join(f"{c}: {len(v)}" for c, v in issues.items())
+        warnings.warn(f"Importes no representables en céntimos ({resumen})", stacklevel=2)
+    return df
+
+
+def cents_to_euros(x):
+    """Céntimos -> euros (float). Acepta escalares, Series o DataFrames."""
+    if isinstance(x, pd.DataFrame):
+        return x.apply(cents_to_euros)
+    if isinstance(x, pd.Series):
+        vals = x.to_numpy(dtype=np.float64, na_value=np.nan)
+        return pd.Series(vals / CENTS_PER_EURO, index=x.index, name=x.name)
+    if x is None or x is pd.NA:
+        return float("nan")
+    try:
+        return float(x) / CENTS_PER_EURO
+    except (TypeError, ValueError):
+        return float("nan")
@@ -1,172 +1,59 @@
 from __future__ import annotations
 
+import os
+import threading
 from pathlib import Path
 import pandas as pd
 
-from .utils import parse_structured_sheet, to_datetime_safe, to_numeric_safe, clean_text
-
-MONTH_MAP = {
-    "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4, "MAYO": 5, "JUNIO": 6,
-    "JULIO": 7, "AGOSTO": 8, "SEPTIEMBRE": 9, "SETIEMBRE": 9, "OCTUBRE": 10,
-    "NOVIEMBRE": 11, "DICIEMBRE": 12
-}
-
-
-def load_trabajos_realizados(excel_path: Path) -> pd.DataFrame:
-
-    xls = pd.ExcelFile(excel_path)
-    sheet_names = xls.sheet_names
-
-    # Caso 1: solo hay una hoja -> leer esa
-    if len(sheet_names) == 1:
-        sheet_name = sheet_names[0]
-
-    # Caso 2: hay varias hojas -> buscar TRABAJOS REALIZADOS
-    elif len(sheet_names) > 1:
-        if "TRABAJOS REALIZADOS" in sheet_names:
-            sheet_name = "TRABAJOS REALIZADOS"
-        else:
-            raise ValueError(
-                f"No se puede leer el Excel: hay varias hojas ({sheet_names}) "
-                f"y no existe la hoja 'TRABAJOS REALIZADOS'."
-            )
-
-    # Caso raro: sin hojas
-    else:
-        raise ValueError("No se puede leer el Excel: el archivo no contiene hojas.")
-
-    # Leer detectando automáticamente la fila de cabecera
-    df = parse_structured_sheet(
-        excel_path=excel_path,
-        sheet_name=sheet_name,
-        must_contain=["MES", "CLIENTE", "PRECIO"]
-    )
-
-
-    # Limpieza de texto
-    for col in [
-        "CLIENTE", "NOMBRE ENCARGO", "LOCALIDAD", "TIPO DE CLIENTE",
-        "TIPO DE TRABAJO", "CAPTACIÓN CLIENTE", "CAPTACIÓN DE CLIENTE", "ESTADO", "MES", "AÑO"
-    ]:
-        if col in df.columns:
-            df[col] = clean_text(df[col])
-
-    # Numéricos
-    for col in ["MI PRECIO", "HORAS DEDICADAS", "PRECIO/HORA"]:
-        if col in df.columns:
-            df[col] = to_numeric_safe(df[col])
-
-    # (Opcional) si existe FECHA ENTREGA, la parseamos pero NO la usamos para series
-    if "FECHA ENTREGA" in df.columns:
-        df["FECHA ENTREGA"] = to_datetime_safe(df["FECHA ENTREGA"])
-
-    # Unificar nombre de captación
-    if "CAPTACIÓN CLIENTE" not in df.columns and "CAPTACIÓN DE CLIENTE" in df.columns:
-        df = df.rename(columns={"CAPTACIÓN DE CLIENTE": "CAPTACIÓN CLIENTE"})
-
-    # --- Normalizar y arrastrar AÑO y MES (celdas combinadas en Excel) ---
-
-    # AÑO
-    df["AÑO"] = (
-        pd.to_numeric(df["AÑO"], errors="coerce")
-        .ffill()
-        .astype("Int64")
-    )
-
-    # MES (texto)
-    df["MES"] = (
-        df["MES"]
-        .astype(str)
-        .str.strip()
-        .str.upper()
-        .replace({"SETIEMBRE": "SEPTIEMBRE", "NAN": pd.NA, "NONE": pd.NA})
-        .ffill()
-    )
-
-    # Construir YM_ENCARGO a partir de AÑO + MES
-    df["AÑO"] = pd.to_numeric(df["AÑO"], errors="coerce").astype("Int64")
-    df["MES_NUM"] = df["MES"].map(MONTH_MAP)
-
-    dt = pd.to_datetime(
-        dict(year=df["AÑO"], month=df["MES_NUM"], day=1),
-        errors="coerce"
-    )
-    df["YM_ENCARGO"] = dt.dt.to_period("M").astype(str)
-
-    df = df.drop(columns=["MES_NUM"], errors="ignore")
-
-    # Fallback de MI PRECIO si no existe
-    if "MI PRECIO" not in df.columns:
-        for c in df.columns:
-            if "PRECIO" in str(c).upper() and "HORA" not in str(c).upper():
-                df["MI PRECIO"] = to_numeric_safe(df[c])
-                break
-
-    return df
+from .utils import ProgressFn
+from .schema import MONTH_MAP, TRABAJOS_EN_CURSO, TRABAJOS_REALIZADOS, load_sheet
+from .sketches import nunique_by
+from .incremental import ENTREGA_CUBE, ENTREGA_MONTH_COL, MEASURES, MONTH_COL, update_cube
+from .money import cents_to_euros
+
+def load_trabajos_realizados(
+    excel_path: Path,
+    progress: ProgressFn | None = None,
+    cancel: threading.Event | None = None,
+) -> pd.DataFrame:
+    """
+    Hoja TRABAJOS REALIZADOS limpia (esquema en src/schema.py). progress(etapa,
+    filas, estimadas) y cancel permiten leerla en segundo plano (ver src/background.py).
+    """
+    return load_sheet(excel_path, TRABAJOS_REALIZADOS, progress=progress, cancel=cancel)
 
 
 def load_trabajos_en_curso(excel_path: Path) -> pd.DataFrame:
-    df = parse_structured_sheet(
-        excel_path=excel_path,
-        sheet_name="TRABAJOS EN CURSO",
-        header_row=3  # Fila 4 (0-based index 3)
-    )
+    return load_sheet(excel_path, TRABAJOS_EN_CURSO)
 
-    for col in [
-        "AÑO", "MES", "CLIENTE", "NOMBRE ENCARGO", "LOCALIDAD",
-        "TIPO DE CLIENTE", "TIPO DE TRABAJO", "CAPTACIÓN CLIENTE", "CAPTACIÓN DE CLIENTE", "ESTADO"
-    ]:
-        if col in df.columns:
-            df[col] = clean_text(df[col])
 
+# Columnas de salida con importes: se suman en céntimos y se pasan a euros
+EURO_COLS = ["facturacion", "ingreso_medio_por_trabajo", "precio_medio_por_hora",
+             "importe", "importe_entrado", "facturacion_entrega"]
 
-    if "FECHA ENTREGA" in df.columns:
-        df["FECHA ENTREGA"] = to_datetime_safe(df["FECHA ENTREGA"])
 
-    for col in ["MI PRECIO", "HORAS DEDICADAS", "PRECIO/HORA"]:
-        if col in df.columns:
-            df[col] = to_numeric_safe(df[col])
+def _to_euros(g: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    for c in cols:
+        if c in g.columns:
+            g[c] = cents_to_euros(g[c])
+    return g
 
-    # Unificar captación
-    if "CAPTACIÓN CLIENTE" not in df.columns and "CAPTACIÓN DE CLIENTE" in df.columns:
-        df = df.rename(columns={"CAPTACIÓN DE CLIENTE": "CAPTACIÓN CLIENTE"})
-
-    # Quitar ENVIADO si existe (da problemas Arrow a veces)
-    df = df.drop(columns=["ENVIADO"], errors="ignore")
-
-    # --- Normalizar y arrastrar AÑO y MES (celdas combinadas en Excel) ---
-
-    # AÑO
-    df["AÑO"] = (
-        pd.to_numeric(df["AÑO"], errors="coerce")
-        .ffill()
-        .astype("Int64")
-    )
-
-    # MES (texto)
-    df["MES"] = (
-        df["MES"]
-        .astype(str)
-        .str.strip()
-        .str.upper()
-        .replace({"SETIEMBRE": "SEPTIEMBRE", "NAN": pd.NA, "NONE": pd.NA})
-        .ffill()
-    )
 
-    # YM_ENCARGO también para en curso (si lo quieres usar después)
-    df["AÑO"] = pd.to_numeric(df["AÑO"], errors="coerce").astype("Int64")
-    df["MES_NUM"] = df["MES"].map(MONTH_MAP)
-    dt = pd.to_datetime(
-        dict(year=df["AÑO"], month=df["MES_NUM"], day=1),
-        errors="coerce"
+def _time_series_dual(entradas: pd.DataFrame, fact: pd.DataFrame) -> pd.DataFrame:
+    ts_dual = (
+    pd.merge(entradas, fact, on="YM", how="outer")
+    .fillna({"encargos_entrados": 0, "importe_entrado": 0, "facturacion_entrega": 0})
     )
-    df["YM_ENCARGO"] = dt.dt.to_period("M").astype(str)
-    df = df.drop(columns=["MES_NUM"], errors="ignore")
+    ts_dual = ts_dual[ts_dual["YM"].notna() & (ts_dual["YM"].isin(["", "NA", "NaT"]) == False)]
 
-    return df
+    # Orden cronológico
+    if len(ts_dual):
+        ts_dual["_YM"] = pd.PeriodIndex(ts_dual["YM"].astype(str), freq="M")
+        ts_dual = ts_dual.sort_values("_YM").drop(columns=["_YM"])
+    return ts_dual
 
 
-def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
+def build_metrics(df_realizados: pd.DataFrame, approx: bool = False) -> dict[str, pd.DataFrame]:
     """
     Return a dictionary of dataframes to feed dashboards:
     - kpis (single row)
@@ -177,12 +64,15 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
     - pagos (if ESTADO exists)
     - time_series (monthly by YM_ENCARGO)
     - time_series_entrega (monthly by FECHA ENTREGA)
+
+    approx=True replaces exact distinct counts (clientes_unicos) with
+    HyperLogLog estimates (see src/sketches.py for error bounds).
     """
     out: dict[str, pd.DataFrame] = {}
 
     # KPIs
     total_trabajos = len(df_realizados)
-    total_fact = df_realizados["MI PRECIO"].sum(min_count=1) if "MI PRECIO" in df_realizados.columns else float("nan")
+    total_fact = cents_to_euros(df_realizados["MI PRECIO"].sum(min_count=1)) if "MI PRECIO" in df_realizados.columns else float("nan")
     horas = df_realizados["HORAS DEDICADAS"].sum(min_count=1) if "HORAS DEDICADAS" in df_realizados.columns else float("nan")
 
     kpis = pd.DataFrame([{
@@ -208,7 +98,7 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
             horas=("HORAS DEDICADAS", "sum") if "HORAS DEDICADAS" in df_realizados.columns else ("NOMBRE ENCARGO", "count"),
             ingreso_medio_por_trabajo=("MI PRECIO", "mean"),
             precio_medio_por_hora=("MI PRECIO", _eur_por_hora),
-        ).reset_index().sort_values("facturacion", ascending=False)
+        ).reset_index().pipe(_to_euros, EURO_COLS).sort_values("facturacion", ascending=False)
         out["by_tipo_trabajo"] = g
 
     # By tipo de cliente
@@ -219,7 +109,7 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
             horas=("HORAS DEDICADAS", "sum") if "HORAS DEDICADAS" in df_realizados.columns else ("NOMBRE ENCARGO", "count"),
             ingreso_medio_por_trabajo=("MI PRECIO", "mean"),
             precio_medio_por_hora=("MI PRECIO", _eur_por_hora),
-        ).reset_index().sort_values("facturacion", ascending=False)
+        ).reset_index().pipe(_to_euros, EURO_COLS).sort_values("facturacion", ascending=False)
         out["by_tipo_cliente"] = g
 
     # By cliente
@@ -230,7 +120,7 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
             horas=("HORAS DEDICADAS", "sum") if "HORAS DEDICADAS" in df_realizados.columns else ("NOMBRE ENCARGO", "count"),
             ingreso_medio_por_trabajo=("MI PRECIO", "mean"),
             precio_medio_por_hora=("MI PRECIO", _eur_por_hora),
-        ).reset_index().sort_values("facturacion", ascending=False)
+        ).reset_index().pipe(_to_euros, EURO_COLS).sort_values("facturacion", ascending=False)
         out["by_cliente"] = g
 
     # Pagos
@@ -238,7 +128,7 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
         g = df_realizados.groupby("ESTADO", dropna=False).agg(
             trabajos=("NOMBRE ENCARGO", "count"),
             importe=("MI PRECIO", "sum"),
-        ).reset_index().sort_values("importe", ascending=False)
+        ).reset_index().pipe(_to_euros, EURO_COLS).sort_values("importe", ascending=False)
         out["pagos"] = g
 
     # Time series dual: entradas (YM_ENCARGO) vs facturación (YM_ENTREGA)
@@ -252,32 +142,24 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
             )
             .reset_index()
             .rename(columns={"YM_ENCARGO": "YM"})
+            .pipe(_to_euros, EURO_COLS)
         )
     else:
         entradas = pd.DataFrame(columns=["YM", "encargos_entrados", "importe_entrado"])
     if "FECHA ENTREGA" in df_realizados.columns and "MI PRECIO" in df_realizados.columns:
-        df_realizados['FECHA ENTREGA'] = df_realizados['FECHA ENTREGA'].dt.to_period('M').astype(str)
+        # Mes de entrega sin mutar el DataFrame de entrada (puede ser una vista)
+        ym_entrega = df_realizados["FECHA ENTREGA"].dt.to_period("M").astype(str).rename("YM")
         fact = (
-            df_realizados.dropna(subset=["FECHA ENTREGA"])
-            .groupby("FECHA ENTREGA", dropna=False)
-            .agg(facturacion_entrega=("MI PRECIO", "sum"))
+            df_realizados["MI PRECIO"]
+            .groupby(ym_entrega, dropna=False)
+            .sum()
+            .rename("facturacion_entrega")
             .reset_index()
-            .rename(columns={"FECHA ENTREGA": "YM"})
+            .pipe(_to_euros, EURO_COLS)
         )
     else:
         fact = pd.DataFrame(columns=["YM", "facturacion_entrega"])
-    ts_dual = (
-    pd.merge(entradas, fact, on="YM", how="outer")
-    .fillna({"encargos_entrados": 0, "importe_entrado": 0, "facturacion_entrega": 0})
-    )
-    ts_dual = ts_dual[ts_dual["YM"].notna() & (ts_dual["YM"].isin(["", "NA", "NaT"]) == False)]
-
-    # Orden cronológico
-    if len(ts_dual):
-        ts_dual["_YM"] = pd.PeriodIndex(ts_dual["YM"].astype(str), freq="M")
-        ts_dual = ts_dual.sort_values("_YM").drop(columns=["_YM"])
-
-    out["time_series_dual"] = ts_dual
+    out["time_series_dual"] = _time_series_dual(entradas, fact)
     # Captación de cliente
     if "CAPTACIÓN CLIENTE" in df_realizados.columns and "CLIENTE" in df_realizados.columns:
         g = (
@@ -287,23 +169,185 @@ def build_metrics(df_realizados: pd.DataFrame) -> dict[str, pd.DataFrame]:
                 trabajos=("NOMBRE ENCARGO", "count"),     # total trabajos
                 facturacion=("MI PRECIO", "sum"),         # opcional
             )
-            .reset_index()
-            .sort_values("clientes_unicos", ascending=False)
+            .pipe(_to_euros, EURO_COLS)
         )
+        if approx:
+            g["clientes_unicos"] = nunique_by(df_realizados, "CAPTACIÓN CLIENTE", "CLIENTE").reindex(g.index).to_numpy()
+        g = g.reset_index().sort_values("clientes_unicos", ascending=False)
         out["by_captacion"] = g
-        print()
-    
 
     return out
 
 
-def export_artifacts(metrics: dict[str, pd.DataFrame], out_dir: Path) -> None:
+def _group_from_cube(c: pd.DataFrame, label: str, has_horas: bool) -> pd.DataFrame:
+    g = c.groupby(label, dropna=False)[["encargos", "fact_cents", "fact_n", "horas"]].sum()
+    fact_n = g["fact_n"].where(g["fact_n"] > 0)
+    h = g["horas"].where(g["horas"] > 0)
+    return pd.DataFrame({
+        "trabajos": g["encargos"],
+        "facturacion": g["fact_cents"],
+        "horas": g["horas"] if has_horas else g["encargos"],
+        "ingreso_medio_por_trabajo": g["fact_cents"] / fact_n,
+        "precio_medio_por_hora": g["fact_cents"] / h if has_horas else float("nan"),
+    }).reset_index().pipe(_to_euros, EURO_COLS).sort_values("facturacion", ascending=False)
+
+
+def metrics_from_cube(cube: dict[str, pd.DataFrame], columns: list[str]) -> dict[str, pd.DataFrame]:
+    """
+    Las mismas tablas que build_metrics, a partir del cubo de sumas y conteos
+    (src/incremental.py) en lugar de las filas. Las tablas dependen de
+    `columns` (las del libro), no de los cubos: en un consolidado el cubo
+    tiene las dimensiones de todos los estudios.
+    """
+    out: dict[str, pd.DataFrame] = {}
+    has_horas = "HORAS DEDICADAS" in columns
+    has_fact = "MI PRECIO" in columns
+
+    t = cube["total"][MEASURES].sum()
+    total_trabajos = int(t["filas"])
+    total_fact = cents_to_euros(t["fact_cents"]) if has_fact and t["fact_n"] else float("nan")
+    horas = t["horas"] if has_horas and t["horas_n"] else float("nan")
+    out["kpis"] = pd.DataFrame([{
+        "trabajos_total": total_trabajos,
+        "facturacion_total": total_fact,
+        "ingreso_medio_por_trabajo": (total_fact / total_trabajos) if total_trabajos and pd.notna(total_fact) else float("nan"),
+        "horas_totales": horas,
+        "precio_medio_por_hora": (total_fact / horas) if pd.notna(horas) and horas > 0 else float("nan"),
+    }])
+
+    for name, label in [("tipo_trabajo", "TIPO DE TRABAJO"), ("tipo_cliente", "TIPO DE CLIENTE"), ("cliente", "CLIENTE")]:
+        if name in cube and label in columns:
+            out[f"by_{name}"] = _group_from_cube(cube[name], label, has_horas)
+
+    if "estado" in cube and "ESTADO" in columns and has_fact:
+        g = cube["estado"].groupby("ESTADO", dropna=False)[["encargos", "fact_cents"]].sum()
+        out["pagos"] = (
+            pd.DataFrame({"trabajos": g["encargos"], "importe": g["fact_cents"]})
+            .reset_index().pipe(_to_euros, EURO_COLS).sort_values("importe", ascending=False)
+        )
+
+    c = cube["total"]
+    c = c[c[MONTH_COL].notna()]
+    entradas = (
+        c.groupby(MONTH_COL)[["encargos", "fact_cents"]].sum()
+        .rename(columns={"encargos": "encargos_entrados", "fact_cents": "importe_entrado"})
+        .reset_index()
+        .pipe(_to_euros, EURO_COLS)
+    )
+    if ENTREGA_CUBE in cube and "FECHA ENTREGA" in columns and has_fact:
+        fact = (
+            cube[ENTREGA_CUBE].groupby(ENTREGA_MONTH_COL, dropna=False)["fact_cents"].sum()
+            .rename("facturacion_entrega")
+            .rename_axis(MONTH_COL)
+            .reset_index()
+            .pipe(_to_euros, EURO_COLS)
+        )
+    else:
+        fact = pd.DataFrame(columns=["YM", "facturacion_entrega"])
+    out["time_series_dual"] = _time_series_dual(entradas, fact)
+
+    if "captacion_cliente" in cube and "CAPTACIÓN CLIENTE" in columns and "CLIENTE" in columns:
+        c = cube["captacion_cliente"]
+        g = c.groupby("CAPTACIÓN CLIENTE", dropna=False)[["encargos", "fact_cents"]].sum()
+        # Clientes distintos: pares (captación, cliente) con filas > 0
+        pares = c[c["CLIENTE"].notna()].groupby(["CAPTACIÓN CLIENTE", "CLIENTE"], dropna=False)["filas"].sum()
+        unicos = (pares > 0).groupby(level=0, dropna=False).sum()
+        g = pd.DataFrame({
+            "clientes_unicos": unicos.reindex(g.index, fill_value=0),
+            "trabajos": g["encargos"],
+            "facturacion": g["fact_cents"],
+        }).pipe(_to_euros, EURO_COLS)
+        out["by_captacion"] = g.reset_index().sort_values("clientes_unicos", ascending=False)
+
+    return out
+
+
+def refresh_bundle(
+    bundle_dir: Path,
+    df: pd.DataFrame,
+    source_digest: str,
+    source_name: str = "",
+    previous_dir: Path | None = None,
+    clients_digest: str | None = None,
+) -> tuple[dict[str, pd.DataFrame], dict]:
+    """
+    Reescribe el bundle para una versión nueva del Excel. Si bundle_dir (o
+    previous_dir) tiene una versión anterior, las métricas salen de aplicar
+    al cubo solo las filas insertadas/borradas (ver src/incremental.py); si
+    no, o si cambió la cabecera, se reconstruye entero.
+    clients_digest (clients.clients_digest, calculado después de leer el
+    Excel) queda en el manifest para is_fresh.
+    Devuelve (métricas, resumen).
+    """
+    # pyarrow solo se importa al escribir/leer bundles (el loader no lo necesita)
+    from .bundle import BUNDLE_VERSION, load_cube, load_fact, load_fingerprints, read_manifest, write_bundle
+
+    prev = previous_dir if previous_dir is not None else bundle_dir
+    manifest = read_manifest(prev)
+    old = (None, None, None, None)
+    if manifest is not None and manifest.get("version") == BUNDLE_VERSION:
+        try:
+            old = (load_cube(prev), load_fact(prev), load_fingerprints(prev), manifest.get("header"))
+        except (OSError, ValueError):
+            pass
+    cube, fingerprints, summary = update_cube(*old, df)
+    metrics = metrics_from_cube(cube, list(df.columns))
+    write_bundle(
+        bundle_dir, df, metrics, source_digest, source_name,
+        cube=cube, fingerprints=fingerprints, clients_digest=clients_digest,
+    )
+    return metrics, summary
+
+
+def export_artifacts(metrics: dict[str, pd.DataFrame], out_dir: Path) -> list[str]:
+    """
+    Escribe un CSV por métrica. Solo reescribe los ficheros cuyo contenido
+    cambia (los demás conservan su mtime); devuelve los nombres escritos.
+    """
     out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
     for name, df in metrics.items():
-        df.to_csv(out_dir / f"{name}.csv", index=False)
+        path = out_dir / f"{name}.csv"
+        data = df.to_csv(index=False).encode("utf-8")
+        if path.exists() and path.read_bytes() == data:
+            continue
+        tmp = path.with_suffix(".csv.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        written.append(name)
+    return written
+
+
+def run_all(excel_path: Path, out_dir: Path) -> list[str]:
+    from .bundle import file_digest, is_fresh, load_metrics
+    from .clients import clients_digest
+
+    bundle_dir = out_dir / "bundle"
+    digest = file_digest(excel_path)
+    # Editar client_overrides.csv (o borrar la caché de alias) también invalida el bundle
+    if is_fresh(bundle_dir, digest, clients_digest(excel_path.parent)):
+        return export_artifacts(load_metrics(bundle_dir), out_dir)
+    df_realizados = load_trabajos_realizados(excel_path)
+    # Bundle columnar que el dashboard abre en frío sin parsear el Excel
+    metrics, _ = refresh_bundle(
+        bundle_dir, df_realizados, digest, excel_path.name,
+        clients_digest=clients_digest(excel_path.parent),  # tras leer: la caché de alias pudo crecer
+    )
+    return export_artifacts(metrics, out_dir) + ["bundle"]
 
 
-def run_all(excel_path: Path, out_dir: Path) -> None:
-    df_realizados = load_trabajos_realizados(excel_path)
-    metrics = build_metrics(df_realizados)
-    export_artifacts(metrics, out_dir)
+def run_years(excel_path: Path, out_dir: Path, years: list[int]) -> Path:
+    """
+    Métricas solo de los años pedidos. Lee únicamente esas particiones del
+    bundle (si no está fresco, se regenera antes con run_all).
+    """
+    from .bundle import file_digest, is_fresh, load_fact
+    from .clients import clients_digest
+
+    bundle_dir = out_dir / "bundle"
+    if not is_fresh(bundle_dir, file_digest(excel_path), clients_digest(excel_path.parent)):
+        run_all(excel_path, out_dir)
+    df_years = load_fact(bundle_dir, {"AÑO": years})
+    years_dir = out_dir / ("anios_" + "-".join(str(y) for y in sorted(years)))
+    export_artifacts(build_metrics(df_years), years_dir)
+    return years_dir
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from .sketches import approx_quantile
+
+# Códigos de cuadrante (volumen = facturación, rentabilidad = €/h)
+ALTO_ALTO = 0    # alta facturación + alto €/h
+ALTO_BAJO = 1    # alta facturación + bajo €/h
+BAJO_ALTO = 2    # baja facturación + alto €/h
+BAJO_BAJO = 3    # baja facturación + bajo €/h
+SIN_DATOS = 4    # falta facturación o €/h
+
+RECO_LABELS = ("priorizar", "optimizar", "potenciar", "evitar", "sin_datos")
+ACCION_LABELS = ("Escalar", "Revisar", "Oportunidad", "Evitar", "Sin datos")
+
+
+def quadrant_thresholds(
+    df_agg: pd.DataFrame,
+    fact_col: str = "facturacion",
+    eurh_col: str = "eur_h",
+    method: str = "median",
+    q: float = 0.5,
+    eurh_target: float | None = None,
+    fact_target: float | None = None,
+    approx: bool = False,
+) -> tuple[float, float]:
+    """
+    Umbrales (facturación, €/h) para clasificar.
+    - method="median": mediana de cada columna
+    - method="percentile": percentil q (0-1) de cada columna
+    - eurh_target / fact_target: umbral fijo que sustituye al calculado
+    approx=True usa un sketch KLL (útil con miles de clientes).
+    """
+    if method == "median":
+        q = 0.5
+    elif method != "percentile":
+        raise ValueError(f"Método de umbral no soportado: {method}")
+
+    def _q(col: str) -> float:
+        vals = df_agg[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        vals = vals[np.isfinite(vals)]
+        if not len(vals):
+            return float("nan")
+        return approx_quantile(vals, q) if approx else float(np.quantile(vals, q))
+
+    fact_thr = float(fact_target) if fact_target is not None else _q(fact_col)
+    eurh_thr = float(eurh_target) if eurh_target is not None else _q(eurh_col)
+    return fact_thr, eurh_thr
+
+
+def assign_quadrants(
+    df_agg: pd.DataFrame,
+    fact_col: str = "facturacion",
+    eurh_col: str = "eur_h",
+    thresholds: tuple[float, float] | None = None,
+    **kwargs,
+) -> np.ndarray:
+    """Código de cuadrante por fila (np.select, sin apply por fila)."""
+    if thresholds is None:
+        thresholds = quadrant_thresholds(df_agg, fact_col, eurh_col, **kwargs)
+    fact = df_agg[fact_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    eurh = df_agg[eurh_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    return quadrant_codes(fact, eurh, *thresholds)
+
+
+def quadrant_codes(fact: np.ndarray, eurh: np.ndarray, fact_thr, eurh_thr) -> np.ndarray:
+    """
+    Igual que assign_quadrants sobre arrays de cualquier forma; los umbrales
+    pueden ser escalares o arrays que se difunden (p. ej. uno por escenario).
+    """
+    eurh = np.where(np.isinf(eurh), np.nan, eurh)
+    missing = np.isnan(fact) | np.isnan(eurh)
+    hi_f = fact >= fact_thr
+    hi_e = eurh >= eurh_thr
+    return np.select(
+        [missing, hi_f & hi_e, hi_f & ~hi_e, ~hi_f & hi_e],
+        [SIN_DATOS, ALTO_ALTO, ALTO_BAJO, BAJO_ALTO],
+        default=BAJO_BAJO,
+    ).astype(np.int8)
+
+
+def quadrant_order(
+    df_agg: pd.DataFrame,
+    codes: np.ndarray,
+    fact_col: str = "facturacion",
+    eurh_col: str = "eur_h",
+) -> np.ndarray:
+    """
+    Posiciones ordenadas por cuadrante y, dentro de cada uno, con su
+    criterio propio (un único lexsort):
+      alto/alto: facturación ↓, €/h ↓     alto/bajo: facturación ↓, €/h ↑
+      bajo/alto: €/h ↓, facturación ↓     bajo/bajo: facturación ↓, €/h ↑
+      sin datos: orden original
+    """
+    fact = df_agg[fact_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    eurh = df_agg[eurh_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    conds = [codes == ALTO_ALTO, codes == ALTO_BAJO, codes == BAJO_ALTO, codes == BAJO_BAJO]
+    k1 = np.select(conds, [-fact, -fact, -eurh, -fact], 0.0)
+    k2 = np.select(conds, [-eurh, eurh, -fact, eurh], 0.0)
+    pos = np.arange(len(codes))
+    return np.lexsort((pos, k2, k1, codes))
+
+
+def label_quadrants(codes: np.ndarray, labels: tuple[str, ...] = ACCION_LABELS) -> np.ndarray:
+    return np.asarray(labels, dtype=object)[codes]
+
+
+def split_quadrants(
+    df_agg: pd.DataFrame,
+    labels: tuple[str, ...] = RECO_LABELS,
+    fact_col: str = "facturacion",
+    eurh_col: str = "eur_h",
+    **kwargs,
+) -> dict[str, pd.DataFrame]:
+    """
+    Clasifica df_agg (cualquier agregado: tipo de trabajo, tipo de cliente,
+    cliente, TT × TC...) y devuelve un DataFrame ordenado por cuadrante.
+    """
+    if df_agg.empty:
+        return {lab: df_agg.iloc[0:0] for lab in labels}
+
+    codes = assign_quadrants(df_agg, fact_col, eurh_col, **kwargs)
+    order = quadrant_order(df_agg, codes, fact_col, eurh_col)
+    sorted_codes = codes[order]
+    bounds = np.searchsorted(sorted_codes, np.arange(len(labels) + 1))
+
+    out: dict[str, pd.DataFrame] = {}
+    for c, lab in enumerate(labels):
+        out[lab] = df_agg.iloc[order[bounds[c]:bounds[c + 1]]]
+    return out
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import itertools
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .quadrants import ACCION_LABELS, quadrant_codes
+
+# Simulador what-if: "¿y si subimos un 10% los precios de tal tipo de
+# trabajo o recortamos un 15% sus horas?". Se parte de las sumas por grupo
+# (facturación y horas de cada TT × TC, cliente...) ya agregadas; cada
+# escenario es una fila de dos matrices de multiplicadores (precio y horas,
+# escenarios × grupos), así que todos se evalúan a la vez con aritmética de
+# arrays, sin volver a agrupar filas.
+
+SCENARIO_COL = "escenario"
+SCENARIO_COLUMNS = [SCENARIO_COL, "dimension", "valor", "precio", "horas"]
+
+
+def scenario_grid(
+    dimension: str,
+    values: Iterable,
+    price_mults: Sequence[float],
+    hours_mults: Sequence[float],
+) -> pd.DataFrame:
+    """
+    Un escenario por cada par (multiplicador de precio, de horas), aplicado a
+    la vez a todos los `values` de `dimension`. Formato largo: una fila por
+    escenario y valor (SCENARIO_COLUMNS).
+    """
+    values = list(values)
+    rows = []
+    for s, (p, h) in enumerate(itertools.product(price_mults, hours_mults)):
+        rows.extend((s, dimension, v, float(p), float(h)) for v in values)
+    return pd.DataFrame(rows, columns=SCENARIO_COLUMNS)
+
+
+def _multipliers(groups: pd.DataFrame, scenarios: pd.DataFrame, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Matrices (n escenarios × grupos) de multiplicadores de precio y de horas."""
+    price = np.ones((n, len(groups)))
+    hours = np.ones((n, len(groups)))
+    for dimension, rows in scenarios.groupby("dimension", sort=False):
+        if dimension not in groups.columns:
+            raise ValueError(f"Los grupos no tienen la dimensión {dimension!r}")
+        codes, uniques = pd.factorize(groups[dimension])
+        target = uniques.get_indexer(rows["valor"])  # -1 si el valor no está en los grupos
+        hit = codes[None, :] == target[:, None]  # filas del escenario × grupos
+        hit &= target[:, None] >= 0
+        s = rows[SCENARIO_COL].to_numpy()
+        # multiply.at acumula si un escenario toca varias veces el mismo grupo
+        np.multiply.at(price, s, np.where(hit, rows["precio"].to_numpy()[:, None], 1.0))
+        np.multiply.at(hours, s, np.where(hit, rows["horas"].to_numpy()[:, None], 1.0))
+    return price, hours
+
+
+def _medians(x: np.ndarray) -> np.ndarray:
+    finite = np.where(np.isfinite(x), x, np.nan)
+    out = np.full(x.shape[0], np.nan)
+    ok = ~np.all(np.isnan(finite), axis=1)
+    out[ok] = np.nanmedian(finite[ok], axis=1)
+    return out
+
+
+def evaluate_scenarios(
+    groups: pd.DataFrame,
+    scenarios: pd.DataFrame,
+    keys: Sequence[str],
+    fact_col: str = "facturacion",
+    hours_col: str = "horas",
+    fixed_thresholds: bool = True,
+) -> pd.DataFrame:
+    """
+    Todos los escenarios sobre los grupos de una vez. Devuelve un frame
+    ordenado (escenario × grupo) con facturación, horas, €/h y acción de
+    cada grupo, su acción de partida y si cambia.
+
+    fixed_thresholds=True clasifica con las medianas de partida (se ve qué
+    grupos cruzan el umbral actual); False recalcula las medianas en cada
+    escenario, como haría el dashboard con los datos simulados.
+    """
+    scenarios = scenarios[SCENARIO_COLUMNS]
+    ids = np.sort(scenarios[SCENARIO_COL].unique())
+    # Escenarios numerados 0..n-1 para indexar las matrices
+    scenarios = scenarios.assign(**{SCENARIO_COL: np.searchsorted(ids, scenarios[SCENARIO_COL])})
+    n, g = len(ids), len(groups)
+
+    fact0 = groups[fact_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    hours0 = groups[hours_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eurh0 = np.where(hours0 > 0, fact0 / hours0, np.nan)
+    base_thr = (_medians(fact0[None, :])[0], _medians(eurh0[None, :])[0])
+    base_codes = quadrant_codes(fact0, eurh0, *base_thr)
+
+    price, hours_m = _multipliers(groups, scenarios, n)
+    fact = price * fact0[None, :]
+    hours = hours_m * hours0[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eurh = np.where(hours > 0, fact / hours, np.nan)
+    if fixed_thresholds:
+        codes = quadrant_codes(fact, eurh, *base_thr)
+    else:
+        codes = quadrant_codes(fact, eurh, _medians(fact)[:, None], _medians(eurh)[:, None])
+
+    out = pd.DataFrame({SCENARIO_COL: np.repeat(ids, g)})
+    for k in keys:
+        out[k] = np.tile(groups[k].to_numpy(), n)
+    out["trabajos"] = np.tile(groups["trabajos"].to_numpy(), n) if "trabajos" in groups.columns else np.nan
+    labels = np.asarray(ACCION_LABELS, dtype=object)
+    out = out.assign(
+        precio_mult=price.ravel(),
+        horas_mult=hours_m.ravel(),
+        facturacion=fact.ravel(),
+        horas=hours.ravel(),
+        eur_h=eurh.ravel(),
+        eur_h_base=np.tile(eurh0, n),
+        accion=labels[codes.ravel()],
+        accion_base=labels[np.tile(base_codes, n)],
+    )
+    out["cambia"] = out["accion"] != out["accion_base"]
+    return out
+
+
+def summarize_scenarios(result: pd.DataFrame, scenarios: pd.DataFrame) -> pd.DataFrame:
+    """Una fila por escenario: multiplicadores, totales, €/h global y grupos que cambian de acción."""
+    sums = result.assign(
+        a_escalar=(result["accion"] == "Escalar") & result["cambia"],
+        grupos_cambian=result["cambia"],
+    ).groupby(SCENARIO_COL, sort=True)[["facturacion", "horas", "grupos_cambian", "a_escalar"]].sum()
+    summary = sums.astype({"grupos_cambian": np.int64, "a_escalar": np.int64})
+    summary["eur_h"] = np.where(summary["horas"] > 0, summary["facturacion"] / summary["horas"], np.nan)
+    mults = scenarios.groupby(SCENARIO_COL, sort=True)[["precio", "horas"]].first()
+    summary = mults.rename(columns={"precio": "precio_mult", "horas": "horas_mult"}).join(summary)
+    return summary.reset_index()
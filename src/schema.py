@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .clients import resolve_clients
+from .money import convert_money_columns
+from .utils import ParseCancelled, ProgressFn, open_workbook, parse_structured_sheet, to_datetime_safe, to_numeric_safe
+
+# Esquema declarativo de cada tipo de hoja: columna canónica, tipo,
+# obligatoria u opcional y si se arrastra hacia abajo (celdas combinadas).
+# load_sheet compila el esquema en un único lector: la limpieza de texto se
+# aplica como converter durante el parseo (una función por celda, antes de
+# la inferencia de tipos) y cada columna pasa por una sola coerción.
+# Una hoja nueva es un SheetSchema más, no otro loader.
+
+TEXT = "text"      # espacios colapsados; "", "nan", "None" -> NA
+MONTH = "month"    # texto en mayúsculas, SETIEMBRE -> SEPTIEMBRE
+YEAR = "year"      # entero nulable (Int64)
+NUMBER = "number"  # float / int
+DATE = "date"      # datetime (día primero)
+MONEY = "money"    # céntimos enteros (Int64, ver src/money.py)
+KINDS = (TEXT, MONTH, YEAR, NUMBER, DATE, MONEY)
+
+MONTH_MAP = {
+    "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4, "MAYO": 5, "JUNIO": 6,
+    "JULIO": 7, "AGOSTO": 8, "SEPTIEMBRE": 9, "SETIEMBRE": 9, "OCTUBRE": 10,
+    "NOVIEMBRE": 11, "DICIEMBRE": 12
+}
+
+_NA_TEXT = {"", "nan", "NaT", "None"}
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    kind: str = TEXT
+    required: bool = False
+    ffill: bool = False
+
+    def __post_init__(self):
+        if self.kind not in KINDS:
+            raise ValueError(f"Tipo de columna desconocido: {self.kind}")
+
+
+@dataclass(frozen=True)
+class SheetSchema:
+    sheet: str
+    columns: tuple[Column, ...]
+    must_contain: tuple[str, ...] = ("MES", "CLIENTE", "PRECIO")
+    header_row: int | None = None      # fija; si no, se busca con must_contain
+    single_sheet: bool = False         # libro de una sola hoja: se lee esa aunque se llame distinto
+    drop: tuple[str, ...] = ()
+    year_month: tuple[str, str, str] | None = ("AÑO", "MES", "YM_ENCARGO")  # (año, mes, destino "2025-03")
+    resolve_clients: bool = False      # unificar grafías de CLIENTE (src/clients.py)
+    money_fallback: bool = False       # sin MI PRECIO: primera columna con PRECIO (y sin HORA)
+
+
+def _text_cell(v):
+    # Igual que utils.clean_text, pero celda a celda durante el parseo
+    if v is None or (isinstance(v, float) and v != v):
+        return np.nan
+    s = " ".join(str(v).split())
+    return np.nan if s in _NA_TEXT else s
+
+
+def _month_cell(v):
+    s = _text_cell(v)
+    if not isinstance(s, str):
+        return s
+    s = s.upper()
+    return "SEPTIEMBRE" if s == "SETIEMBRE" else s
+
+
+CONVERTERS = {TEXT: _text_cell, MONTH: _month_cell}
+
+
+def _coerce(s: pd.Series, kind: str) -> pd.Series:
+    """Única coerción de tipo de una columna (el dinero va aparte, en céntimos)."""
+    if kind in (TEXT, MONTH):
+        out = s.astype("str")
+        # pandas < 3 no tiene dtype str: astype deja object y NaN -> "nan"
+        return out.where(s.notna()) if out.dtype == object else out
+    if kind in (NUMBER, YEAR):
+        return to_numeric_safe(s)
+    if kind == DATE:
+        return to_datetime_safe(s)
+    return s
+
+
+def _sheet_name(sheet_names: list[str], schema: SheetSchema) -> str:
+    if not sheet_names:
+        raise ValueError("No se puede leer el Excel: el archivo no contiene hojas.")
+    if schema.single_sheet and len(sheet_names) == 1:
+        return sheet_names[0]
+    if schema.sheet in sheet_names:
+        return schema.sheet
+    raise ValueError(
+        f"No se puede leer el Excel: hay varias hojas ({sheet_names}) "
+        f"y no existe la hoja '{schema.sheet}'."
+    )
+
+
+def year_month(year: pd.Series, month: pd.Series) -> pd.Series:
+    """AÑO (Int64) + MES (texto) -> 'AAAA-MM' (NA si falta alguno)."""
+    dt = pd.to_datetime(dict(year=year, month=month.map(MONTH_MAP), day=1), errors="coerce")
+    return dt.dt.to_period("M").astype(str)
+
+
+def load_sheet(
+    excel_path: Path,
+    schema: SheetSchema,
+    progress: ProgressFn | None = None,
+    cancel: threading.Event | None = None,
+) -> pd.DataFrame:
+    """
+    Hoja limpia según su esquema. progress(etapa, filas, estimadas) y cancel
+    permiten leerla en segundo plano (ver src/background.py).
+    """
+    if progress is not None:
+        progress("abriendo", 0, None)
+    # Un solo libro abierto para listar hojas y leer (abrirlo es lo caro)
+    wb = open_workbook(excel_path)
+    try:
+        sheet_name = _sheet_name(wb.sheetnames, schema)
+        df = parse_structured_sheet(
+            excel_path=excel_path,
+            sheet_name=sheet_name,
+            must_contain=list(schema.must_contain) if schema.header_row is None else None,
+            header_row=schema.header_row,
+            progress=progress,
+            cancel=cancel,
+            workbook=wb,
+            converters={c.name: CONVERTERS[c.kind] for c in schema.columns if c.kind in CONVERTERS},
+        )
+    finally:
+        wb.close()
+    if cancel is not None and cancel.is_set():
+        raise ParseCancelled(str(excel_path))
+    if progress is not None:
+        progress("limpiando", len(df), len(df))
+
+    missing = [c.name for c in schema.columns if c.required and c.name not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias en la hoja '{sheet_name}': {missing}")
+    df = df.drop(columns=[c for c in schema.drop if c in df.columns])
+    # Cabeceras repetidas a mitad de hoja (bloques copiados): sus textos
+    # obligatorios coinciden con el nombre de la columna
+    header_cols = [c.name for c in schema.columns if c.required and c.kind == TEXT]
+    if header_cols:
+        repeated = np.logical_and.reduce([(df[c] == c).fillna(False).to_numpy(dtype=bool) for c in header_cols])
+        if repeated.any():
+            df = df[~repeated].reset_index(drop=True)
+
+    for col in schema.columns:
+        if col.name not in df.columns or col.kind == MONEY:
+            continue
+        s = _coerce(df[col.name], col.kind)
+        if col.ffill:
+            s = s.ffill()
+        if col.kind == YEAR:
+            s = s.astype("Int64")
+        df[col.name] = s
+
+    # Un mismo cliente escrito de varias formas cuenta como uno (src/clients.py);
+    # el mapa de alias se cachea junto al Excel
+    if schema.resolve_clients and "CLIENTE" in df.columns:
+        df["CLIENTE"], aliases = resolve_clients(df["CLIENTE"], Path(excel_path).parent)
+        if aliases:
+            df.attrs["client_aliases"] = aliases
+
+    if schema.year_month is not None:
+        year_col, month_col, target = schema.year_month
+        if year_col in df.columns and month_col in df.columns:
+            df[target] = year_month(df[year_col], df[month_col])
+
+    if schema.money_fallback and "MI PRECIO" not in df.columns:
+        for c in df.columns:
+            if "PRECIO" in str(c).upper() and "HORA" not in str(c).upper():
+                df["MI PRECIO"] = df[c]
+                break
+
+    # Dinero como céntimos enteros (Int64): sumas exactas
+    return convert_money_columns(df, [c.name for c in schema.columns if c.kind == MONEY])
+
+
+_COMMON = (
+    Column("CLIENTE", required=True),
+    Column("NOMBRE ENCARGO"),
+    Column("LOCALIDAD"),
+    Column("TIPO DE CLIENTE"),
+    Column("TIPO DE TRABAJO"),
+    Column("CAPTACIÓN CLIENTE"),
+    Column("ESTADO"),
+    Column("HORAS DEDICADAS", NUMBER),
+    Column("PRECIO/HORA", NUMBER),
+    Column("FECHA ENTREGA", DATE),
+    Column("MI PRECIO", MONEY),
+)
+
+TRABAJOS_REALIZADOS = SheetSchema(
+    sheet="TRABAJOS REALIZADOS",
+    columns=(Column("AÑO", YEAR, required=True, ffill=True), Column("MES", MONTH, required=True, ffill=True), *_COMMON),
+    single_sheet=True,
+    resolve_clients=True,
+    money_fallback=True,
+)
+
+# En curso no lleva AÑO (solo MES DE ENCARGO): sin año no hay YM_ENCARGO
+TRABAJOS_EN_CURSO = SheetSchema(
+    sheet="TRABAJOS EN CURSO",
+    columns=(Column("AÑO", YEAR, ffill=True), Column("MES", MONTH, required=True, ffill=True), *_COMMON),
+    drop=("ENVIADO",),  # da problemas con Arrow
+)
@@ -0,0 +1,149 @@
+"""
+Comprueba las cotas de error documentadas en src/sketches.py contra los
+valores exactos, con datos sembrados:
+
+- ``hll``        nunique_by frente a ``groupby().nunique()`` con grupos de
+                 tamaños muy distintos (de 0 a ~40 m distintos, incluida la
+                 zona de 2.5 m). El error relativo cuadrático medio debe
+                 quedar en 1.04 / sqrt(m) (con un 25 % de holgura por el
+                 muestreo) y ningún grupo a más de 4 desviaciones (o de
+                 dos unidades, en grupos de pocos distintos).
+- ``hll_merge``  combinar HyperLogLog por trozos da los mismos registros
+                 (y el mismo conteo) que uno solo con todos los datos.
+- ``kll_exacto`` con n ≤ k el cuantil es el de pandas.
+- ``kll``        con n grande (varias distribuciones, sketches sueltos y
+                 combinados por trozos) al menos el 98 % de los cuantiles
+                 pedidos caen a ≤ 1.65 / k de su rango (cota al 99 %).
+
+Sale con código 1 si alguna comprobación falla.
+
+    python -m src.sketch_check
+    python -m src.sketch_check --trials 20 --seed 3
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .sketches import HyperLogLog, KLLSketch, nunique_by
+
+P = 12
+K = 200
+HLL_RMS_SLACK = 1.25
+HLL_MAX_SIGMAS = 4
+HLL_MIN_UNITS = 2  # con pocos distintos el error es de unidades
+KLL_MIN_COVERAGE = 0.98
+QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+def check_hll(rng: np.random.Generator, trials: int, p: int = P) -> list[str]:
+    m = 1 << p
+    sigma = 1.04 / np.sqrt(m)
+    sizes = np.unique(np.round(np.geomspace(1, 40 * m, 24)).astype(np.int64))
+    errors, excess = [], []
+    for _ in range(trials):
+        # Cada grupo repite sus valores (como clientes con varios trabajos)
+        parts = []
+        for g, n in enumerate(sizes):
+            ids = rng.integers(0, 2 ** 62, n)
+            parts.append(pd.DataFrame({"g": g, "c": rng.choice(ids, int(n * 1.5))}))
+        df = pd.concat(parts, ignore_index=True)
+        exact = df.groupby("g")["c"].nunique()
+        est = nunique_by(df, "g", "c", p).reindex(exact.index)
+        errors.append((est / exact - 1).to_numpy())
+        excess.append((est - exact).abs() - np.maximum(HLL_MAX_SIGMAS * sigma * exact, HLL_MIN_UNITS))
+    err = np.vstack(errors)
+    rms = float(np.sqrt(np.mean(err ** 2)))
+    worst = float(np.abs(err).max())
+    out = []
+    if rms > HLL_RMS_SLACK * sigma:
+        out.append(f"hll: error cuadrático medio {rms:.4f} > {HLL_RMS_SLACK} × {sigma:.4f}")
+    if max(e.max() for e in excess) > 0:
+        out.append(f"hll: algún grupo a más de {HLL_MAX_SIGMAS} × {sigma:.4f} (y de {HLL_MIN_UNITS} unidades)")
+    # Sesgo: la media de los errores por tamaño no debe apartarse del 0
+    bias = np.abs(err.mean(axis=0)).max()
+    if bias > HLL_MAX_SIGMAS * sigma / np.sqrt(len(err)):
+        out.append(f"hll: sesgo {bias:.4f} en algún tamaño de grupo")
+    print(f"hll        p={p}: rms {rms:.4f}  máx {worst:.4f}  sesgo máx {bias:.4f}  (σ = {sigma:.4f})")
+    return out
+
+
+def check_hll_merge(rng: np.random.Generator, p: int = P) -> list[str]:
+    values = rng.integers(0, 50_000, 200_000)
+    whole = HyperLogLog(p).update(values)
+    merged = HyperLogLog(p)
+    for chunk in np.array_split(values, 7):
+        merged = merged.merge(HyperLogLog(p).update(chunk))
+    ok = np.array_equal(whole.registers, merged.registers) and whole.count() == merged.count()
+    print(f"hll_merge  p={p}: {'igual' if ok else 'DISTINTO'} ({whole.count():.0f} frente a {merged.count():.0f})")
+    return [] if ok else ["hll_merge: combinar por trozos no da el mismo sketch"]
+
+
+def _rank_distance(data: np.ndarray, x: float, q: float) -> float:
+    # Distancia de q al intervalo de rangos normalizados de x (hay empates)
+    lo = np.searchsorted(data, x, side="left") / len(data)
+    hi = np.searchsorted(data, x, side="right") / len(data)
+    return max(lo - q, q - hi, 0.0)
+
+
+def check_kll_exact(rng: np.random.Generator, k: int = K) -> list[str]:
+    out = []
+    for n in (1, 2, 17, k):
+        s = pd.Series(rng.lognormal(4, 1, n))
+        sk = KLLSketch(k).update(s)
+        for q in QUANTILES:
+            if not (sk.is_exact and sk.quantile(q) == s.quantile(q)):
+                out.append(f"kll_exacto: n={n} q={q} {sk.quantile(q)} ≠ {s.quantile(q)}")
+    print(f"kll_exacto k={k}: {'igual a pandas' if not out else f'{len(out)} diferencias'}")
+    return out
+
+
+def check_kll(rng: np.random.Generator, trials: int, k: int = K) -> list[str]:
+    bound = 1.65 / k
+    dists = {
+        "uniforme": lambda n: rng.uniform(0, 1, n),
+        "lognormal": lambda n: rng.lognormal(8, 1.2, n),      # importes
+        "enteros": lambda n: rng.integers(0, 500, n) * 100.0,  # muchos empates
+    }
+    dist = []
+    for _ in range(trials):
+        for make in dists.values():
+            for n in (10_000, 100_000):
+                data = make(n)
+                single = KLLSketch(k, seed=int(rng.integers(2 ** 31))).update(data)
+                merged = KLLSketch(k, seed=int(rng.integers(2 ** 31)))
+                for chunk in np.array_split(data, 5):
+                    merged = merged.merge(KLLSketch(k, seed=int(rng.integers(2 ** 31))).update(chunk))
+                data = np.sort(data)
+                for sk in (single, merged):
+                    dist += [_rank_distance(data, sk.quantile(q), q) for q in QUANTILES]
+    dist = np.array(dist)
+    coverage = float(np.mean(dist <= bound))
+    print(f"kll        k={k}: {coverage:.1%} de {len(dist)} cuantiles a ≤ {bound:.4f} del rango (máx {dist.max():.4f})")
+    if coverage < KLL_MIN_COVERAGE:
+        return [f"kll: solo el {coverage:.1%} de los cuantiles dentro de 1.65 / k"]
+    return []
+
+
+def run(trials: int = 10, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [
+        *check_hll(rng, trials),
+        *check_hll_merge(rng),
+        *check_kll_exact(rng),
+        *check_kll(rng, max(1, trials // 2)),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comprueba las cotas de error de src/sketches.py.")
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    failures = run(args.trials, args.seed)
+    for f in failures:
+        print(f"FALLO {f}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Tabla de hechos particionada por AÑO (y opcionalmente por estudio):
+#   <root>/AÑO=2024/part.arrow
+#   <root>/ESTUDIO=Vigo/AÑO=2025/part.arrow
+# El catálogo (filas, meses min/max, totales) va en el manifest del bundle.
+
+YEAR_COL = "AÑO"
+NULL_KEY = "__null__"
+PART_FILE = "part.arrow"
+ROW_COL = "__row__"  # posición original, para reconstruir el orden al leer varias particiones
+
+
+def _key_str(v) -> str:
+    return NULL_KEY if pd.isna(v) else str(v)
+
+
+def write_table(df: pd.DataFrame, path: Path, schema: pa.Schema | None = None) -> int:
+    # IPC sin compresión: se puede abrir con memory-map sin descomprimir
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return table.num_rows
+
+
+def read_table(path: Path) -> pd.DataFrame:
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+def _partition_stats(part: pd.DataFrame) -> dict:
+    stats: dict = {"rows": int(len(part))}
+    if "YM_ENCARGO" in part.columns:
+        ym = part["YM_ENCARGO"].dropna()
+        ym = ym[~ym.isin(["NaT", "NA", ""])]
+        stats["ym_min"] = str(ym.min()) if len(ym) else None
+        stats["ym_max"] = str(ym.max()) if len(ym) else None
+    if "MI PRECIO" in part.columns:
+        total = part["MI PRECIO"].sum(min_count=1)
+        stats["facturacion_cents"] = None if pd.isna(total) else int(total)
+    if "HORAS DEDICADAS" in part.columns:
+        total = part["HORAS DEDICADAS"].sum(min_count=1)
+        stats["horas"] = None if pd.isna(total) else float(total)
+    return stats
+
+
+def write_partitions(
+    df: pd.DataFrame,
+    root: Path,
+    by: Iterable[str] = (YEAR_COL,),
+) -> list[dict]:
+    """
+    Escribe df particionado (estilo hive) y devuelve el catálogo:
+    una entrada por partición con su ruta, claves y estadísticas.
+    """
+    root = Path(root)
+    shutil.rmtree(root, ignore_errors=True)
+    root.mkdir(parents=True)
+    by = [c for c in by if c in df.columns]
+
+    data = df.assign(**{ROW_COL: np.arange(len(df), dtype=np.int64)})
+    groups = data.groupby(by, dropna=False, sort=True) if by else [((), data)]
+
+    catalog: list[dict] = []
+    for key, part in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        keys = {c: _key_str(v) for c, v in zip(by, key)}
+        rel = Path(*[f"{c}={v}" for c, v in keys.items()]) / PART_FILE
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        write_table(part, root / rel)
+        catalog.append({"path": rel.as_posix(), "keys": keys, **_partition_stats(part)})
+    return catalog
+
+
+def select_partitions(catalog: list[dict], selection: dict[str, Iterable] | None = None) -> list[dict]:
+    """
+    Poda de particiones: selection={"AÑO": [2024, 2025]} deja solo esas.
+    Una selección vacía o None no poda esa columna.
+    """
+    out = []
+    wanted = {c: {_key_str(v) for v in vals} for c, vals in (selection or {}).items() if vals}
+    for entry in catalog:
+        keys = entry["keys"]
+        if all(c not in keys or keys[c] in vals for c, vals in wanted.items()):
+            out.append(entry)
+    return out
+
+
+def read_partitions(
+    root: Path,
+    catalog: list[dict],
+    selection: dict[str, Iterable] | None = None,
+    columns: list[str] | None = None,
+    keep_rows: bool = False,
+) -> pd.DataFrame:
+    """
+    Lee solo las particiones que pasan la selección, en el orden original de
+    filas. keep_rows conserva ROW_COL (posición de cada fila en la tabla completa).
+    """
+    parts = [read_table(Path(root) / e["path"]) for e in select_partitions(catalog, selection)]
+    if not parts:
+        # Sin particiones: frame vacío con el esquema de la primera
+        parts = [read_table(Path(root) / catalog[0]["path"]).iloc[0:0]] if catalog else [pd.DataFrame({ROW_COL: []})]
+    df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    rows = df[ROW_COL].to_numpy()
+    if len(rows) and np.any(rows[1:] < rows[:-1]):
+        df = df.iloc[np.argsort(rows, kind="stable")]
+    df = df.reset_index(drop=True)
+    if not keep_rows:
+        df = df.drop(columns=[ROW_COL])
+    if columns is not None:
+        keep = [c for c in columns if c in df.columns and c != ROW_COL]
+        df = df[keep + [ROW_COL] if keep_rows else keep]
+    return df
+
+
+def catalog_values(catalog: list[dict], col: str) -> list[str]:
+    """Valores (sin nulos) de una columna de partición, sin leer las tablas."""
+    return sorted({e["keys"][col] for e in catalog if e["keys"].get(col, NULL_KEY) != NULL_KEY})
+
+
+def catalog_years(catalog: list[dict]) -> list[int]:
+    return sorted(int(y) for y in catalog_values(catalog, YEAR_COL))
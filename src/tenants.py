@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from .filters import TENANT_COL
+from .incremental import build_cube, tenant_cube
+from .pipeline import export_artifacts, load_trabajos_realizados, metrics_from_cube, refresh_bundle
+from .utils import ParseCancelled, ProgressFn
+
+# Consolidación de varios estudios que usan el mismo formato de GENERAL.xlsx:
+# cada libro se lee en su propio proceso (openpyxl no suelta el GIL), sus
+# filas se etiquetan con ESTUDIO y las categorías se unifican entre estudios
+# antes de concatenar. El cubo lleva ESTUDIO como dimensión, así que las
+# métricas por estudio y las totales salen del mismo cubo.
+
+# Dimensiones categóricas que se unifican (CLIENTE no: son nombres propios)
+CATEGORY_COLUMNS = ["TIPO DE TRABAJO", "TIPO DE CLIENTE", "CAPTACIÓN CLIENTE", "ESTADO", "MES", "LOCALIDAD"]
+
+
+def tenant_name(path: Path) -> str:
+    """Vigo.xlsx -> "Vigo"; Vigo/GENERAL.xlsx -> "Vigo"."""
+    path = Path(path)
+    return path.parent.name if path.stem.upper() == "GENERAL" and path.parent.name else path.stem
+
+
+def unique_names(names: list[str]) -> list[str]:
+    """Nombres de estudio sin repetir: dos GENERAL.xlsx -> "GENERAL", "GENERAL (2)"."""
+    out: list[str] = []
+    used: set[str] = set()
+    for name in names:
+        candidate, i = name, 1
+        while candidate.lower() in used:
+            i += 1
+            candidate = f"{name} ({i})"
+        used.add(candidate.lower())
+        out.append(candidate)
+    return out
+
+
+def tenants_digest(paths: list[Path], names: list[str]) -> str:
+    """Huella del conjunto: sha256 de cada libro + su estudio, en orden."""
+    from .bundle import file_digest
+
+    h = hashlib.sha256()
+    for path, name in zip(paths, names):
+        h.update(f"{name}\0{file_digest(path)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _category_key(value: str) -> str:
+    # Sin tildes, mayúsculas y espacios: "Particular " == "PARTICULAR"
+    v = unicodedata.normalize("NFKD", value)
+    v = "".join(ch for ch in v if not unicodedata.combining(ch))
+    return " ".join(v.upper().split())
+
+
+def unify_categories(frames: list[pd.DataFrame], columns: list[str] = CATEGORY_COLUMNS) -> tuple[list[pd.DataFrame], int]:
+    """
+    Un único diccionario por dimensión para todos los estudios: las
+    variantes que solo difieren en mayúsculas, tildes o espacios pasan a la
+    grafía más frecuente. Devuelve (frames, nº de valores reescritos).
+    """
+    changed = 0
+    for col in columns:
+        present = [f[col] for f in frames if col in f.columns]
+        if not present:
+            continue
+        counts = pd.concat(present, ignore_index=True).dropna().value_counts()
+        if counts.empty:
+            continue
+        keys = counts.index.map(lambda v: _category_key(str(v)))
+        # value_counts ordena por frecuencia: la primera grafía de cada clave gana
+        canonical = pd.Series(counts.index, index=keys)
+        canonical = canonical[~canonical.index.duplicated()]
+        mapping = {v: canonical[k] for v, k in zip(counts.index, keys) if canonical[k] != v}
+        if not mapping:
+            continue
+        changed += len(mapping)
+        frames = [f.assign(**{col: f[col].replace(mapping)}) if col in f.columns else f for f in frames]
+    return frames, changed
+
+
+def _concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True)
+    # money_issues guarda posiciones: se desplazan al concatenar
+    issues: dict[str, list[int]] = {}
+    offset = 0
+    for f in frames:
+        for col, rows in f.attrs.get("money_issues", {}).items():
+            issues.setdefault(col, []).extend(r + offset for r in rows)
+        offset += len(f)
+    df.attrs = {"money_issues": issues} if issues else {}
+    aliases = {k: v for f in frames for k, v in f.attrs.get("client_aliases", {}).items()}
+    if aliases:
+        df.attrs["client_aliases"] = aliases
+    return df
+
+
+def load_tenants(
+    paths: list[Path],
+    names: list[str] | None = None,
+    max_workers: int | None = None,
+    progress: ProgressFn | None = None,
+    cancel: threading.Event | None = None,
+) -> pd.DataFrame:
+    """
+    Lee N libros en paralelo (un proceso por libro) y devuelve un único
+    DataFrame con la columna ESTUDIO y las categorías unificadas.
+    progress recibe ("leyendo", libros leídos, total).
+    """
+    paths = [Path(p) for p in paths]
+    names = names or [tenant_name(p) for p in paths]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nombres de estudio repetidos: {names}")
+    if progress is not None:
+        progress("leyendo", 0, len(paths))
+
+    frames: dict[int, pd.DataFrame] = {}
+    if len(paths) == 1:
+        frames[0] = load_trabajos_realizados(paths[0], cancel=cancel)
+    else:
+        workers = max_workers or min(len(paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(load_trabajos_realizados, p): i for i, p in enumerate(paths)}
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    for fut in pending:
+                        fut.cancel()
+                    raise ParseCancelled(", ".join(p.name for p in paths))
+                for fut in done:
+                    i = pending.pop(fut)
+                    try:
+                        frames[i] = fut.result()
+                    except Exception as e:
+                        raise ValueError(f"{paths[i].name}: {e}") from e
+                    if progress is not None:
+                        progress("leyendo", len(frames), len(paths))
+    if progress is not None:
+        progress("limpiando", len(paths), len(paths))
+
+    tagged = []
+    for i, name in enumerate(names):
+        f = frames[i]
+        f.insert(0, TENANT_COL, name)  # escalar: dtype de texto por defecto (str en pandas 3, object en 2)
+        tagged.append(f)
+    tagged, _ = unify_categories(tagged)
+    df = _concat(tagged)
+    # Columnas de cada libro: un estudio sin HORAS DEDICADAS o sin ESTADO no
+    # hereda las del otro en sus métricas (ver tenant_metrics)
+    df.attrs["tenant_columns"] = {name: list(f.columns) for name, f in zip(names, tagged)}
+    return df
+
+
+def tenant_metrics(
+    cube: dict[str, pd.DataFrame],
+    columns: list[str],
+    tenant_columns: dict[str, list[str]] | None = None,
+) -> dict[str, dict[str, pd.DataFrame]]:
+    """
+    Métricas de cada estudio a partir del cubo consolidado (sin volver a las
+    filas). tenant_columns ({estudio: columnas de su libro}, ver
+    load_tenants) sustituye a `columns` para los estudios que aparecen en él.
+    """
+    if TENANT_COL not in cube["total"].columns:
+        return {}
+    tenant_columns = tenant_columns or {}
+    tenants = sorted(cube["total"][TENANT_COL].dropna().unique())
+    return {t: metrics_from_cube(tenant_cube(cube, t), tenant_columns.get(t, columns)) for t in tenants}
+
+
+def run_tenants(paths: list[Path], out_dir: Path, max_workers: int | None = None) -> dict[str, list[str]]:
+    """
+    Exporta el consolidado: métricas totales en out_dir (y el bundle con
+    todas las filas en out_dir/bundle) y las de cada estudio en
+    out_dir/<estudio>. Devuelve {destino: CSVs escritos}.
+    """
+    from .bundle import is_fresh, load_cube, load_fact, load_metrics, read_manifest
+    from .clients import clients_digest
+
+    paths = [Path(p) for p in paths]
+    names = unique_names([tenant_name(p) for p in paths])
+    bundle_dir = out_dir / "bundle"
+    digest = tenants_digest(paths, names)
+    # Cada libro unifica clientes con las correcciones de su propio directorio
+    client_dirs = list(dict.fromkeys(p.parent for p in paths))
+    if is_fresh(bundle_dir, digest, clients_digest(*client_dirs)):
+        metrics, cube = load_metrics(bundle_dir), load_cube(bundle_dir)
+        manifest = read_manifest(bundle_dir)
+        columns, tenant_columns = manifest["columns"], manifest.get("attrs", {}).get("tenant_columns")
+    else:
+        df = load_tenants(paths, names, max_workers=max_workers)
+        metrics, _ = refresh_bundle(
+            bundle_dir, df, digest, ", ".join(p.name for p in paths), clients_digest=clients_digest(*client_dirs),
+        )
+        cube, columns, tenant_columns = load_cube(bundle_dir), list(df.columns), df.attrs.get("tenant_columns")
+    if cube is None:  # bundle sin cubo: se reconstruye desde las filas
+        cube = build_cube(load_fact(bundle_dir))
+    written = {"TOTAL": export_artifacts(metrics, out_dir)}
+    for tenant, m in tenant_metrics(cube, columns, tenant_columns).items():
+        written[tenant] = export_artifacts(m, out_dir / tenant)
+    return written
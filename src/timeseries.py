@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from .money import cents_to_euros
+
+# Series temporales sobre un eje denso de meses (sin huecos): una sola
+# pasada por la tabla de hechos (np.bincount) deja los totales por mes y por
+# semana; trimestres y años salen de sumar bloques de meses, y las ventanas
+# móviles, el interanual y el acumulado del año de sumas prefijas. Cambiar
+# de granularidad o de ventana es O(periodos), sin volver a agrupar filas.
+
+# Medida -> (columna de fecha, ¿importe en céntimos?)
+MEASURES = {
+    "encargos_entrados": ("encargo", False),
+    "importe_entrado": ("encargo", True),
+    "facturacion_entrega": ("entrega", True),
+}
+# Granularidad -> (periodos por año, etiqueta)
+FREQS = {"W": (52, "Semana"), "M": (12, "Mes"), "Q": (4, "Trimestre"), "Y": (1, "Año")}
+
+
+def _month_index(ym: pd.Series) -> np.ndarray:
+    """'2025-03' -> año*12 + mes-1 (-1 si no hay mes). Se parsean solo los valores distintos."""
+    codes, uniques = pd.factorize(ym, use_na_sentinel=True)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype="object"), format="%Y-%m", errors="coerce")
+    idx_u = (parsed.dt.year * 12 + parsed.dt.month - 1).fillna(-1).to_numpy(dtype=np.int64)
+    return np.where(codes >= 0, idx_u[np.maximum(codes, 0)] if len(idx_u) else -1, -1)
+
+
+def _date_indexes(fechas: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """(índice de mes, índice de semana ISO desde 1970) de una columna datetime; -1 si falta."""
+    valid = fechas.notna().to_numpy()
+    month = np.full(len(fechas), -1, dtype=np.int64)
+    week = np.full(len(fechas), -1, dtype=np.int64)
+    if valid.any():
+        f = fechas[valid]
+        month[valid] = (f.dt.year * 12 + f.dt.month - 1).to_numpy(dtype=np.int64)
+        days = f.to_numpy().astype("datetime64[D]").astype(np.int64)
+        week[valid] = (days + 3) // 7  # 1970-01-01 fue jueves: semanas de lunes a domingo
+    return month, week
+
+
+def _bincount(idx: np.ndarray, weights: np.ndarray | None, origin: int, length: int) -> np.ndarray:
+    ok = idx >= 0
+    w = None if weights is None else weights[ok]
+    out = np.bincount(idx[ok] - origin, weights=w, minlength=length)
+    return out[:length]
+
+
+class TimeSeries:
+    """
+    Totales densos de un DataFrame limpio. El eje mensual va de enero del
+    primer año a diciembre del último, para que trimestres y años sean
+    bloques exactos de 3 y 12 meses.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        n = len(df)
+        ym = df["YM_ENCARGO"] if "YM_ENCARGO" in df.columns else pd.Series(pd.NA, index=df.index, dtype="str")
+        m_enc = _month_index(ym)
+        if "FECHA ENTREGA" in df.columns and pd.api.types.is_datetime64_any_dtype(df["FECHA ENTREGA"]):
+            m_ent, w_ent = _date_indexes(df["FECHA ENTREGA"])
+        else:
+            m_ent = w_ent = np.full(n, -1, dtype=np.int64)
+        encargo = df["NOMBRE ENCARGO"].notna().to_numpy(dtype=np.float64) if "NOMBRE ENCARGO" in df.columns else np.zeros(n)
+        cents = (
+            pd.to_numeric(df["MI PRECIO"], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+            if "MI PRECIO" in df.columns else np.zeros(n)
+        )
+
+        used = np.concatenate([m_enc[m_enc >= 0], m_ent[m_ent >= 0]])
+        if not len(used):
+            self.start_year, self.months = 0, 0
+            self.monthly = {m: np.zeros(0) for m in MEASURES}
+            self.weekly, self.week_origin = np.zeros(0), 0
+            self.span = (0, 0)
+            return
+        self.start_year = int(used.min()) // 12
+        end_year = int(used.max()) // 12
+        origin, self.months = self.start_year * 12, (end_year - self.start_year + 1) * 12
+        # Tramo con datos (para no pintar los meses vacíos de los extremos)
+        self.span = (int(used.min()) - origin, int(used.max()) - origin + 1)
+
+        self.monthly = {
+            "encargos_entrados": _bincount(m_enc, encargo, origin, self.months),
+            "importe_entrado": _bincount(m_enc, cents, origin, self.months),
+            "facturacion_entrega": _bincount(m_ent, cents, origin, self.months),
+        }
+        weeks = w_ent[w_ent >= 0]
+        self.week_origin = int(weeks.min()) if len(weeks) else 0
+        n_weeks = int(weeks.max()) - self.week_origin + 1 if len(weeks) else 0
+        self.weekly = _bincount(w_ent, cents, self.week_origin, n_weeks)
+
+    def measures(self, freq: str) -> list[str]:
+        """Medidas disponibles: por semana solo hay fecha de entrega (la de encargo es mensual)."""
+        return [m for m, (date, _) in MEASURES.items() if freq != "W" or date == "entrega"]
+
+    def _values(self, measure: str, freq: str) -> tuple[np.ndarray, list[str], np.ndarray, int, int]:
+        """(valores por periodo, etiquetas, año de cada periodo, [lo, hi) con datos)."""
+        if freq == "W":
+            if measure != "facturacion_entrega":
+                raise ValueError(f"{measure} no tiene resolución semanal")
+            starts = (np.arange(len(self.weekly)) + self.week_origin) * 7 - 3
+            dates = pd.to_datetime(starts, unit="D")
+            labels = [f"{y}-S{w:02d}" for y, w in zip(dates.isocalendar().year, dates.isocalendar().week)]
+            return self.weekly, labels, dates.isocalendar().year.to_numpy(), 0, len(self.weekly)
+        v = self.monthly[measure]
+        per_year = FREQS[freq][0]
+        lo, hi = self.span
+        if freq != "M":
+            # Trimestres/años: bloques completos del eje (que empieza en enero)
+            v = v.reshape(-1, 12 // per_year).sum(axis=1)
+            lo, hi = lo // (12 // per_year), (hi - 1) // (12 // per_year) + 1
+        years = self.start_year + np.arange(len(v)) // per_year
+        if freq == "M":
+            labels = [f"{y}-{m:02d}" for y, m in zip(years, np.arange(len(v)) % 12 + 1)]
+        elif freq == "Q":
+            labels = [f"{y}-T{q}" for y, q in zip(years, np.arange(len(v)) % 4 + 1)]
+        else:
+            labels = [str(y) for y in years]
+        return v, labels, years, lo, hi
+
+    def view(self, measure: str, freq: str = "M", window: int = 1) -> pd.DataFrame:
+        """
+        Una medida a la granularidad pedida: valor, total móvil de `window`
+        periodos, variación interanual (absoluta y %) y acumulado del año.
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"Medida desconocida: {measure}")
+        if freq not in FREQS:
+            raise ValueError(f"Granularidad desconocida: {freq}")
+        v, labels, years, lo, hi = self._values(measure, freq)
+        if not len(v):
+            return pd.DataFrame(columns=["periodo", "valor", "movil", "interanual", "interanual_pct", "acumulado_anio"])
+
+        prefix = np.concatenate([[0.0], np.cumsum(v)])
+        i = np.arange(1, len(v) + 1)
+        movil = prefix[i] - prefix[np.maximum(i - max(window, 1), 0)]
+        lag = FREQS[freq][0]  # mismo periodo del año anterior (52 semanas en semanal)
+        prev = np.full(len(v), np.nan)
+        if lag < len(v):
+            prev[lag:] = v[:-lag]
+        # Acumulado del año: prefijo menos el prefijo al inicio de su año
+        year_start = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+        first_of = np.repeat(year_start, np.diff(np.r_[year_start, len(v)]))
+        ytd = prefix[i] - prefix[first_of]
+
+        out = pd.DataFrame({
+            "periodo": labels,
+            "valor": v,
+            "movil": movil,
+            "interanual": v - prev,
+            "interanual_pct": np.where(prev > 0, (v - prev) / np.where(prev > 0, prev, 1) * 100, np.nan),
+            "acumulado_anio": ytd,
+        })
+        if MEASURES[measure][1]:
+            for c in ["valor", "movil", "interanual", "acumulado_anio"]:
+                out[c] = cents_to_euros(out[c])
+        else:
+            out["valor"] = out["valor"].astype(np.int64)
+        return out.iloc[lo:hi].reset_index(drop=True)
@@ -2,13 +2,16 @@
 from __future__ import annotations
 
 import re
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Any, Callable, Iterable, Mapping, Optional
 
 import numpy as np
+import openpyxl
 import pandas as pd
-import altair as alt
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
 
 
 HEADER_ALIASES = {
@@ -19,7 +22,7 @@ HEADER_ALIASES = {
     "LOCALIDAD": ["LOCALIDAD", "MUNICIPIO", "CIUDAD", "POBLACION", "POBLACIÓN"],
     "TIPO DE CLIENTE": ["TIPO DE CLIENTE", "TIPO DE CLIENTE ", "TIPO DE CLIEN..."],
     "TIPO DE TRABAJO": ["TIPO DE TRABAJO", "TIPO TRABAJO"],
-    "CAPTACIÓN CLIENTE": ["CAPTACIÓN CLIENTE", "CAPTACIÓN DE CLIENTE", "CAPTACION CLIENTE", "CAPTACION DE CLIENTE", "CAPTACIN DE CLIENTE", "CAPTACIÓN", "CAPTACION"],
+    "CAPTACIÓN CLIENTE": ["CAPTACIÓN CLIENTE", "CAPTACIÓN DE CLIENTE", "CAPTACION CLIENTE", "CAPTACION DE CLIENTE", "CAPTACIN DE CLIENTE", "CATPACIÓN CLIENTE", "CAPTACIÓN", "CAPTACION"],
     "MI PRECIO": ["MI PRECIO", "PRECIO", "IMPORTE", "MI PRECIO PRECIO"],
     "ESTADO": ["ESTADO", "PAGADO", "COBRADO", "ESTADO PAGO"],
     "FECHA ENTREGA": ["FECHA ENTREGA", "FECHA ENTREGA ", "FECHA"],
@@ -94,42 +97,112 @@ def _standardize_columns(cols: list[str]) -> list[str]:
             deduped.append(f"{c}_{seen[c]}")
     return deduped
 
+class ParseCancelled(Exception):
+    """Lectura cancelada desde fuera (p. ej. llega un Excel más nuevo)."""
+
+
+# progress(etapa, filas_leidas, filas_estimadas)
+ProgressFn = Callable[[str, int, Optional[int]], None]
+
+PROGRESS_EVERY = 500  # filas entre avisos de progreso
+
+
+def _convert_cell(cell):
+    # Misma conversión que el lector openpyxl de pandas (read_excel)
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        return val if val == cell.value else float(cell.value)
+    return cell.value
+
+
+def open_workbook(excel_path: Path):
+    """Libro openpyxl en modo lectura (las mismas opciones que read_excel)."""
+    return openpyxl.load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+
+
+def read_sheet_rows(
+    excel_path: Path,
+    sheet_name: str,
+    progress: ProgressFn | None = None,
+    cancel: threading.Event | None = None,
+    workbook=None,
+) -> list[list]:
+    """
+    Filas crudas de la hoja en una sola pasada (openpyxl read-only), como
+    las ve read_excel. Avisa del progreso cada PROGRESS_EVERY filas y
+    comprueba `cancel` entre bloques. Con workbook se reutiliza un libro
+    ya abierto (y no se cierra).
+    """
+    wb = workbook if workbook is not None else open_workbook(excel_path)
+    try:
+        ws = wb[sheet_name]
+        estimated = ws.max_row  # de la dimensión declarada; puede no ser exacta
+        ws.reset_dimensions()
+        data: list[list] = []
+        last_row_with_data = -1
+        for i, row in enumerate(ws.rows):
+            converted = [_convert_cell(c) for c in row]
+            while converted and converted[-1] == "":
+                converted.pop()
+            if converted:
+                last_row_with_data = i
+            data.append(converted)
+            if i % PROGRESS_EVERY == 0:
+                if cancel is not None and cancel.is_set():
+                    raise ParseCancelled(str(excel_path))
+                if progress is not None:
+                    progress("leyendo", i, estimated)
+    finally:
+        if workbook is None:
+            wb.close()
+    data = data[: last_row_with_data + 1]
+    if data:
+        width = max(len(r) for r in data)
+        data = [r + [""] * (width - len(r)) for r in data]
+    if progress is not None:
+        progress("leyendo", len(data), len(data))
+    return data
+
+
 def parse_structured_sheet(
     excel_path: Path,
     sheet_name: str,
     must_contain: Iterable[str] | None = None,
     header_row: int | None = None,
+    progress: ProgressFn | None = None,
+    cancel: threading.Event | None = None,
+    workbook=None,
+    converters: Mapping[str, Callable[[Any], Any]] | None = None,
 ) -> pd.DataFrame:
     """
     Reads an Excel sheet that may contain title rows.
     If header_row is provided, uses it directly as the header.
     Otherwise, tries to find the header row using must_contain.
+    The sheet is read once and then parsed like read_excel would.
+    converters ({columna canónica: función por celda}) se aplican durante
+    el parseo, antes de la inferencia de tipos.
     """
+    if header_row is None and must_contain is None:
+        raise ValueError("Either header_row or must_contain must be provided.")
 
-    # --- CASO 1: header_row explícito  ---
-    if header_row is not None:
-        df = pd.read_excel(
-            excel_path,
-            sheet_name=sheet_name,
-            header=header_row
-        )
-    else:
-        # --- CASO 2: comportamiento actual (detección automática) ---
-        if must_contain is None:
-            raise ValueError("Either header_row or must_contain must be provided.")
-
-        df_raw = pd.read_excel(
-            excel_path,
-            sheet_name=sheet_name,
-            header=None
-        )
+    rows = read_sheet_rows(excel_path, sheet_name, progress=progress, cancel=cancel, workbook=workbook)
+
+    # --- CASO 2: detección automática de la fila de cabecera ---
+    if header_row is None:
+        df_raw = TextParser(rows[:100], header=None, skip_blank_lines=False).read()
         header_row = find_header_row(df_raw, must_contain=must_contain)
 
-        df = pd.read_excel(
-            excel_path,
-            sheet_name=sheet_name,
-            header=header_row
-        )
+    by_position = None
+    if converters and len(rows) > header_row:
+        # Nombres canónicos de la cabecera -> posiciones para TextParser
+        header = TextParser(rows[header_row:header_row + 1], header=0).read().columns
+        by_position = {i: converters[c] for i, c in enumerate(_standardize_columns(list(header))) if c in converters}
+
+    df = TextParser(rows, header=header_row, skip_blank_lines=False, converters=by_position).read()
     # --- Limpieza común ---
     df.columns = _standardize_columns(list(df.columns))
     
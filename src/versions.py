@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .incremental import header_signature, row_fingerprints
+from .store import write_table
+
+# Histórico de versiones deduplicado:
+#   <root>/blocks/ab/abcdef....arrow   bloques de filas direccionados por contenido
+#   <root>/versions.json               cada versión = lista ordenada de bloques
+# Los cortes entre bloques dependen del contenido de las filas (huella), no
+# de su posición: añadir o editar filas solo cambia los bloques afectados y
+# el resto se reutiliza. El crecimiento por subida es proporcional al cambio.
+
+BLOCK_ROWS = 256  # tamaño medio de bloque (potencia de 2)
+MAX_BLOCK_ROWS = 4 * BLOCK_ROWS
+INDEX_FILE = "versions.json"
+BLOCKS_DIR = "blocks"
+
+
+def block_bounds(fingerprints: np.ndarray, avg_rows: int = BLOCK_ROWS, max_rows: int = MAX_BLOCK_ROWS) -> np.ndarray:
+    """Posiciones de fin (exclusivo) de cada bloque."""
+    n = len(fingerprints)
+    cuts = np.flatnonzero((fingerprints >> np.uint64(11)) % np.uint64(avg_rows) == 0) + 1
+    bounds, last = [], 0
+    for c in np.r_[cuts, n]:
+        while c - last > max_rows:  # tramos sin corte: se trocean por tamaño
+            last += max_rows
+            bounds.append(last)
+        if c > last:
+            bounds.append(int(c))
+            last = int(c)
+    return np.asarray(bounds, dtype=np.int64)
+
+
+def _block_path(root: Path, digest: str) -> Path:
+    return Path(root) / BLOCKS_DIR / digest[:2] / f"{digest}.arrow"
+
+
+def list_versions(root: Path) -> list[dict]:
+    """Versiones guardadas, de la más antigua a la más reciente."""
+    path = Path(root) / INDEX_FILE
+    if not path.exists():
+        return []
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+
+
+def find_version(root: Path, source_digest: str) -> dict | None:
+    for v in list_versions(root):
+        if v["source_sha256"] == source_digest:
+            return v
+    return None
+
+
+def commit_version(root: Path, df: pd.DataFrame, source_name: str, source_digest: str) -> dict:
+    """
+    Guarda df como nueva versión (si ese Excel ya estaba, devuelve la
+    existente). Solo se escriben los bloques que no existían.
+    """
+    root = Path(root)
+    existing = find_version(root, source_digest)
+    if existing is not None:
+        return existing
+
+    header = header_signature(df)
+    fps = row_fingerprints(df)
+    # Mismo esquema en todos los bloques (un bloque con una columna vacía no cambia de tipo)
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    blocks, new_blocks, new_bytes = [], 0, 0
+    start = 0
+    for end in block_bounds(fps):
+        h = hashlib.sha1(header.encode("utf-8"))
+        h.update(fps[start:end].tobytes())
+        digest = h.hexdigest()
+        path = _block_path(root, digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            write_table(df.iloc[start:end], tmp, schema)
+            os.replace(tmp, path)
+            new_blocks += 1
+            new_bytes += path.stat().st_size
+        blocks.append(digest)
+        start = end
+
+    versions = list_versions(root)
+    entry = {
+        "id": (versions[-1]["id"] + 1) if versions else 1,
+        "source": source_name,
+        "source_sha256": source_digest,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": int(len(df)),
+        "columns": list(df.columns),
+        "attrs": df.attrs,
+        "blocks": blocks,
+        "new_blocks": new_blocks,
+        "new_bytes": new_bytes,
+    }
+    versions.append(entry)
+    tmp = root / (INDEX_FILE + ".tmp")
+    tmp.write_text(json.dumps(versions, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+    os.replace(tmp, root / INDEX_FILE)
+    return entry
+
+
+def load_version(root: Path, version_id: int) -> pd.DataFrame:
+    """Reconstruye una versión a partir de sus bloques."""
+    entry = next((v for v in list_versions(root) if v["id"] == version_id), None)
+    if entry is None:
+        raise KeyError(f"No existe la versión {version_id}")
+    tables: dict[str, pa.Table] = {}
+    for digest in entry["blocks"]:
+        if digest not in tables:
+            with pa.memory_map(str(_block_path(root, digest)), "r") as source:
+                tables[digest] = pa.ipc.open_file(source).read_all()
+    if entry["blocks"]:
+        df = pa.concat_tables([tables[d] for d in entry["blocks"]]).to_pandas()
+    else:
+        df = pd.DataFrame(columns=entry["columns"])
+    df.attrs.update(entry.get("attrs", {}))
+    return df
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from .chart_data import HEATMAP_TOP_TT, OTROS, bin_labels
+from .money import cents_to_euros
+from .quadrants import ACCION_LABELS, assign_quadrants, label_quadrants, quadrant_order
+from .timeseries import TimeSeries
+
+# Agregaciones de las vistas del dashboard (sin Streamlit, para poder
+# calcularlas en un hilo) y caché compartida con pre-calentamiento.
+
+WARMUP_ENV = "DASHBOARD_WARMUP"  # "0" / "false" desactiva el pre-calentamiento
+
+DEMAND_EDGES = [0, 1, 3, 6, 10, np.inf]
+DEMAND_LABELS = ["1", "2–3", "4–6", "7–10", ">10"]
+
+
+# =========================
+# Vistas
+# =========================
+def agg_profitability(df_in: pd.DataFrame, group_col: str) -> pd.DataFrame:
+    if group_col not in df_in.columns:
+        return pd.DataFrame()
+
+    needed = ["MI PRECIO", "HORAS DEDICADAS", "NOMBRE ENCARGO", group_col]
+    if any(c not in df_in.columns for c in needed):
+        return pd.DataFrame()
+
+    g = (
+        df_in.groupby(group_col, dropna=False)
+        .agg(
+            trabajos=("NOMBRE ENCARGO", "count"),
+            facturacion=("MI PRECIO", "sum"),
+            horas=("HORAS DEDICADAS", "sum"),
+        )
+        .reset_index()
+    )
+    g["facturacion"] = cents_to_euros(g["facturacion"])  # céntimos -> €
+    g["eur_h"] = np.where(g["horas"] > 0, g["facturacion"] / g["horas"], np.nan)
+    return g
+
+
+def demand_tt_tc(dff: pd.DataFrame) -> tuple[pd.DataFrame, list, list]:
+    """Heatmap TT × TC: (conteos con tramo de color, orden de TT, orden de TC)."""
+    # Conteo de trabajos
+    demand = (
+        dff.groupby(["TIPO DE TRABAJO", "TIPO DE CLIENTE"], dropna=False)
+        .agg(trabajos=("NOMBRE ENCARGO", "count"))
+        .reset_index()
+    )
+
+    # Ordenar tipos de trabajo / de cliente por volumen total (desc)
+    order_tt = demand.groupby("TIPO DE TRABAJO")["trabajos"].sum().sort_values(ascending=False).index.tolist()
+    order_tc = demand.groupby("TIPO DE CLIENTE")["trabajos"].sum().sort_values(ascending=False).index.tolist()
+
+    # Como mucho HEATMAP_TOP_TT filas; el resto de tipos se agrupa en "Otros"
+    if len(order_tt) > HEATMAP_TOP_TT:
+        keep = set(order_tt[:HEATMAP_TOP_TT])
+        demand["TIPO DE TRABAJO"] = demand["TIPO DE TRABAJO"].where(demand["TIPO DE TRABAJO"].isin(keep), OTROS)
+        demand = demand.groupby(["TIPO DE TRABAJO", "TIPO DE CLIENTE"], dropna=False, as_index=False)["trabajos"].sum()
+        order_tt = order_tt[:HEATMAP_TOP_TT] + [OTROS]
+
+    # El color solo necesita el tramo: se pre-calcula aquí
+    demand["rango_trabajos"] = bin_labels(demand["trabajos"], DEMAND_EDGES, DEMAND_LABELS)
+    return demand, order_tt, order_tc
+
+
+def tt_tc_actions(dff: pd.DataFrame, approx: bool = False) -> pd.DataFrame:
+    """
+    Combinaciones TT × TC con €/h y acción (cuadrante), ordenadas por
+    cuadrante. approx=True: medianas con KLL (src/sketches.py).
+    """
+    # MI PRECIO (céntimos Int64) / HORAS DEDICADAS ya son numéricos desde el loader
+    by_tt_tc = (
+        dff.dropna(subset=["TIPO DE TRABAJO", "TIPO DE CLIENTE"])
+        .groupby(["TIPO DE TRABAJO", "TIPO DE CLIENTE"], dropna=False)
+        .agg(
+            trabajos=("NOMBRE ENCARGO", "count"),
+            horas=("HORAS DEDICADAS", "sum"),
+            facturacion=("MI PRECIO", "sum"),
+        )
+        .reset_index()
+    )
+    if by_tt_tc.empty:
+        return by_tt_tc
+    by_tt_tc["facturacion"] = cents_to_euros(by_tt_tc["facturacion"])
+
+    # €/h robusto
+    by_tt_tc["eur_h"] = np.where(by_tt_tc["horas"] > 0, by_tt_tc["facturacion"] / by_tt_tc["horas"], np.nan)
+    by_tt_tc = by_tt_tc.replace([np.inf, -np.inf], np.nan)
+
+    # Clasificación vectorizada (mediana como umbral) + orden por cuadrante
+    codes = assign_quadrants(by_tt_tc, approx=approx)
+    by_tt_tc["accion"] = label_quadrants(codes, ACCION_LABELS)
+    return by_tt_tc.iloc[quadrant_order(by_tt_tc, codes)]
+
+
+def year_tipo_cliente(dff: pd.DataFrame) -> pd.DataFrame:
+    """Facturación (€) por AÑO (texto) y tipo de cliente."""
+    g = (
+        dff.dropna(subset=["AÑO", "TIPO DE CLIENTE", "MI PRECIO"])
+        .groupby(["AÑO", "TIPO DE CLIENTE"], dropna=False)
+        .agg(facturacion=("MI PRECIO", "sum"))
+        .reset_index()
+    )
+    g["facturacion"] = cents_to_euros(g["facturacion"])
+    g["AÑO"] = g["AÑO"].astype(int).astype(str)
+    return g
+
+
+def drilldown(df: pd.DataFrame, positions: np.ndarray, mix_col: str = "TIPO DE TRABAJO") -> dict[str, pd.DataFrame]:
+    """
+    Detalle de un grupo a partir de sus posiciones (GroupIndex): filas,
+    histórico mensual (encargos entrados y facturación por entrega) y
+    mezcla por mix_col.
+    """
+    rows = df.iloc[positions]
+    ts = TimeSeries(rows)
+    mensual = ts.view("facturacion_entrega", "M")[["periodo", "valor"]].rename(columns={"valor": "facturacion"})
+    entradas = ts.view("encargos_entrados", "M")[["periodo", "valor"]].rename(columns={"valor": "encargos"})
+    mensual = entradas.merge(mensual, on="periodo", how="outer").fillna({"encargos": 0, "facturacion": 0.0})
+    mix = agg_profitability(rows, mix_col)
+    if len(mix):
+        mix = mix.sort_values("facturacion", ascending=False, kind="stable")
+    return {"rows": rows, "mensual": mensual.sort_values("periodo", kind="stable"), "mix": mix}
+
+
+def default_views(df: pd.DataFrame, approx: bool = False) -> dict[str, Callable[[], Any]]:
+    """Vistas sin filtros que se pre-calculan al cargar un dataset."""
+    views: dict[str, Callable[[], Any]] = {
+        "agg:TIPO DE TRABAJO": lambda: agg_profitability(df, "TIPO DE TRABAJO"),
+        "agg:TIPO DE CLIENTE": lambda: agg_profitability(df, "TIPO DE CLIENTE"),
+        "agg:CLIENTE": lambda: agg_profitability(df, "CLIENTE"),
+    }
+    if {"TIPO DE CLIENTE", "TIPO DE TRABAJO", "NOMBRE ENCARGO"}.issubset(df.columns):
+        views["demand_tt_tc"] = lambda: demand_tt_tc(df)
+    if {"TIPO DE TRABAJO", "TIPO DE CLIENTE", "NOMBRE ENCARGO", "HORAS DEDICADAS", "MI PRECIO"}.issubset(df.columns):
+        views["tt_tc_actions"] = lambda: tt_tc_actions(df, approx)
+    if {"AÑO", "TIPO DE CLIENTE", "MI PRECIO"}.issubset(df.columns):
+        views["year_tipo_cliente"] = lambda: year_tipo_cliente(df)
+    return views
+
+
+def warmup_enabled() -> bool:
+    return os.environ.get(WARMUP_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+# =========================
+# Caché
+# =========================
+class ViewCache:
+    """
+    Resultados por (dataset, vista), compartidos por todas las sesiones.
+    El pre-calentamiento cede el paso: mientras haya una ejecución de
+    usuario en marcha (user_run) espera antes de calcular la siguiente vista.
+    Los resultados son de solo lectura: quien los use no debe mutarlos.
+    """
+
+    def __init__(self, max_datasets: int = 3):
+        self.max_datasets = max_datasets
+        self._data: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._active_runs = 0
+        self._warmups: dict[str, threading.Thread] = {}
+
+    def get(self, digest: str, name: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            views = self._data.get(digest)
+            if views is not None and name in views:
+                self._data.move_to_end(digest)
+                return views[name]
+        value = compute()
+        with self._lock:
+            views = self._data.setdefault(digest, {})
+            self._data.move_to_end(digest)
+            while len(self._data) > self.max_datasets:
+                evicted, _ = self._data.popitem(last=False)
+                # Si vuelve, warm() debe calentarlo otra vez
+                self._warmups.pop(evicted, None)
+            return views.setdefault(name, value)
+
+    def cached(self, digest: str) -> list[str]:
+        with self._lock:
+            return list(self._data.get(digest, {}))
+
+    @contextmanager
+    def user_run(self):
+        with self._lock:
+            self._active_runs += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_runs -= 1
+                self._idle.notify_all()
+
+    def _wait_idle(self) -> None:
+        with self._lock:
+            while self._active_runs > 0:
+                self._idle.wait(timeout=0.5)
+
+    def warm(self, digest: str, views: dict[str, Callable[[], Any]]) -> threading.Thread | None:
+        """Calcula en segundo plano las vistas que falten (una vez por dataset)."""
+        def _run() -> None:
+            for name, compute in views.items():
+                self._wait_idle()
+                try:
+                    self.get(digest, name, compute)
+                except Exception:
+                    pass  # la vista se calculará (y fallará visiblemente) al abrirla
+
+        with self._lock:
+            if digest in self._warmups:
+                return self._warmups[digest]
+            thread = threading.Thread(target=_run, name=f"warmup-{digest[:12]}", daemon=True)
+            self._warmups[digest] = thread
+        thread.start()
+        return thread
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Iterator
+
+# Vigilancia por sondeo (sin servicios externos) del directorio de datos.
+# Excel guarda en varias escrituras seguidas (y deja ~$fichero.xlsx de
+# bloqueo), así que un libro solo se da por cambiado cuando su mtime/tamaño
+# lleva `debounce` segundos sin moverse y además su sha256 es distinto.
+
+WORKBOOK_GLOB = "*.xlsx"
+
+
+def scan(data_dir: Path, pattern: str = WORKBOOK_GLOB) -> dict[Path, tuple[int, int]]:
+    """{libro: (mtime_ns, tamaño)} ignorando ficheros de bloqueo de Excel."""
+    out: dict[Path, tuple[int, int]] = {}
+    for path in Path(data_dir).glob(pattern):
+        if path.name.startswith("~$"):
+            continue
+        try:
+            st = path.stat()
+        except OSError:  # borrado entre el glob y el stat
+            continue
+        out[path] = (st.st_mtime_ns, st.st_size)
+    return out
+
+
+def output_dir_for(workbook: Path, out_dir: Path, main_name: str = "GENERAL.xlsx") -> Path:
+    """El libro principal exporta a out_dir; el resto a out_dir/<nombre>."""
+    return out_dir if workbook.name == main_name else out_dir / workbook.stem
+
+
+def watch_workbooks(
+    data_dir: Path,
+    interval: float = 1.0,
+    debounce: float = 2.0,
+    initial: bool = True,
+) -> Iterator[Path]:
+    """
+    Genera los libros que hay que reexportar, de uno en uno y solo cuando
+    su contenido ha cambiado. Con initial=True los existentes cuentan como
+    nuevos en la primera vuelta.
+    """
+    from .bundle import file_digest  # arrastra pyarrow: solo en modo --watch
+
+    digests: dict[Path, str] = {}
+    pending: dict[Path, tuple[tuple[int, int], float]] = {}
+    seen: dict[Path, tuple[int, int]] = {} if initial else scan(data_dir)
+    if not initial:
+        digests = {p: file_digest(p) for p in seen}
+
+    while True:
+        now = time.monotonic()
+        current = scan(data_dir)
+        for path, sig in current.items():
+            if seen.get(path) != sig:
+                # Cambio nuevo (o sigue cambiando): se reinicia el debounce
+                pending[path] = (sig, now)
+                seen[path] = sig
+        for path in list(pending):
+            if path not in current:
+                pending.pop(path)
+                seen.pop(path, None)
+                digests.pop(path, None)
+                continue
+            sig, since = pending[path]
+            if now - since < debounce:
+                continue
+            pending.pop(path)
+            try:
+                digest = file_digest(path)
+            except OSError:
+                continue
+            if digests.get(path) == digest:
+                continue  # guardado sin cambios de contenido
+            digests[path] = digest
+            yield path
+        time.sleep(interval)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import re
+import tempfile
+from pathlib import Path
+from typing import IO, Iterator
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from .money import MONEY_COLUMNS, cents_to_euros
+
+# Informe Excel de las métricas: una hoja por métrica y otra con el detalle
+# de filas. openpyxl en modo write_only escribe las filas en streaming a un
+# fichero temporal (memoria constante); el formato numérico se decide una vez
+# por columna y se reutiliza para todas sus celdas.
+
+DETAIL_SHEET = "detalle"
+CHUNK_ROWS = 5000  # filas que se pasan a objetos Python de cada vez
+MAX_WIDTH = 60
+
+EUR_FORMAT = '#,##0.00 "€"'
+HOURS_FORMAT = "#,##0.0"
+INT_FORMAT = "#,##0"
+YEAR_FORMAT = "0"
+PCT_FORMAT = '0.0"%"'
+DATE_FORMAT = "yyyy-mm-dd"
+
+_EURO = re.compile(r"facturacion|importe|ingreso|precio|eur_h|honorarios", re.IGNORECASE)
+_HOURS = re.compile(r"horas", re.IGNORECASE)
+_YEAR = re.compile(r"^(AÑO|anio|año)$", re.IGNORECASE)
+
+
+def column_format(name: str, dtype) -> str | None:
+    """Formato numérico de Excel de una columna (None = general)."""
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DATE_FORMAT
+    if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return None
+    if name in MONEY_COLUMNS or name == "PRECIO/HORA" or _EURO.search(name):
+        return EUR_FORMAT
+    if _HOURS.search(name):
+        return HOURS_FORMAT
+    if name.endswith("_pct"):
+        return PCT_FORMAT
+    if _YEAR.match(name):
+        return YEAR_FORMAT  # 2025, no 2.025
+    if pd.api.types.is_integer_dtype(dtype):
+        return INT_FORMAT
+    return None
+
+
+def sheet_title(name: str, used: set[str]) -> str:
+    """Nombre de hoja válido (≤31, sin []:*?/\\) y único."""
+    base = re.sub(r"[\[\]:*?/\\]", "_", name)[:31] or "hoja"
+    title, i = base, 1
+    while title.lower() in used:
+        i += 1
+        title = f"{base[:28]}_{i}"
+    used.add(title.lower())
+    return title
+
+
+def _column_values(s: pd.Series) -> list:
+    """Valores de Python de una columna, NA -> None (celda vacía)."""
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return [None if pd.isna(v) else v.to_pydatetime() for v in s]
+    if pd.api.types.is_float_dtype(s.dtype):
+        arr = s.to_numpy(dtype=np.float64, na_value=np.nan)
+        return [None if not np.isfinite(v) else v for v in arr.tolist()]
+    return s.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def _rows(df: pd.DataFrame, chunk_rows: int) -> Iterator[tuple]:
+    for start in range(0, len(df), chunk_rows):
+        block = df.iloc[start:start + chunk_rows]
+        yield from zip(*(_column_values(block[c]) for c in block.columns))
+
+
+def _write_sheet(wb: Workbook, title: str, df: pd.DataFrame, chunk_rows: int) -> int:
+    ws = wb.create_sheet(title)
+    columns = [str(c) for c in df.columns]
+    formats = [column_format(c, df[c].dtype) for c in columns]
+    # Ancho por columna con la cabecera y una muestra (antes de la primera fila)
+    sample = df.head(200)
+    for i, c in enumerate(columns, start=1):
+        longest = sample[df.columns[i - 1]].astype(str).str.len().max() if len(sample) else 0
+        ws.column_dimensions[get_column_letter(i)].width = min(max(len(c), int(longest or 0)) + 2, MAX_WIDTH)
+    ws.freeze_panes = "A2"
+
+    bold = Font(bold=True)
+    header = []
+    for c in columns:
+        cell = WriteOnlyCell(ws, value=c)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    n = 0
+    for row in _rows(df, chunk_rows):
+        out = []
+        for value, fmt in zip(row, formats):
+            if fmt is None or value is None:
+                out.append(value)
+            else:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.number_format = fmt
+                out.append(cell)
+        ws.append(out)
+        n += 1
+    return n
+
+
+def detail_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Filas de detalle para el informe: importes en euros, sin columnas auxiliares."""
+    cols = [c for c in df.columns if not str(c).startswith("UNNAMED")]
+    out = df[cols]
+    money = {c: cents_to_euros(out[c]) for c in MONEY_COLUMNS if c in out.columns}
+    return out.assign(**money) if money else out
+
+
+def write_report(
+    target: Path | IO[bytes],
+    metrics: dict[str, pd.DataFrame],
+    detail: pd.DataFrame | None = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> dict[str, int]:
+    """
+    Escribe el informe .xlsx en `target` (ruta o fichero binario abierto).
+    Devuelve {hoja: filas escritas}.
+    """
+    wb = Workbook(write_only=True)
+    used: set[str] = set()
+    written: dict[str, int] = {}
+    for name, m in metrics.items():
+        title = sheet_title(name, used)
+        written[title] = _write_sheet(wb, title, m, chunk_rows)
+    if detail is not None:
+        title = sheet_title(DETAIL_SHEET, used)
+        written[title] = _write_sheet(wb, title, detail_frame(detail), chunk_rows)
+    wb.save(target)
+    return written
+
+
+def report_file(metrics: dict[str, pd.DataFrame], detail: pd.DataFrame | None = None) -> IO[bytes]:
+    """Informe en un fichero temporal (en disco, no en memoria) listo para leer desde el inicio."""
+    f = tempfile.TemporaryFile(suffix=".xlsx")
+    write_report(f, metrics, detail)
+    f.seek(0)
+    return f